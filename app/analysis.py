@@ -1,10 +1,34 @@
 from __future__ import annotations
 
 import traceback
-from typing import Any, Dict
+from typing import TYPE_CHECKING, Any, Callable, Dict, Optional
 
+import numpy as np
 import pandas as pd
 
+if TYPE_CHECKING:  # pragma: no cover
+    from .pipeline import StageCache
+
+STAGES = ("graph", "summary", "betweenness", "centralities", "h3", "export")
+
+
+class AnalysisCancelled(Exception):
+    """Raised by a progress callback to stop the workflow between stages."""
+
+
+def graph_key(
+    city: str,
+    mode: str,
+    radius_km: float,
+    lat: Optional[float] = None,
+    lon: Optional[float] = None,
+) -> str:
+    """Identity of the network an analysis runs on (its stage cache prefix)."""
+    from grafos.store import normalise_key
+
+    place = f"{lat:.6f},{lon:.6f}" if lat is not None and lon is not None else city
+    return normalise_key(place, mode, int(radius_km * 1000))
+
 
 def _compute(
     city: str,
@@ -15,75 +39,226 @@ def _compute(
     do_degree: bool,
     do_straightness: bool = False,
     do_eigenvector: bool = False,
+    do_pagerank: bool = False,
+    do_katz: bool = False,
+    spectral_weight: str = "inverse_length",
+    pagerank_damping: float = 0.85,
+    katz_alpha: float = 0.5,
+    do_reach: bool = False,
+    do_gravity: bool = False,
+    do_local_closeness: bool = False,
+    access_radius_m: float = 1200.0,
+    gravity_beta: float = 0.002,
     do_h3: bool = True,
     h3_res: int = 7,
     color_by: str = "length",
+    class_scheme: str = "quantile",
+    node_metric_join: str = "mean",
     allow_synthetic: bool = False,
+    straightness_radius_m: Optional[float] = None,
+    betweenness_error: Optional[float] = None,
+    betweenness_confidence: float = 0.95,
+    betweenness_time_budget_s: Optional[float] = None,
+    lat: Optional[float] = None,
+    lon: Optional[float] = None,
+    progress: Optional[Callable[[str], None]] = None,
+    cache: Optional["StageCache"] = None,
 ) -> Dict[str, Any]:
-    """Execute the analysis workflow and return intermediate objects."""
+    """Execute the analysis workflow and return intermediate objects.
+
+    ``progress`` is called with the name of each stage (see :data:`STAGES`)
+    before it starts; it may raise :class:`AnalysisCancelled` to abort.
+    Intermediate results are memoised in ``cache`` (the process-wide
+    :class:`~app.pipeline.StageCache` by default), so a request that only
+    differs in one option recomputes just that stage.
+    """
 
     # Imports lourds gardés ici pour limiter le temps de chargement initial
-    import osmnx as ox
-    from grafos import loader, metrics, prepare
-
-    G = loader.get_graph(
-        city,
-        mode=mode,
-        distance=int(radius_km * 1000),
-        fallback_to_synthetic=allow_synthetic,
-    )
-    G = prepare.prepare_graph(G)
+    from grafos import accessibility, loader, metrics, prepare
+
+    from .lod import LevelsOfDetail
+    from .pipeline import default_cache
+    from .results import default_store as default_result_store
+
+    cache = cache if cache is not None else default_cache()
+
+    def stage(name: str) -> None:
+        if progress is not None:
+            progress(name)
+
+    stage("graph")
+    distance = int(radius_km * 1000)
+    point = (lat, lon) if lat is not None and lon is not None else None
+    graph_id: tuple = ("graph", graph_key(city, mode, radius_km, lat, lon))
+    prepared = cache.get(graph_id)
+    if prepared is None:
+        G = loader.get_graph(
+            city,
+            mode=mode,
+            distance=distance,
+            fallback_to_synthetic=allow_synthetic,
+            point=point,
+        )
+        # Projection unique : les géométries projetées et WGS84 sont gardées
+        # pour toutes les étapes suivantes (métriques, H3, carte, tuiles)
+        network = prepare.prepare_network(G)
+        # Représentation tableau partagée par toutes les métriques de la requête
+        prepared = (
+            network.graph,
+            metrics.build_csr(network.graph),
+            network.nodes,
+            network.edges,
+            network.edges_wgs84,
+        )
+        if G.graph.get("synthetic"):
+            # Le graphe de secours ne dépend pas de la ville : ne pas le
+            # mémoriser sous la clé de celle-ci
+            graph_id = ("graph", "synthetic")
+        cache.put(graph_id, prepared)
+    G, csr, base_nodes, base_edges, edges_wgs84 = prepared
 
-    nodes, edges = ox.graph_to_gdfs(G, nodes=True, edges=True, fill_edge_geometry=True)
+    nodes, edges = base_nodes, base_edges
+    column_keys: list = []
 
-    summary_metrics = metrics.compute_metrics(G)
+    stage("summary")
+    summary_metrics = dict(
+        cache.memo((graph_id, "summary"), lambda: metrics.compute_metrics(G, csr=csr))
+    )
     if do_centrality:
-        edges = metrics.add_edge_betweenness(G, edges)
-
-    if any([do_closeness, do_degree, do_straightness, do_eigenvector]):
-        node_metrics = metrics.node_centralities(
-            G,
-            closeness=do_closeness,
-            degree=do_degree,
-            straightness=do_straightness,
-            eigenvector=do_eigenvector,
+        stage("betweenness")
+
+        def _betweenness():
+            scored = metrics.add_edge_betweenness(
+                G,
+                pd.DataFrame(index=base_edges.index),
+                csr=csr,
+                epsilon=betweenness_error,
+                confidence=betweenness_confidence,
+                time_budget=betweenness_time_budget_s,
+            )
+            return scored["betweenness"].to_numpy(), scored.attrs.get("betweenness_sampling", {})
+
+        betweenness_key = (
+            graph_id, "betweenness", betweenness_error, betweenness_confidence, betweenness_time_budget_s
         )
-        edges = metrics.attach_node_metrics_to_edges(edges, node_metrics)
+        values, sampling = cache.memo(betweenness_key, _betweenness)
+        column_keys.append(betweenness_key)
+        edges = edges.copy(deep=False)
+        edges["betweenness"] = values
+        summary_metrics["betweenness_samples"] = sampling.get("samples", 0)
+        summary_metrics["betweenness_error_bound"] = sampling.get("error_bound")
+
+    requested = {
+        "closeness": (do_closeness, ()),
+        "degree": (do_degree, ()),
+        "straightness": (do_straightness, (straightness_radius_m,)),
+        "eigenvector": (do_eigenvector, (spectral_weight,)),
+        "pagerank": (do_pagerank, (spectral_weight, pagerank_damping)),
+        "katz": (do_katz, (spectral_weight, katz_alpha)),
+    }
+    access = {
+        "reach": do_reach,
+        "gravity": do_gravity,
+        "local_closeness": do_local_closeness,
+    }
+    if any(flag for flag, _ in requested.values()) or any(access.values()):
+        stage("centralities")
+        node_metrics = pd.DataFrame({"node": csr.nodes})
+        for column, (flag, params) in requested.items():
+            if not flag:
+                continue
+            # Une entrée par indicateur : activer une case ne recalcule qu'elle
+            column_keys.append((graph_id, column) + params)
 
-    h3_gdf = metrics.aggregate_h3(edges, res=h3_res) if do_h3 else None
+            def _centrality(column=column):
+                table = metrics.node_centralities(
+                    G,
+                    closeness=column == "closeness",
+                    degree=column == "degree",
+                    straightness=column == "straightness",
+                    eigenvector=column == "eigenvector",
+                    pagerank=column == "pagerank",
+                    katz=column == "katz",
+                    csr=csr,
+                    straightness_radius=straightness_radius_m,
+                    spectral_weight=spectral_weight,
+                    pagerank_damping=pagerank_damping,
+                    katz_alpha=katz_alpha,
+                    # Les vecteurs spectraux précédents du même graphe servent de départ
+                    warm_key=graph_id,
+                )
+                return table[column].to_numpy(), table.attrs.get("spectral", {}).get(column)
 
-    for col in ["betweenness", "closeness", "degree", "straightness", "eigenvector"]:
+            node_metrics[column], diagnostics = cache.memo(column_keys[-1], _centrality)
+            if diagnostics is not None:
+                summary_metrics[f"{column}_converged"] = diagnostics["converged"]
+                summary_metrics[f"{column}_iterations"] = diagnostics["iterations"]
+                summary_metrics[f"{column}_residual"] = diagnostics["residual"]
+        if any(access.values()):
+            # Une seule recherche bornée fournit les trois indicateurs
+            table = cache.memo(
+                (graph_id, "access", access_radius_m, gravity_beta),
+                lambda: accessibility.local_accessibility(
+                    csr, radius=access_radius_m, beta=gravity_beta
+                )[list(accessibility.ACCESS_COLUMNS)].to_numpy(),
+            )
+            for i, column in enumerate(accessibility.ACCESS_COLUMNS):
+                if access[column]:
+                    column_keys.append((graph_id, column, access_radius_m, gravity_beta))
+                    node_metrics[column] = table[:, i]
+        # Copie superficielle unique (les géométries restent partagées avec le cache)
+        edges = edges.copy(deep=False) if edges is base_edges else edges
+        metrics.attach_node_metrics_to_edges(edges, node_metrics, how=node_metric_join, inplace=True)
+        column_keys.append(("join", node_metric_join))
+
+    if do_h3:
+        stage("h3")
+    h3_gdf = (
+        # La couche H3 agrège aussi les colonnes de métriques présentes
+        cache.memo(
+            (graph_id, "h3", h3_res, tuple(column_keys)),
+            lambda: metrics.aggregate_h3(edges, res=h3_res),
+        )
+        if do_h3
+        else None
+    )
+
+    for col in metrics.H3_METRIC_COLUMNS:
         if col in edges.columns:
             series = edges[col].fillna(0)
             summary_metrics[f"{col}_mean"] = float(series.mean())
             summary_metrics[f"{col}_max"] = float(series.max())
 
-    edges_geojson = edges.to_crs(4326).to_json(drop_id=True)
+    stage("export")
     metrics_df = pd.DataFrame([summary_metrics]).T.reset_index()
     metrics_df.columns = ["indicateur", "valeur"]
     metrics_csv = metrics_df.to_csv(index=False)
-    h3_geojson = (
-        h3_gdf.to_crs(4326).to_json(drop_id=True)
-        if h3_gdf is not None and not h3_gdf.empty
-        else None
-    )
 
-    return {
+    # Niveaux de détail simplifiés une fois par réseau (tuiles et GeoJSON)
+    edges_lod = cache.memo((graph_id, "lod"), lambda: LevelsOfDetail.from_wgs84(np.asarray(edges_wgs84)))
+
+    result = {
         "nodes": nodes,
         "edges": edges,
+        "edges_wgs84": edges_wgs84,
+        "lod": edges_lod,
         "metrics": summary_metrics,
         "metrics_df": metrics_df,
-        "edges_geojson": edges_geojson,
         "metrics_csv": metrics_csv,
         "h3_gdf": h3_gdf,
-        "h3_geojson": h3_geojson,
         "color_by": color_by,
+        "class_scheme": class_scheme,
     }
+    # Téléchargements écrits une fois, servis ensuite par /api/results/{id}
+    result["result_id"] = default_result_store().save(result)
+    return result
 
 
 def run(**kwargs) -> Dict[str, Any]:
     try:
         return _compute(**kwargs)
+    except AnalysisCancelled:
+        return {"error": "Analyse annulée", "code": "cancelled"}
     except Exception as exc:  # pragma: no cover - ensures trace returned to UI
         try:
             from grafos.loader import OpenStreetMapUnavailable
@@ -1,20 +1,31 @@
 from __future__ import annotations
 
+import json
+from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, List, Literal, Optional
 
-from fastapi import FastAPI, HTTPException
+import numpy as np
+import shapely
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
-from pydantic import BaseModel, Field
+from starlette.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field, model_validator
 
-from . import analysis, map as map_mod
+from . import geojson, isochrones, jobs, results, routing, tiles
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 STATIC_DIR = BASE_DIR / "web"
 
-app = FastAPI(title="Accessibilité urbaine", version="2.0")
+@asynccontextmanager
+async def _lifespan(_app: FastAPI):
+    yield
+    jobs.shutdown_manager()
+
+
+app = FastAPI(title="Accessibilité urbaine", version="2.0", lifespan=_lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -28,7 +39,12 @@ if STATIC_DIR.exists():
 
 
 class AnalysisRequest(BaseModel):
-    city: str = Field(..., description="Nom de la ville ou coordonnées supportées par OSM")
+    city: str = Field(
+        "",
+        description="Nom de la ville ou coordonnées « lat,lon » (sans géocodage)",
+    )
+    lat: Optional[float] = Field(None, ge=-90, le=90, description="Latitude du centre")
+    lon: Optional[float] = Field(None, ge=-180, le=180, description="Longitude du centre")
     mode: str = Field("walk", description="Profil OSM à utiliser (walk, bike, drive…)")
     radius_km: float = Field(1.0, gt=0, description="Rayon en kilomètres")
     do_centrality: bool = True
@@ -36,9 +52,66 @@ class AnalysisRequest(BaseModel):
     do_degree: bool = False
     do_straightness: bool = False
     do_eigenvector: bool = False
+    do_pagerank: bool = False
+    do_katz: bool = False
+    spectral_weight: Literal["inverse_length", "length", "unit"] = Field(
+        "inverse_length",
+        description=(
+            "Poids des arêtes pour eigenvector, PageRank et Katz : inverse de la longueur "
+            "(une rue courte est un lien fort), longueur ou 1"
+        ),
+    )
+    pagerank_damping: float = Field(0.85, gt=0, lt=1, description="Facteur d'amortissement du PageRank")
+    katz_alpha: float = Field(
+        0.5, gt=0, lt=1, description="Atténuation de Katz, en fraction de 1/λmax"
+    )
+    do_reach: bool = False
+    do_gravity: bool = False
+    do_local_closeness: bool = False
+    access_radius_m: float = Field(
+        1200.0,
+        gt=0,
+        le=10000,
+        description="Rayon réseau (m) de reach, gravity et closeness locale (1200 m ≈ 15 min à pied)",
+    )
+    gravity_beta: float = Field(
+        0.002,
+        gt=0,
+        description="Décroissance par mètre de l'indice gravity : exp(-beta·d)",
+    )
+    straightness_radius_m: Optional[float] = Field(
+        None,
+        gt=0,
+        description="Rayon réseau (m) de la straightness locale ; vide = tout le réseau",
+    )
+    betweenness_error: Optional[float] = Field(
+        None,
+        gt=0,
+        le=1,
+        description=(
+            "Erreur maximale tolérée sur la betweenness normalisée ; active l'échantillonnage adaptatif"
+        ),
+    )
+    betweenness_confidence: float = Field(
+        0.95, gt=0, lt=1, description="Niveau de confiance de l'erreur de la betweenness"
+    )
+    betweenness_time_budget_s: Optional[float] = Field(
+        None, gt=0, description="Temps maximal (s) consacré à l'échantillonnage de la betweenness"
+    )
     do_h3: bool = True
     h3_res: int = Field(7, ge=1, le=15)
     color_by: str = "length"
+    class_scheme: Literal["quantile", "jenks", "equal", "log"] = Field(
+        "quantile",
+        description="Méthode de classes de couleur : quantiles, Jenks, intervalles égaux ou log",
+    )
+    node_metric_join: Literal["mean", "min", "max", "length_weighted"] = Field(
+        "mean",
+        description=(
+            "Agrégation des métriques des deux extrémités sur chaque tronçon "
+            "(moyenne, min, max ou pondérée par la longueur incidente)"
+        ),
+    )
     allow_synthetic: bool = Field(
         False,
         description=(
@@ -46,24 +119,54 @@ class AnalysisRequest(BaseModel):
         ),
     )
 
+    @model_validator(mode="after")
+    def _check_location(self) -> "AnalysisRequest":
+        if (self.lat is None) != (self.lon is None):
+            raise ValueError("lat et lon doivent être fournis ensemble")
+        if not self.city.strip() and self.lat is None:
+            raise ValueError("Indiquez une ville ou un couple lat/lon")
+        return self
 
-def _to_native(obj: Any) -> Any:
-    if isinstance(obj, dict):
-        return {k: _to_native(v) for k, v in obj.items()}
-    if isinstance(obj, list):
-        return [_to_native(v) for v in obj]
-    try:
-        import numpy as np
-        if isinstance(obj, (np.generic,)):
-            return obj.item()
-    except ModuleNotFoundError:
-        pass
-    if hasattr(obj, "isoformat"):
-        try:
-            return obj.isoformat()
-        except Exception:  # pragma: no cover - fallback for unexpected types
-            return str(obj)
-    return obj
+
+class Origin(BaseModel):
+    lat: float = Field(..., ge=-90, le=90)
+    lon: float = Field(..., ge=-180, le=180)
+
+
+class IsochroneRequest(BaseModel):
+    result_id: str = Field(..., description="Identifiant du résultat dont on utilise le réseau")
+    origins: List[Origin] = Field(..., min_length=1, max_length=100)
+    thresholds: List[float] = Field(
+        ..., min_length=1, max_length=10, description="Seuils en minutes ou en mètres (voir unit)"
+    )
+    unit: Literal["min", "m"] = "min"
+    speed_kmh: float = Field(4.8, gt=0, le=120, description="Vitesse de déplacement (unit=min)")
+    buffer_m: float = Field(
+        isochrones.DEFAULT_BUFFER_M, gt=0, le=500, description="Tampon autour des rues atteintes (m)"
+    )
+
+    @model_validator(mode="after")
+    def _check_thresholds(self) -> "IsochroneRequest":
+        if any(t <= 0 for t in self.thresholds):
+            raise ValueError("Les seuils doivent être positifs")
+        return self
+
+    def distances_m(self) -> List[float]:
+        if self.unit == "m":
+            return list(self.thresholds)
+        return [t * self.speed_kmh * 1000.0 / 60.0 for t in self.thresholds]
+
+
+class RouteRequest(BaseModel):
+    result_id: str = Field(..., description="Identifiant du résultat dont on utilise le réseau")
+    origin: Origin
+    destination: Origin
+
+
+class ODMatrixRequest(BaseModel):
+    result_id: str = Field(..., description="Identifiant du résultat dont on utilise le réseau")
+    origins: List[Origin] = Field(..., min_length=1, max_length=1000)
+    destinations: List[Origin] = Field(..., min_length=1, max_length=1000)
 
 
 @app.get("/")
@@ -78,50 +181,290 @@ async def healthcheck():
     return {"status": "ok"}
 
 
+def _job_params(req: AnalysisRequest) -> Dict[str, Any]:
+    return req.model_dump()
+
+
+def _streamed(payload: Dict[str, Any], status_code: int = 200) -> StreamingResponse:
+    """Send a payload holding GeoJSON layers without materialising it."""
+    return StreamingResponse(
+        geojson.iter_json(payload), status_code=status_code, media_type="application/json"
+    )
+
+
+@app.get("/api/stats")
+async def stats():
+    """Compteurs du pool d'analyses (dont les requêtes fusionnées)."""
+    return jobs.get_manager().stats()
+
+
 @app.post("/api/analyze")
 async def analyze(req: AnalysisRequest):
-    result = analysis.run(
-        city=req.city,
-        mode=req.mode,
-        radius_km=req.radius_km,
-        do_centrality=req.do_centrality,
-        do_closeness=req.do_closeness,
-        do_degree=req.do_degree,
-        do_straightness=req.do_straightness,
-        do_eigenvector=req.do_eigenvector,
-        do_h3=req.do_h3,
-        h3_res=req.h3_res,
-        color_by=req.color_by,
-        allow_synthetic=req.allow_synthetic,
-    )
-
-    if result.get("error"):
-        raise HTTPException(status_code=400, detail=result)
-
-    map_payload = map_mod.build_map_payload(result, color_by=req.color_by)
-    h3_payload = map_mod.h3_payload(result)
-
-    metrics_df = result.get("metrics_df")
-    metrics_table = []
-    if metrics_df is not None and not metrics_df.empty:
-        metrics_table = metrics_df.to_dict(orient="records")
-
-    response: Dict[str, Any] = {
-        "metrics": _to_native(result.get("metrics", {})),
-        "map": map_payload,
-        "metricsTable": metrics_table,
-        "downloads": {
-            "edgesGeoJSON": result.get("edges_geojson"),
-            "metricsCSV": result.get("metrics_csv"),
-            "h3GeoJSON": result.get("h3_geojson"),
-        },
-        "colorBy": map_payload.get("colorBy"),
+    manager = jobs.get_manager()
+    try:
+        job = manager.submit(_job_params(req))
+    except jobs.QueueFull as exc:
+        raise HTTPException(status_code=429, detail=str(exc)) from exc
+    response = await manager.wait(job)
+
+    if response.get("error"):
+        raise HTTPException(status_code=400, detail=response)
+
+    return _streamed(response)
+
+
+@app.post("/api/jobs", status_code=202)
+async def submit_job(req: AnalysisRequest):
+    manager = jobs.get_manager()
+    try:
+        job = manager.submit(_job_params(req))
+    except jobs.QueueFull as exc:
+        raise HTTPException(status_code=429, detail=str(exc)) from exc
+    return _streamed(manager.status(job), status_code=202)
+
+
+@app.get("/api/jobs/{job_id}")
+async def job_status(job_id: str):
+    manager = jobs.get_manager()
+    job = manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Tâche inconnue")
+    return _streamed(manager.status(job))
+
+
+@app.delete("/api/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    manager = jobs.get_manager()
+    job = manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Tâche inconnue")
+    manager.cancel(job_id)
+    return _streamed(manager.status(job))
+
+
+def _accepted_encodings(header: str) -> Dict[str, float]:
+    accepted: Dict[str, float] = {}
+    for item in header.split(","):
+        name, _, params = item.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            accepted[name.strip().lower()] = q
+    return accepted
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    tags = [tag.strip() for tag in header.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+def _byte_range(header: str, size: int) -> Optional[tuple[int, int]]:
+    """First range of a ``bytes=`` header as ``(start, end)`` inclusive.
+
+    Returns ``None`` when the header should be ignored (malformed or several
+    ranges) and raises ``ValueError`` when it cannot be satisfied.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, _, last = (part.strip() for part in spec.strip().partition("-"))
+    if not (first.isdigit() or last.isdigit()) or not all(p.isdigit() or p == "" for p in (first, last)):
+        return None
+    if first == "":
+        # Suffixe : les ``last`` derniers octets
+        if int(last) == 0:
+            raise ValueError("empty suffix range")
+        start, end = max(0, size - int(last)), size - 1
+    else:
+        start = int(first)
+        end = int(last) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError("unsatisfiable range")
+    return start, min(end, size - 1)
+
+
+def _iter_file(path: Path, start: int, length: int, chunk_size: int = 256 * 1024):
+    with open(path, "rb") as fh:
+        fh.seek(start)
+        while length > 0:
+            data = fh.read(min(chunk_size, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+
+
+def _network(result_id: str, routable: bool = False) -> Path:
+    store = results.default_store()
+    path = store.network_source(result_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Résultat inconnu ou expiré")
+    if routable and store.hierarchy_source(result_id) is None:
+        # Hiérarchie construite à l'enregistrement, jamais pendant la requête
+        raise HTTPException(status_code=404, detail="Résultat sans graphe de routage ; relancez l'analyse")
+    return path
+
+
+@app.post("/api/isochrones")
+async def isochrone(req: IsochroneRequest):
+    """Isochrones autour d'un ou plusieurs points, sur le réseau d'un résultat."""
+    path = _network(req.result_id)
+    distances = req.distances_m()
+
+    def compute() -> Dict[str, Any]:
+        source = isochrones.default_cache().source(path)
+        return isochrones.isochrones(
+            source,
+            [o.lat for o in req.origins],
+            [o.lon for o in req.origins],
+            distances,
+            buffer_m=req.buffer_m,
+        )
+
+    # Réseau chargé une fois puis gardé en mémoire ; calcul hors de la boucle
+    found = await run_in_threadpool(compute)
+    features = [
+        {
+            "type": "Feature",
+            "geometry": json.loads(shapely.to_geojson(polygon)),
+            "properties": {
+                "threshold": threshold,
+                "unit": req.unit,
+                "distance_m": distance,
+                "area_m2": area,
+            },
+        }
+        for threshold, distance, polygon, area in zip(
+            req.thresholds, distances, found["polygons"], found["areas"]
+        )
+    ]
+    return {
+        "type": "FeatureCollection",
+        "features": features,
+        "origins": [
+            {"lat": lat, "lon": lon, "snap_distance_m": snap}
+            for (lat, lon), snap in zip(found["snapped"], found["snap_distances"])
+        ],
+    }
+
+
+@app.post("/api/route")
+async def shortest_route(req: RouteRequest):
+    """Itinéraire le plus court entre deux points (hiérarchie de contraction)."""
+    path = _network(req.result_id, routable=True)
+    found = await run_in_threadpool(
+        lambda: routing.route(
+            isochrones.default_cache().source(path),
+            (req.origin.lat, req.origin.lon),
+            (req.destination.lat, req.destination.lon),
+        )
+    )
+    geometry = found["geometry"]
+    return {
+        "distance_m": found["distance_m"],
+        "geometry": json.loads(shapely.to_geojson(geometry)) if geometry is not None else None,
+        "origin": found["points"][0],
+        "destination": found["points"][1],
+    }
+
+
+@app.post("/api/od-matrix")
+async def od_matrix(req: ODMatrixRequest):
+    """Matrice des distances réseau (m) entre origines et destinations."""
+    path = _network(req.result_id, routable=True)
+    found = await run_in_threadpool(
+        lambda: routing.od_matrix(
+            isochrones.default_cache().source(path),
+            [(o.lat, o.lon) for o in req.origins],
+            [(d.lat, d.lon) for d in req.destinations],
+        )
+    )
+    distances = found["distances"]
+    # Paires non reliées : null
+    rows = [[d if np.isfinite(d) else None for d in row] for row in distances.tolist()]
+    return {"distances_m": rows, "origins": found["origins"], "destinations": found["destinations"]}
+
+
+@app.get("/api/results/{result_id}/tiles/{z}/{x}/{y}.mvt")
+async def result_tile(result_id: str, z: int, x: int, y: int, request: Request):
+    """Tuile vectorielle (Mapbox Vector Tile) du réseau d'un résultat."""
+    if not (0 <= z <= tiles.MAX_ZOOM and 0 <= x < 2**z and 0 <= y < 2**z):
+        raise HTTPException(status_code=404, detail="Tuile hors limites")
+    path = results.default_store().tile_source(result_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Résultat inconnu ou expiré")
+
+    etag = tiles.etag(result_id, z, x, y)
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+    if _etag_matches(request.headers.get("if-none-match", ""), etag):
+        return Response(status_code=304, headers=headers)
+    # Rendu hors de la boucle d'événements (requête STRtree + encodage)
+    data = await run_in_threadpool(tiles.default_cache().tile, result_id, path, z, x, y)
+    if not data:
+        return Response(status_code=204, headers=headers)
+    return Response(content=data, media_type="application/vnd.mapbox-vector-tile", headers=headers)
+
+
+@app.get("/api/results/{result_id}/{name}")
+async def result_file(result_id: str, name: str, request: Request):
+    """Téléchargement d'un résultat (compression, ETag et requêtes Range)."""
+    store = results.default_store()
+    path = store.path(result_id, name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Résultat inconnu ou expiré")
+
+    accepted = _accepted_encodings(request.headers.get("accept-encoding", ""))
+    encoding = next(
+        (enc for enc in store.available_encodings() if accepted.get(enc, 0) > 0), None
+    )
+
+    # Le contenu est adressé par son empreinte : l'ETag ne dépend que de l'id
+    etag = f'"{result_id}-{name}-{encoding or "identity"}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "public, max-age=31536000, immutable",
+        "Vary": "Accept-Encoding",
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": f'attachment; filename="{name}"',
     }
+    if encoding is not None:
+        headers["Content-Encoding"] = encoding
+    media_type = results.FILES[name]
 
-    if h3_payload:
-        response["h3"] = h3_payload
+    # Réponse 304 avant toute compression
+    if _etag_matches(request.headers.get("if-none-match", ""), etag):
+        return Response(status_code=304, headers=headers)
+    if encoding is not None:
+        # Compression (première demande) hors de la boucle d'événements
+        path = await run_in_threadpool(store.encoded, path, encoding)
+
+    size = path.stat().st_size
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range == etag):
+        try:
+            byte_range = _byte_range(range_header, size)
+        except ValueError:
+            return Response(
+                status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"}
+            )
+        if byte_range is not None:
+            start, end = byte_range
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            headers["Content-Length"] = str(end - start + 1)
+            return StreamingResponse(
+                _iter_file(path, start, end - start + 1),
+                status_code=206,
+                media_type=media_type,
+                headers=headers,
+            )
 
-    return response
+    headers["Content-Length"] = str(size)
+    return StreamingResponse(_iter_file(path, 0, size), media_type=media_type, headers=headers)
 
 
 def create_app() -> FastAPI:
@@ -0,0 +1,126 @@
+"""Streaming GeoJSON serialisation.
+
+``GeoDataFrame.to_json`` builds the whole document as one string; parsing it
+back to add style properties and letting the web framework encode it again
+holds three copies of a large document in memory. Here a FeatureCollection is
+written chunk by chunk straight from the geometry array (``shapely.to_geojson``)
+and the attribute columns (``DataFrame.to_json``), and the surrounding
+response is encoded around it, so the body can be sent as it is produced.
+Non-finite numbers (NaN, inf) are written as ``null`` everywhere, since an
+encoding error after the first chunk would truncate the response.
+"""
+
+from __future__ import annotations
+
+import json
+import math
+from dataclasses import dataclass
+from typing import Any, Iterator, Optional, Sequence
+
+import geopandas as gpd
+import numpy as np
+import shapely
+
+from .utils import to_native
+
+
+__all__ = ["FeatureSource", "dumps", "iter_json"]
+
+
+DEFAULT_CHUNK_SIZE = 5000
+FLUSH_BYTES = 64 * 1024
+
+
+@dataclass
+class FeatureSource:
+    """A GeoDataFrame to be serialised lazily as a FeatureCollection.
+
+    ``properties`` restricts the attribute columns written (all by default).
+    The frame is expected in EPSG:4326.
+    """
+
+    frame: gpd.GeoDataFrame
+    properties: Optional[Sequence[str]] = None
+    chunk_size: int = DEFAULT_CHUNK_SIZE
+
+    def __len__(self) -> int:
+        return len(self.frame)
+
+    def _columns(self) -> list:
+        geometry = self.frame.geometry.name
+        names = self.properties if self.properties is not None else self.frame.columns
+        return [c for c in names if c != geometry and c in self.frame.columns]
+
+    def iter_features(self) -> Iterator[str]:
+        """JSON text of the features, one string per chunk (comma separated)."""
+        columns = self._columns()
+        geometry = self.frame.geometry.name
+        for start in range(0, len(self.frame), self.chunk_size):
+            chunk = self.frame.iloc[start : start + self.chunk_size]
+            geoms = shapely.to_geojson(np.asarray(chunk[geometry]))
+            if columns:
+                props = chunk[columns].to_json(
+                    orient="records", lines=True, date_format="iso", default_handler=str
+                ).splitlines()
+            else:
+                props = ["{}"] * len(chunk)
+            yield ",".join(
+                '{"type":"Feature","properties":%s,"geometry":%s}' % (p, g if g is not None else "null")
+                for p, g in zip(props, geoms)
+            )
+
+    def iter_chunks(self) -> Iterator[str]:
+        yield '{"type":"FeatureCollection","features":['
+        first = True
+        for text in self.iter_features():
+            if not text:
+                continue
+            yield text if first else "," + text
+            first = False
+        yield "]}"
+
+    def to_dict(self) -> dict:
+        return json.loads("".join(self.iter_chunks()))
+
+
+def _iter_parts(value: Any) -> Iterator[str]:
+    if isinstance(value, FeatureSource):
+        yield from value.iter_chunks()
+    elif isinstance(value, dict):
+        yield "{"
+        for i, (key, item) in enumerate(value.items()):
+            yield ("," if i else "") + json.dumps(str(key)) + ":"
+            yield from _iter_parts(item)
+        yield "}"
+    elif isinstance(value, (list, tuple)):
+        yield "["
+        for i, item in enumerate(value):
+            if i:
+                yield ","
+            yield from _iter_parts(item)
+        yield "]"
+    else:
+        value = to_native(value)
+        if isinstance(value, float) and not math.isfinite(value):
+            # NaN/inf n'existent pas en JSON : null, comme pour les propriétés
+            value = None
+        yield json.dumps(value, ensure_ascii=False, allow_nan=False)
+
+
+def iter_json(document: Any, flush_bytes: int = FLUSH_BYTES) -> Iterator[bytes]:
+    """Encode ``document`` (which may contain :class:`FeatureSource`) in chunks."""
+    buffer: list = []
+    size = 0
+    for part in _iter_parts(document):
+        buffer.append(part)
+        size += len(part)
+        if size >= flush_bytes:
+            yield "".join(buffer).encode("utf-8")
+            buffer, size = [], 0
+    if buffer:
+        yield "".join(buffer).encode("utf-8")
+
+
+def dumps(document: Any) -> str:
+    """Whole-document counterpart of :func:`iter_json`."""
+    return b"".join(iter_json(document)).decode("utf-8")
@@ -0,0 +1,340 @@
+"""Isochrones on the network of a stored result.
+
+When a result is saved its street network is written next to the downloads
+as compact arrays (``network.npz``): projected node coordinates, the
+directed adjacency with the shortest length of every ordered node pair (a
+one-way street is only walked along its direction), and the edges with
+their geometry. :class:`NetworkSource` loads them once into a
+SciPy CSR matrix and a KD-tree over the nodes, and keeps them in a small
+per-process LRU, so answering "what is within 10 minutes of here" does not
+need a new analysis:
+
+* origins are snapped to their nearest node through the KD-tree;
+* a single multi-source Dijkstra, bounded by the largest threshold, gives
+  the network distance of every node to the closest origin;
+* for each threshold the reached edges (cut where the distance runs out on
+  the boundary edges, from the end they can be entered by) are buffered
+  into one polygon.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+import shapely
+from pyproj import CRS, Transformer
+from scipy.sparse import csgraph
+from scipy.spatial import cKDTree
+from shapely import ops
+
+from grafos import metrics, projection
+from grafos.ch import ContractionHierarchy, build_hierarchy
+
+
+__all__ = [
+    "HIERARCHY_FILE",
+    "SOURCE_FILE",
+    "NetworkCache",
+    "NetworkSource",
+    "default_cache",
+    "isochrones",
+    "write_hierarchy",
+    "write_source",
+]
+
+
+SOURCE_FILE = "network.npz"
+# Hiérarchie orientée ; les anciens fichiers non orientés gardaient « network.ch.npz »
+HIERARCHY_FILE = "network.dch.npz"
+DEFAULT_BUFFER_M = 25.0
+# Longueur nulle : conservée comme arête par csgraph
+_EPSILON = 1e-6
+
+
+def write_source(result: Dict[str, Any], path: os.PathLike | str, digest=None) -> bool:
+    """Write the routable network of ``result`` to ``path`` (npz).
+
+    Returns ``False`` (nothing written) when the result has no usable
+    node/edge frames. ``digest`` (a hashlib object) is updated with the
+    arrays written.
+    """
+    nodes, edges = result.get("nodes"), result.get("edges")
+    if nodes is None or edges is None or nodes.empty or edges.empty:
+        return False
+    endpoints = metrics._endpoints(edges)
+    if endpoints is None:
+        return False
+    index = pd.Index(nodes.index)
+    u, v = index.get_indexer(endpoints[0]), index.get_indexer(endpoints[1])
+    known = (u >= 0) & (v >= 0)
+
+    x = pd.to_numeric(nodes["x"], errors="coerce").to_numpy(dtype=float)
+    y = pd.to_numeric(nodes["y"], errors="coerce").to_numpy(dtype=float)
+    geoms = np.asarray(edges.geometry)
+    crs = CRS.from_user_input(edges.crs) if edges.crs is not None else CRS.from_epsg(4326)
+    if not crs.is_projected:
+        # Réseau resté en degrés : projection locale pour les tampons en mètres
+        target = projection.local_utm_crs(x, y)
+        x, y = Transformer.from_crs(crs, target, always_xy=True).transform(x, y)
+        geoms = projection.transform_geometries(geoms, crs, target)
+        crs = target
+
+    if "length" in edges.columns:
+        length = pd.to_numeric(edges["length"], errors="coerce").to_numpy(dtype=float)
+    else:
+        length = shapely.length(geoms)
+    length = np.where(np.isfinite(length), np.maximum(length, _EPSILON), 1.0)
+
+    # Paires orientées : la plus courte des arêtes parallèles de même sens
+    u, v, length, geoms = u[known], v[known], length[known], geoms[known]
+    n = len(index)
+    codes, pair = np.unique(u * n + v, return_inverse=True)
+    pair_length = np.full(codes.size, np.inf)
+    np.minimum.at(pair_length, pair.reshape(-1), length)
+
+    coords, owner = shapely.get_coordinates(geoms, return_index=True)
+    arrays = {
+        "x": np.asarray(x, dtype=float),
+        "y": np.asarray(y, dtype=float),
+        "crs": np.array(crs.to_wkt()),
+        "pair_u": (codes // n).astype(np.int64),
+        "pair_v": (codes % n).astype(np.int64),
+        "pair_length": pair_length,
+        "directed": np.array(True),
+        "edge_u": u.astype(np.int64),
+        "edge_v": v.astype(np.int64),
+        "edge_length": length,
+        "coords": coords,
+        "counts": np.bincount(owner, minlength=len(geoms)).astype(np.int64),
+    }
+    if digest is not None:
+        for key in sorted(arrays):
+            digest.update(key.encode() + b"\0")
+            digest.update(np.ascontiguousarray(arrays[key]).tobytes())
+    with open(path, "wb") as fh:
+        np.savez(fh, **arrays)
+    return True
+
+
+def write_hierarchy(source: os.PathLike | str, path: os.PathLike | str) -> None:
+    """Contract the network written by :func:`write_source` and save it to ``path``."""
+    NetworkSource.load(source).build_hierarchy().save(path)
+
+
+@dataclass
+class NetworkSource:
+    """Routable network of a result: CSR adjacency, node KD-tree, edges.
+
+    ``matrix`` is directed. ``edge_*`` and ``geometries`` keep one edge per
+    pair of adjacent nodes; ``forward``/``backward`` tell whether it can be
+    travelled from ``edge_u`` to ``edge_v`` and back.
+    The contraction hierarchy used for routing is written next to the
+    network file when the result is saved (see :func:`write_hierarchy`).
+    """
+
+    matrix: sp.csr_matrix
+    tree: cKDTree
+    edge_u: np.ndarray
+    edge_v: np.ndarray
+    edge_length: np.ndarray
+    geometries: np.ndarray
+    forward: np.ndarray
+    backward: np.ndarray
+    crs: CRS
+    to_wgs84: Transformer
+    from_wgs84: Transformer
+    path: Optional[Path] = None
+    _hierarchy: Optional[ContractionHierarchy] = field(default=None, repr=False)
+    _pairs: Optional[Dict[Tuple[int, int], int]] = field(default=None, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    @classmethod
+    def load(cls, path: os.PathLike | str) -> "NetworkSource":
+        with np.load(path, allow_pickle=False) as data:
+            x, y = data["x"], data["y"]
+            pair_u, pair_v, pair_length = data["pair_u"], data["pair_v"], data["pair_length"]
+            edge_u, edge_v, edge_length = data["edge_u"], data["edge_v"], data["edge_length"]
+            coords, counts = data["coords"], data["counts"]
+            crs = CRS.from_wkt(str(data["crs"]))
+            directed = "directed" in data.files
+        n = x.size
+        if not directed:
+            # Fichier antérieur aux sens uniques : paires valables dans les deux sens
+            pair_u, pair_v = np.r_[pair_u, pair_v], np.r_[pair_v, pair_u]
+            pair_length = np.r_[pair_length, pair_length]
+            edge_u, edge_v = np.r_[edge_u, edge_v], np.r_[edge_v, edge_u]
+            edge_length, counts = np.r_[edge_length, edge_length], np.r_[counts, counts]
+            coords = np.concatenate([coords, coords])
+        # Matrice orientée ; les boucles ne raccourcissent aucun trajet
+        ring = pair_u != pair_v
+        pair_u, pair_v, pair_length = pair_u[ring], pair_v[ring], pair_length[ring]
+        matrix = sp.coo_matrix((pair_length, (pair_u, pair_v)), shape=(n, n)).tocsr()
+        geometries = np.full(counts.size, None, dtype=object)
+        valid = counts >= 2
+        if valid.any():
+            keep = np.repeat(valid, counts)
+            index = np.repeat(np.arange(int(valid.sum())), counts[valid])
+            geometries[valid] = shapely.linestrings(coords[keep], indices=index)
+        # Une géométrie par paire de nœuds : les arêtes réciproques se superposent
+        _, first = np.unique(np.minimum(edge_u, edge_v) * n + np.maximum(edge_u, edge_v), return_index=True)
+        primary = np.zeros(edge_u.size, dtype=bool)
+        primary[first] = True
+        arcs = edge_u * n + edge_v
+        forward = np.isin(arcs[primary], arcs)
+        backward = np.isin((edge_v * n + edge_u)[primary], arcs)
+        located = np.isfinite(x) & np.isfinite(y)
+        points = np.column_stack([np.where(located, x, 1e12), np.where(located, y, 1e12)])
+        return cls(
+            matrix=matrix,
+            tree=cKDTree(points),
+            edge_u=edge_u[primary],
+            edge_v=edge_v[primary],
+            edge_length=edge_length[primary],
+            geometries=geometries[primary],
+            forward=forward,
+            backward=backward,
+            crs=crs,
+            to_wgs84=Transformer.from_crs(crs, 4326, always_xy=True),
+            from_wgs84=Transformer.from_crs(4326, crs, always_xy=True),
+            path=Path(path),
+        )
+
+    def snap(self, lat: Sequence[float], lon: Sequence[float]) -> Tuple[np.ndarray, np.ndarray]:
+        """Nearest node of each origin and its distance (m)."""
+        x, y = self.from_wgs84.transform(np.asarray(lon, dtype=float), np.asarray(lat, dtype=float))
+        distance, node = self.tree.query(np.column_stack([x, y]))
+        return np.asarray(node, dtype=np.int64), np.asarray(distance, dtype=float)
+
+    def hierarchy(self) -> ContractionHierarchy:
+        """Contraction hierarchy of the network.
+
+        Loaded from the file :func:`write_hierarchy` saved beside the
+        network; a network without one is contracted in memory.
+        """
+        with self._lock:
+            if self._hierarchy is not None:
+                return self._hierarchy
+            target = self.path.with_name(HIERARCHY_FILE) if self.path is not None else None
+            if target is not None and target.is_file():
+                self._hierarchy = ContractionHierarchy.load(target)
+            else:
+                self._hierarchy = self.build_hierarchy()
+            return self._hierarchy
+
+    def build_hierarchy(self) -> ContractionHierarchy:
+        """Contract the directed network (plain Python, seconds on a city)."""
+        arcs = self.matrix.tocoo()
+        return build_hierarchy(self.matrix.shape[0], arcs.row, arcs.col, arcs.data)
+
+    def edge_between(self, a: int, b: int) -> Optional[int]:
+        """Position in ``edge_*`` of the edge joining two nodes, if any."""
+        if self._pairs is None:
+            lo, hi = np.minimum(self.edge_u, self.edge_v), np.maximum(self.edge_u, self.edge_v)
+            self._pairs = {pair: i for i, pair in enumerate(zip(lo.tolist(), hi.tolist()))}
+        return self._pairs.get((min(a, b), max(a, b)))
+
+
+def _reached_lines(source: NetworkSource, dist: np.ndarray, limit: float) -> np.ndarray:
+    """Edges within ``limit``, boundary edges cut where the budget runs out.
+
+    An edge is only entered from an end its direction allows.
+    """
+    du = np.where(source.forward, dist[source.edge_u], np.inf)
+    dv = np.where(source.backward, dist[source.edge_v], np.inf)
+    has_geometry = ~shapely.is_missing(source.geometries)
+    full = (du + source.edge_length <= limit) | (dv + source.edge_length <= limit)
+    full &= has_geometry
+    lines = list(source.geometries[full])
+    # Arêtes de bord : seule la part atteignable depuis chaque extrémité
+    for edge in np.flatnonzero(has_geometry & ~full & ((du < limit) | (dv < limit))):
+        geom, length = source.geometries[edge], source.edge_length[edge]
+        if du[edge] < limit:
+            lines.append(ops.substring(geom, 0.0, min((limit - du[edge]) / length, 1.0), normalized=True))
+        if dv[edge] < limit:
+            lines.append(ops.substring(geom, max(1.0 - (limit - dv[edge]) / length, 0.0), 1.0, normalized=True))
+    return np.array(lines, dtype=object)
+
+
+def isochrones(
+    source: NetworkSource,
+    lat: Sequence[float],
+    lon: Sequence[float],
+    distances: Sequence[float],
+    buffer_m: float = DEFAULT_BUFFER_M,
+) -> Dict[str, Any]:
+    """Isochrone polygons (WGS84) around the origins, one per distance (m).
+
+    Returns ``{"polygons": [...], "areas": [...], "snapped": [...],
+    "snap_distances": [...]}`` with polygons in the order of ``distances``.
+    """
+    nodes, snap_distances = source.snap(lat, lon)
+    limit = float(max(distances))
+    dist = csgraph.dijkstra(
+        source.matrix, directed=True, indices=np.unique(nodes), limit=limit, min_only=True
+    )
+    polygons, areas = [], []
+    for distance in distances:
+        lines = _reached_lines(source, dist, float(distance))
+        lines = lines[~shapely.is_empty(lines)] if lines.size else lines
+        if lines.size == 0:
+            # Origine isolée : disque du tampon autour du nœud
+            xy = source.tree.data[nodes]
+            shape = shapely.buffer(shapely.multipoints(xy), buffer_m)
+        else:
+            # Simplification sous la moitié du tampon : invisible, et le
+            # tampon d'une seule géométrie multiple évite une union coûteuse
+            merged = shapely.simplify(shapely.multilinestrings(lines), buffer_m / 2)
+            shape = shapely.buffer(merged, buffer_m, quad_segs=2)
+        areas.append(float(shapely.area(shape)))
+        polygons.append(shape)
+    wgs84 = projection.transform_geometries(np.array(polygons, dtype=object), source.crs, 4326)
+    snapped_x, snapped_y = source.to_wgs84.transform(source.tree.data[nodes, 0], source.tree.data[nodes, 1])
+    return {
+        "polygons": list(wgs84),
+        "areas": areas,
+        "snapped": [[float(a), float(b)] for a, b in zip(np.atleast_1d(snapped_y), np.atleast_1d(snapped_x))],
+        "snap_distances": [float(d) for d in snap_distances],
+    }
+
+
+class NetworkCache:
+    """LRU of loaded :class:`NetworkSource` objects, by result id."""
+
+    def __init__(self, max_sources: Optional[int] = None) -> None:
+        if max_sources is None:
+            max_sources = int(os.environ.get("ISOCHRONE_CACHE_SOURCES", 4))
+        self.max_sources = max(1, int(max_sources))
+        self._sources: "OrderedDict[str, NetworkSource]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def source(self, path: Path) -> NetworkSource:
+        key = str(path)
+        with self._lock:
+            if key in self._sources:
+                self._sources.move_to_end(key)
+                return self._sources[key]
+        loaded = NetworkSource.load(path)
+        with self._lock:
+            self._sources[key] = loaded
+            while len(self._sources) > self.max_sources:
+                self._sources.popitem(last=False)
+        return loaded
+
+
+_DEFAULT: Optional[NetworkCache] = None
+
+
+def default_cache() -> NetworkCache:
+    """Process-wide cache (``ISOCHRONE_CACHE_SOURCES`` networks, 4 by default)."""
+    global _DEFAULT
+    if _DEFAULT is None:
+        _DEFAULT = NetworkCache()
+    return _DEFAULT
@@ -0,0 +1,475 @@
+"""Background analysis jobs on a bounded process pool.
+
+``analysis.run`` is synchronous and CPU-bound; running it inside an
+``async def`` endpoint blocks the event loop for every client. Jobs are
+submitted to a :class:`~concurrent.futures.ProcessPoolExecutor` instead and the
+endpoints only await (or poll) the resulting futures.
+
+Each worker is its own single-process pool so that an analysis can be sent
+to a chosen process. A job goes to the worker that last ran its network
+(:func:`app.analysis.graph_key`), whose :class:`~app.pipeline.StageCache`
+already holds that graph's stages, when that worker is idle; otherwise to any
+idle worker. Jobs only wait when every worker is busy, and the first worker to
+free up takes the oldest of them (or one on the network it just cached).
+
+Worker processes report the stage they are in through a dictionary shared via
+a :class:`multiprocessing.Manager`; the same dictionary carries cancellation
+requests, which the worker honours at the next stage boundary.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import CancelledError, Executor, Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from grafos import projection
+
+from . import analysis, map as map_mod
+from .utils import to_native
+
+
+__all__ = [
+    "Job",
+    "JobManager",
+    "QueueFull",
+    "affinity_key",
+    "get_manager",
+    "request_key",
+    "run_analysis",
+    "shutdown_manager",
+]
+
+
+DEFAULT_WORKERS = 2
+DEFAULT_MAX_QUEUE = 8
+FINISHED_JOBS_KEPT = 256
+NETWORK_HOMES_KEPT = 1024
+
+
+class QueueFull(RuntimeError):
+    """The pool and its waiting queue are both full."""
+
+
+def request_key(params: Dict[str, Any]) -> str:
+    """Canonical form of analysis parameters, used to coalesce duplicates."""
+    from grafos.store import normalise_key
+
+    canonical = dict(params)
+    canonical["city"] = normalise_key(canonical.get("city") or "", "", 0).split("|")[0]
+    canonical["mode"] = str(canonical.get("mode", "")).strip().lower()
+    return json.dumps(canonical, sort_keys=True, default=str)
+
+
+def affinity_key(params: Dict[str, Any]) -> str:
+    """Network identity of an analysis, used to pick its worker."""
+    return analysis.graph_key(
+        params.get("city") or "",
+        params.get("mode", "walk"),
+        params.get("radius_km", 1.0),
+        params.get("lat"),
+        params.get("lon"),
+    )
+
+
+def _bounds(result: Dict[str, Any]) -> Optional[list]:
+    """``[[south, west], [north, east]]`` of the network, for ``fitBounds``."""
+    edges = result.get("edges")
+    if edges is None or edges.empty:
+        return None
+    minx, miny, maxx, maxy = projection.wgs84_frame(edges, result.get("edges_wgs84")).total_bounds
+    return [[float(miny), float(minx)], [float(maxy), float(maxx)]]
+
+
+def build_response(result: Dict[str, Any], color_by: str) -> Dict[str, Any]:
+    """JSON-ready API response for a successful ``analysis.run`` result."""
+
+    result_id = result.get("result_id")
+    # Avec un résultat enregistré, le réseau est servi en tuiles vectorielles
+    map_payload = map_mod.build_map_payload(result, color_by=color_by, geojson=not result_id)
+    h3_payload = map_mod.h3_payload(result)
+
+    metrics_df = result.get("metrics_df")
+    metrics_table = []
+    if metrics_df is not None and not metrics_df.empty:
+        metrics_table = metrics_df.to_dict(orient="records")
+
+    base = f"/api/results/{result_id}"
+    response: Dict[str, Any] = {
+        "resultId": result_id,
+        "metrics": to_native(result.get("metrics", {})),
+        "map": map_payload,
+        "metricsTable": to_native(metrics_table),
+        # Seulement des URL : les fichiers sont servis à la demande
+        "downloads": {
+            "edgesGeoJSON": f"{base}/edges.geojson" if result_id else None,
+            "metricsCSV": f"{base}/metrics.csv" if result_id else None,
+            "h3GeoJSON": f"{base}/h3.geojson" if result_id and h3_payload else None,
+        },
+        "colorBy": map_payload.get("colorBy"),
+    }
+    if result_id:
+        map_payload["tiles"] = f"{base}/tiles/{{z}}/{{x}}/{{y}}.mvt"
+        map_payload["bounds"] = _bounds(result)
+
+    if h3_payload:
+        response["h3"] = h3_payload
+
+    return response
+
+
+def run_analysis(params: Dict[str, Any], job_id: Optional[str] = None, shared=None) -> Dict[str, Any]:
+    """Worker entry point: run the analysis and build the response.
+
+    Errors come back as ``{"error": ...}`` dictionaries, like ``analysis.run``.
+    """
+
+    def progress(stage: str) -> None:
+        if shared is None or job_id is None:
+            return
+        if shared.get(f"{job_id}:cancel"):
+            raise analysis.AnalysisCancelled()
+        shared[job_id] = {"stage": stage, "started": time.time()}
+
+    if shared is not None and job_id is not None:
+        if shared.get(f"{job_id}:cancel"):
+            return {"error": "Analyse annulée", "code": "cancelled"}
+        shared[job_id] = {"stage": "starting", "started": time.time()}
+    result = analysis.run(progress=progress, **params)
+    if result.get("error"):
+        return to_native(result)
+    return build_response(result, color_by=params.get("color_by", "length"))
+
+
+@dataclass
+class Job:
+    """One caller's handle on a computation.
+
+    Identical requests share one computation (``task_id``, ``future``) but
+    each gets its own ``id``, so a caller can only withdraw itself.
+    """
+
+    id: str
+    params: Dict[str, Any]
+    future: Future
+    key: Optional[str] = None
+    task_id: str = ""
+    created: float = field(default_factory=time.time)
+    finished: Optional[float] = None
+    cancel_requested: bool = False
+    # Annulé par ce client alors que d'autres attendent encore le calcul
+    detached: bool = False
+
+    def __post_init__(self) -> None:
+        self.task_id = self.task_id or self.id
+
+
+class JobManager:
+    """Submit analyses to a bounded pool and track their progress.
+
+    At most ``max_workers`` jobs run at once and ``max_queue`` more may wait;
+    beyond that :meth:`submit` raises :class:`QueueFull`. Without an explicit
+    ``executor`` each worker is a single-process pool; a job prefers the
+    worker that last ran its network (:func:`affinity_key`) but never waits
+    while another worker is idle.
+
+    Submitting parameters identical (see :func:`request_key`) to a job that is
+    still queued or running does not start a new computation: the caller gets
+    the in-flight job and shares its result.
+    """
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        max_queue: Optional[int] = None,
+        executor: Optional[Executor] = None,
+    ) -> None:
+        self.max_workers = max_workers or int(os.environ.get("ANALYSIS_WORKERS", DEFAULT_WORKERS))
+        self.max_queue = max_queue if max_queue is not None else int(
+            os.environ.get("ANALYSIS_MAX_QUEUE", DEFAULT_MAX_QUEUE)
+        )
+        self._executor = executor
+        self._workers: List[ProcessPoolExecutor] = []
+        self._busy: List[bool] = []
+        # Travaux en attente d'un processus libre : (future, réseau, fonction, arguments)
+        self._pending: Deque[Tuple[Future, str, Callable, tuple]] = deque()
+        # Dernier processus ayant traité chaque réseau (son cache le contient)
+        self._homes: "OrderedDict[str, int]" = OrderedDict()
+        self._manager = None
+        self._shared = None
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._inflight: Dict[str, Job] = {}
+        # Identifiants des clients encore abonnés à chaque calcul
+        self._subscribers: Dict[str, Set[str]] = {}
+        self._lock = threading.RLock()
+        self.submitted = 0
+        self.coalesced = 0
+
+    # -- infrastructure --------------------------------------------------
+    def _ensure_started(self) -> None:
+        if self._executor is None and not self._workers:
+            # Un processus par pool : le choix du pool fixe le cache utilisé
+            self._workers = [ProcessPoolExecutor(max_workers=1) for _ in range(self.max_workers)]
+            self._busy = [False] * self.max_workers
+        if self._shared is None:
+            if self._workers or isinstance(self._executor, ProcessPoolExecutor):
+                self._manager = multiprocessing.Manager()
+                self._shared = self._manager.dict()
+            else:
+                self._shared = {}
+
+    def _preferred(self, network: str) -> int:
+        home = self._homes.get(network)
+        if home is not None:
+            return home
+        digest = hashlib.sha1(network.encode("utf-8")).digest()
+        return int.from_bytes(digest[:8], "big") % len(self._workers)
+
+    def _submit_task(self, params: Dict[str, Any], fn: Callable, *args: Any) -> Future:
+        """Run ``fn(*args)`` for the analysis ``params``; called under ``_lock``."""
+        if self._executor is not None:
+            return self._executor.submit(fn, *args)
+        future: Future = Future()
+        network = affinity_key(params)
+        worker = self._preferred(network)
+        if self._busy[worker]:
+            idle = [i for i, busy in enumerate(self._busy) if not busy]
+            worker = idle[0] if idle else None
+        if worker is None:
+            self._pending.append((future, network, fn, args))
+        else:
+            self._start(worker, future, network, fn, args)
+        return future
+
+    def _start(self, worker: int, future: Future, network: str, fn: Callable, args: tuple) -> bool:
+        # Sous ``_lock`` ; faux si le travail a été annulé pendant son attente
+        if not future.set_running_or_notify_cancel():
+            return False
+        try:
+            inner = self._workers[worker].submit(fn, *args)
+        except BrokenProcessPool:
+            # Processus mort (mémoire…) : remplacé pour les travaux suivants
+            self._workers[worker] = ProcessPoolExecutor(max_workers=1)
+            inner = self._workers[worker].submit(fn, *args)
+        self._busy[worker] = True
+        self._homes[network] = worker
+        self._homes.move_to_end(network)
+        while len(self._homes) > NETWORK_HOMES_KEPT:
+            self._homes.popitem(last=False)
+        inner.add_done_callback(lambda f, worker=worker, outer=future: self._worker_done(worker, f, outer))
+        return True
+
+    def _worker_done(self, worker: int, inner: Future, outer: Future) -> None:
+        with self._lock:
+            if worker < len(self._busy):
+                self._busy[worker] = False
+                self._start_next(worker)
+        if inner.cancelled():
+            outer.set_exception(CancelledError())
+        elif inner.exception() is not None:
+            outer.set_exception(inner.exception())
+        else:
+            outer.set_result(inner.result())
+
+    def _start_next(self, worker: int) -> None:
+        """Give the idle ``worker`` a waiting job (under ``_lock``).
+
+        A job on a network this worker holds is preferred among the first
+        ``max_workers`` waiting ones, so no job is passed over indefinitely.
+        """
+        while self._pending:
+            window = list(self._pending)[: len(self._workers)]
+            choice = next((t for t in window if self._homes.get(t[1]) == worker), window[0])
+            self._pending.remove(choice)
+            future, network, fn, args = choice
+            if self._start(worker, future, network, fn, args):
+                return
+
+    def shutdown(self) -> None:
+        with self._lock:
+            pending, self._pending = list(self._pending), deque()
+        for future, *_ in pending:
+            future.cancel()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+        for worker in self._workers:
+            worker.shutdown(wait=True, cancel_futures=True)
+        self._workers = []
+        self._busy = []
+        if self._manager is not None:
+            self._manager.shutdown()
+            self._manager = None
+        self._shared = None
+
+    def _active(self) -> int:
+        return len({job.task_id for job in self._jobs.values() if not job.future.done()})
+
+    def _forget_old(self) -> None:
+        finished = [job_id for job_id, job in self._jobs.items() if job.future.done()]
+        for job_id in finished[: max(0, len(finished) - FINISHED_JOBS_KEPT)]:
+            job = self._jobs.pop(job_id, None)
+            if job is None or any(other.task_id == job.task_id for other in self._jobs.values()):
+                continue
+            self._subscribers.pop(job.task_id, None)
+            if self._shared is not None:
+                self._shared.pop(job.task_id, None)
+                self._shared.pop(f"{job.task_id}:cancel", None)
+
+    # -- API -------------------------------------------------------------
+    def submit(self, params: Dict[str, Any]) -> Job:
+        key = request_key(params)
+        with self._lock:
+            self._ensure_started()
+            self.submitted += 1
+            running = self._inflight.get(key)
+            if running is not None and not running.future.done() and not running.cancel_requested:
+                job = Job(
+                    id=uuid.uuid4().hex,
+                    params=params,
+                    future=running.future,
+                    key=key,
+                    task_id=running.task_id,
+                )
+                running.future.add_done_callback(lambda _f, job=job: self._finish(job))
+                self._jobs[job.id] = job
+                self._subscribers[job.task_id].add(job.id)
+                self.coalesced += 1
+                return job
+            if self._active() >= self.max_workers + self.max_queue:
+                raise QueueFull(
+                    f"{self._active()} analyses en cours ou en attente ; réessayez plus tard"
+                )
+            job_id = uuid.uuid4().hex
+            future = self._submit_task(params, run_analysis, params, job_id, self._shared)
+            job = Job(id=job_id, params=params, future=future, key=key)
+            future.add_done_callback(lambda _f, job=job: self._finish(job))
+            self._jobs[job_id] = job
+            self._inflight[key] = job
+            self._subscribers[job_id] = {job_id}
+            self._forget_old()
+        return job
+
+    def _finish(self, job: Job) -> None:
+        job.finished = time.time()
+        with self._lock:
+            if self._inflight.get(job.key) is job:
+                del self._inflight[job.key]
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a queued job, or ask a running one to stop at its next stage.
+
+        A computation shared by several identical requests keeps running
+        until every one of them has cancelled it; cancelling the same job id
+        twice only counts once.
+        """
+        job = self.get(job_id)
+        if job is None or job.future.done():
+            return False
+        with self._lock:
+            if job.cancel_requested or job.detached:
+                return True
+            subscribers = self._subscribers.get(job.task_id, set())
+            subscribers.discard(job.id)
+            if subscribers:
+                job.detached = True
+                return True
+            job.cancel_requested = True
+            # Les autres abonnés (déjà retirés) voient aussi l'annulation
+            for other in self._jobs.values():
+                if other.task_id == job.task_id:
+                    other.cancel_requested = True
+            if self._inflight.get(job.key) is not None and self._inflight[job.key].task_id == job.task_id:
+                del self._inflight[job.key]
+        if job.future.cancel():
+            return True
+        if self._shared is not None:
+            self._shared[f"{job.task_id}:cancel"] = True
+        return True
+
+    async def wait(self, job: Job) -> Dict[str, Any]:
+        return await asyncio.wrap_future(job.future)
+
+    def status(self, job: Job) -> Dict[str, Any]:
+        """Serializable view of a job: state, current stage and result."""
+        info = dict(self._shared.get(job.task_id) or {}) if self._shared is not None else {}
+        stage = info.get("stage")
+        payload: Dict[str, Any] = {"id": job.id, "created": job.created, "finished": job.finished}
+
+        if job.future.cancelled() or job.detached:
+            payload["status"] = "cancelled"
+        elif job.future.done():
+            exc = job.future.exception()
+            result = None if exc is not None else job.future.result()
+            if exc is not None:
+                payload.update(status="error", error=f"{type(exc).__name__}: {exc}")
+            elif result.get("code") == "cancelled":
+                payload["status"] = "cancelled"
+            elif result.get("error"):
+                payload.update(status="error", error=result)
+            else:
+                payload.update(status="done", result=result)
+        elif job.cancel_requested:
+            payload["status"] = "cancelling"
+        elif stage is not None:
+            payload["status"] = "running"
+        else:
+            payload["status"] = "queued"
+
+        stages = list(analysis.STAGES)
+        current = stages.index(stage) if stage in stages else -1
+        if payload["status"] == "done":
+            current = len(stages)
+        payload["stage"] = stage
+        payload["stages"] = [
+            {
+                "name": name,
+                "status": "done" if i < current else ("running" if i == current else "pending"),
+            }
+            for i, name in enumerate(stages)
+        ]
+        payload["progress"] = max(0, current) / len(stages)
+        return payload
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            active = self._active()
+        return {
+            "active": active,
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "submitted": self.submitted,
+            "coalesced": self.coalesced,
+        }
+
+
+_MANAGER: Optional[JobManager] = None
+
+
+def get_manager() -> JobManager:
+    """Process-wide job manager used by the API."""
+    global _MANAGER
+    if _MANAGER is None:
+        _MANAGER = JobManager()
+    return _MANAGER
+
+
+def shutdown_manager() -> None:
+    global _MANAGER
+    if _MANAGER is not None:
+        _MANAGER.shutdown()
+        _MANAGER = None
@@ -0,0 +1,184 @@
+"""Levels of detail for the edge geometries sent to the map.
+
+Full-resolution street geometries carry far more vertices than a screen can
+show at city-wide zooms. :class:`LevelsOfDetail` simplifies the Web Mercator
+geometries of a result once per zoom level of :data:`LOD_ZOOMS` (half a
+pixel of tolerance at that zoom) and records the size of every edge, so that
+edges smaller than a pixel can be left out at low zooms. The analysis builds
+it once per network; the levels are saved in the tile source of every result
+(:meth:`LevelsOfDetail.to_arrays`) and reused by the GeoJSON payload.
+
+:func:`quantize` rounds coordinates to a fixed number of decimals before
+GeoJSON serialisation.
+"""
+
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass, field
+from typing import Dict, List, Mapping, Sequence, Tuple
+
+import geopandas as gpd
+import numpy as np
+import shapely
+
+from grafos import projection
+
+
+__all__ = [
+    "LOD_ZOOMS",
+    "LevelsOfDetail",
+    "for_zoom",
+    "pack_lines",
+    "pixel_size",
+    "quantize",
+    "unpack_lines",
+]
+
+
+ORIGIN = 20037508.342789244
+TILE_PIXELS = 256
+LOD_ZOOMS = (8, 10, 12, 14)
+TOLERANCE_PIXELS = 0.5
+MIN_PIXELS = 0.5
+DEFAULT_PRECISION = 6
+
+
+def pixel_size(zoom: float) -> float:
+    """Ground size of one screen pixel (Web Mercator metres) at ``zoom``."""
+    return 2 * ORIGIN / (TILE_PIXELS * 2.0**zoom)
+
+
+def quantize(geometries: np.ndarray, precision: int | None = None) -> np.ndarray:
+    """Round coordinates to ``precision`` decimals (``MAP_COORD_PRECISION``).
+
+    Six decimals of a degree are about 10 cm. Points that become identical
+    are merged.
+    """
+    if precision is None:
+        precision = int(os.environ.get("MAP_COORD_PRECISION", DEFAULT_PRECISION))
+    rounded = shapely.transform(geometries, lambda coords: np.round(coords, precision))
+    return shapely.remove_repeated_points(rounded)
+
+
+def pack_lines(geometries: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Coordinates and per-geometry vertex counts of line geometries."""
+    coords, index = shapely.get_coordinates(geometries, return_index=True)
+    return coords, np.bincount(index, minlength=len(geometries)).astype(np.int64)
+
+
+def unpack_lines(coords: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """Inverse of :func:`pack_lines` (``None`` for fewer than two vertices)."""
+    geometries = np.full(counts.size, None, dtype=object)
+    valid = counts >= 2
+    if valid.any():
+        keep = np.repeat(valid, counts)
+        index = np.repeat(np.arange(int(valid.sum())), counts[valid])
+        geometries[valid] = shapely.linestrings(coords[keep], indices=index)
+    return geometries
+
+
+@dataclass(eq=False)
+class LevelsOfDetail:
+    """Simplified copies of ``full`` for each zoom of ``zooms``."""
+
+    full: np.ndarray
+    zooms: Sequence[int]
+    levels: List[np.ndarray]
+    extent: np.ndarray
+    # Niveaux reconvertis en WGS84 pour le GeoJSON, à la demande
+    _wgs84: Dict[int, np.ndarray] = field(default_factory=dict, repr=False)
+
+    @classmethod
+    def build(
+        cls,
+        geometries: np.ndarray,
+        zooms: Sequence[int] = LOD_ZOOMS,
+        tolerance_pixels: float = TOLERANCE_PIXELS,
+    ) -> "LevelsOfDetail":
+        """``geometries`` must be in a metric CRS (Web Mercator for tiles)."""
+        geometries = np.asarray(geometries, dtype=object)
+        zooms = tuple(sorted(zooms))
+        levels = []
+        current = geometries
+        # Du plus fin au plus grossier : chaque niveau simplifie le précédent
+        for zoom in reversed(zooms):
+            current = shapely.simplify(current, tolerance_pixels * pixel_size(zoom))
+            levels.append(current)
+        levels.reverse()
+        xmin, ymin, xmax, ymax = shapely.bounds(geometries).T
+        extent = np.nan_to_num(np.maximum(xmax - xmin, ymax - ymin), nan=0.0)
+        return cls(full=geometries, zooms=zooms, levels=levels, extent=extent)
+
+    @classmethod
+    def from_wgs84(cls, geometries: np.ndarray, zooms: Sequence[int] = LOD_ZOOMS) -> "LevelsOfDetail":
+        """Levels of EPSG:4326 geometries, simplified in Web Mercator."""
+        return cls.build(projection.transform_geometries(geometries, 4326, 3857), zooms=zooms)
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """Simplified levels and extents as plain arrays (``lod_*`` keys)."""
+        arrays = {"lod_zooms": np.asarray(self.zooms, dtype=np.int64), "lod_extent": self.extent}
+        for i, level in enumerate(self.levels):
+            arrays[f"lod_{i}_coords"], arrays[f"lod_{i}_counts"] = pack_lines(level)
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, full: np.ndarray, arrays: Mapping[str, np.ndarray]) -> "LevelsOfDetail":
+        """Levels saved by :meth:`to_arrays` for the ``full`` geometries."""
+        zooms = tuple(int(z) for z in arrays["lod_zooms"])
+        levels = [
+            unpack_lines(arrays[f"lod_{i}_coords"], arrays[f"lod_{i}_counts"]) for i in range(len(zooms))
+        ]
+        return cls(full=full, zooms=zooms, levels=levels, extent=arrays["lod_extent"])
+
+    def nbytes(self) -> int:
+        coords = sum(int(shapely.get_num_coordinates(g).sum()) for g in (self.full, *self.levels))
+        return coords * 16 + 100 * len(self.full) * (1 + len(self.levels))
+
+    def _level(self, zoom: float) -> int:
+        for i, level_zoom in enumerate(self.zooms):
+            if zoom <= level_zoom:
+                return i
+        return len(self.levels)
+
+    def geometries(self, zoom: float) -> np.ndarray:
+        """Coarsest level that is still exact enough for ``zoom``."""
+        i = self._level(zoom)
+        return self.levels[i] if i < len(self.levels) else self.full
+
+    def wgs84(self, zoom: float) -> np.ndarray:
+        """:meth:`geometries` for ``zoom`` in EPSG:4326 (converted once per level)."""
+        i = self._level(zoom)
+        if i not in self._wgs84:
+            self._wgs84[i] = projection.transform_geometries(self.geometries(zoom), 3857, 4326)
+        return self._wgs84[i]
+
+    def visible(self, zoom: float, min_pixels: float = MIN_PIXELS) -> np.ndarray:
+        """Mask of the edges spanning at least ``min_pixels`` at ``zoom``."""
+        return self.extent >= min_pixels * pixel_size(zoom)
+
+
+def for_zoom(
+    frame: gpd.GeoDataFrame,
+    zoom: float | None = None,
+    precision: int | None = None,
+    levels: LevelsOfDetail | None = None,
+) -> gpd.GeoDataFrame:
+    """``frame`` in EPSG:4326, simplified and thinned for ``zoom``, quantised.
+
+    Without ``zoom`` only the coordinates are quantised. A frame already in
+    EPSG:4326 is not reprojected. ``levels`` are the precomputed levels of
+    the frame's rows; without them the frame is simplified for ``zoom`` here.
+    """
+    frame = projection.wgs84_frame(frame)
+    if zoom is not None and not frame.empty:
+        if levels is None or len(levels.full) != len(frame):
+            mercator = projection.transform_geometries(np.asarray(frame.geometry), 4326, 3857)
+            levels = LevelsOfDetail.build(mercator, zooms=(zoom,))
+        keep = levels.visible(zoom)
+        simplified = levels.wgs84(zoom)[keep]
+        frame = frame.iloc[np.flatnonzero(keep)].copy(deep=False)
+        frame[frame.geometry.name] = simplified
+    out = frame.copy(deep=False)
+    out[out.geometry.name] = quantize(np.asarray(out.geometry), precision)
+    return out
@@ -1,12 +1,17 @@
 from __future__ import annotations
 
-import json
 from typing import Any, Dict, List, Optional
 
 import branca
 import folium
+import numpy as np
 from folium import Choropleth
 
+from grafos import projection
+
+from . import lod
+from .geojson import FeatureSource
+
 DEFAULT_COLORS = ["#edf8fb", "#b3cde3", "#8c96c6", "#8856a7", "#810f7c"]
 
 
@@ -23,12 +28,74 @@ def _legend_html(title: str, items):
     """
 
 
-def _prepare_scale(series):
+SCHEMES = ("quantile", "jenks", "equal", "log")
+LABELS = ["Très faible", "Faible", "Moyenne", "Élevée", "Très élevée"]
+JENKS_SAMPLE = 1000
+
+
+def _jenks_thresholds(values: np.ndarray, k: int, sample: int = JENKS_SAMPLE, seed: int = 0) -> List[float]:
+    """Fisher–Jenks natural breaks on a sample of ``values`` (upper class bounds)."""
+    if values.size > sample:
+        values = np.random.default_rng(seed).choice(values, size=sample, replace=False)
+    x = np.sort(values)
+    n = x.size
+    s1 = np.concatenate([[0.0], np.cumsum(x)])
+    s2 = np.concatenate([[0.0], np.cumsum(x * x)])
+    # ssd[a, b] : somme des carrés des écarts de x[a..b] (a ≤ b)
+    a = np.arange(n)[:, None]
+    b = np.arange(n)[None, :]
+    count = np.maximum(b - a + 1, 1)
+    total = s1[b + 1] - s1[a]
+    ssd = s2[b + 1] - s2[a] - total * total / count
+    ssd[a > b] = np.inf
+
+    cost = ssd[0].copy()  # une classe couvrant x[0..b]
+    splits = []
+    for _ in range(1, k):
+        # classe suivante x[m+1..b] après une partition optimale de x[0..m]
+        candidates = cost[:-1, None] + ssd[1:, :]
+        best = np.argmin(candidates, axis=0)
+        cost = np.concatenate([[np.inf], candidates[best[1:], np.arange(1, n)]])
+        splits.append(best)
+
+    thresholds = []
+    end = n - 1
+    for best in reversed(splits):
+        m = int(best[end])
+        thresholds.append(float(x[m]))
+        end = m
+    return sorted(thresholds)
+
+
+def class_breaks(series, scheme: str = "quantile", k: int = len(DEFAULT_COLORS)) -> Optional[List[float]]:
+    """Inner class thresholds of ``series`` (``k - 1`` values), ``None`` if constant.
+
+    A value belongs to the first class whose threshold it does not exceed.
+    """
+    values = np.nan_to_num(np.asarray(series, dtype=float))
+    if values.size == 0 or values.max() == values.min():
+        return None
+    lo, hi = float(values.min()), float(values.max())
+    if scheme == "jenks" and np.unique(values).size > k:
+        return _jenks_thresholds(values, k)
+    if scheme == "equal":
+        return np.linspace(lo, hi, k + 1)[1:-1].tolist()
+    if scheme == "log":
+        positive = values[values > 0]
+        if positive.size and positive.min() < hi:
+            return np.geomspace(positive.min(), hi, k + 1)[1:-1].tolist()
+        return np.linspace(lo, hi, k + 1)[1:-1].tolist()
+    if scheme not in SCHEMES:
+        raise ValueError(f"Esquema de clasificación desconocido: {scheme}")
+    return np.quantile(values, np.linspace(0, 1, k + 1)[1:-1]).tolist()
+
+
+def _prepare_scale(series, scheme: str = "quantile"):
     series = series.fillna(0)
-    if series.empty or series.max() == series.min():
+    thresholds = class_breaks(series, scheme)
+    if thresholds is None:
         return None, [series.mean() if not series.empty else 0]
-    qcuts = series.quantile([0.2, 0.4, 0.6, 0.8]).tolist()
-    return qcuts, [series.min(), *qcuts, series.max()]
+    return thresholds, [float(series.min()), *thresholds, float(series.max())]
 
 
 def _color_for(value: float, quantiles: Optional[List[float]]) -> str:
@@ -45,25 +112,46 @@ def _color_for(value: float, quantiles: Optional[List[float]]) -> str:
     return DEFAULT_COLORS[4]
 
 
+def color_classes(series, quantiles: Optional[List[float]]) -> np.ndarray:
+    """Class (index in :data:`DEFAULT_COLORS`) of every value, in one array operation.
+
+    Without thresholds (constant column) every value gets the middle class.
+    """
+    values = np.nan_to_num(np.asarray(series, dtype=float))
+    if not quantiles:
+        return np.full(values.size, len(DEFAULT_COLORS) // 2, dtype=np.int8)
+    return np.searchsorted(np.asarray(quantiles, dtype=float), values, side="left").astype(np.int8)
+
+
+def _legend(breaks: List[float], quantiles: Optional[List[float]]) -> List[Dict[str, Any]]:
+    if not quantiles:
+        return [{"label": LABELS[2], "color": DEFAULT_COLORS[len(DEFAULT_COLORS) // 2]}]
+    return [
+        {"label": label, "color": color, "range": [float(lo), float(hi)]}
+        for label, color, lo, hi in zip(LABELS, DEFAULT_COLORS, breaks[:-1], breaks[1:])
+    ]
+
+
 def build_map(result: dict, color_by: str = "length"):
     """Retained for backward compatibility (folium map generation)."""
-    edges = result["edges"].to_crs(4326)
+    edges = result["edges"]
     if edges.empty:
         return folium.Map(location=[48.8566, 2.3522], zoom_start=12)
 
-    center_lat = edges.geometry.centroid.y.mean()
-    center_lon = edges.geometry.centroid.x.mean()
+    center_lat, center_lon = projection.centre_wgs84(edges)
     m = folium.Map(location=[center_lat, center_lon], zoom_start=13, control_scale=True)
 
     var = color_by if color_by in edges.columns else "length"
     series = edges[var].fillna(0)
-    quantiles, _ = _prepare_scale(series)
+    quantiles, _ = _prepare_scale(series, result.get("class_scheme") or "quantile")
+    edges = projection.wgs84_frame(edges, result.get("edges_wgs84")).copy(deep=False)
+    edges["class"] = color_classes(series, quantiles)
 
     folium.GeoJson(
         edges.to_json(),
         name=f"Réseau ({var})",
         style_function=lambda f: {
-            "color": _color_for(f["properties"].get(var, 0), quantiles),
+            "color": DEFAULT_COLORS[f["properties"]["class"]],
             "weight": 2,
             "opacity": 0.9,
         },
@@ -104,10 +192,27 @@ def build_map(result: dict, color_by: str = "length"):
     return m
 
 
-def build_map_payload(result: Dict[str, Any], color_by: str = "length") -> Dict[str, Any]:
-    edges = result["edges"].to_crs(4326)
+def build_map_payload(
+    result: Dict[str, Any],
+    color_by: str = "length",
+    scheme: Optional[str] = None,
+    zoom: Optional[float] = None,
+    geojson: bool = True,
+) -> Dict[str, Any]:
+    """Map description for the web client: centre, legend and edge layer.
+
+    Edges carry an integer ``class`` column (index in ``palette``) computed
+    with the ``scheme`` break method (``result["class_scheme"]`` by default).
+    Their coordinates are quantised and, with ``zoom``, the geometries are
+    simplified for that zoom (from the levels of detail precomputed in
+    ``result["lod"]`` when present) and sub-pixel edges are dropped. With
+    ``geojson=False`` (the network is served as tiles) the edge layer is not
+    built at all.
+    """
+    scheme = scheme or result.get("class_scheme") or "quantile"
+    edges = result["edges"]
     if edges.empty:
-        return {
+        empty = {
             "center": {"lat": 48.8566, "lng": 2.3522},
             "zoom": 12,
             "colorBy": color_by,
@@ -120,43 +225,35 @@ def build_map_payload(result: Dict[str, Any], color_by: str = "length") -> Dict[
                 {"label": "Élevée", "color": DEFAULT_COLORS[3]},
                 {"label": "Très élevée", "color": DEFAULT_COLORS[4]},
             ],
-            "geojson": {"type": "FeatureCollection", "features": []},
         }
+        if geojson:
+            empty["geojson"] = {"type": "FeatureCollection", "features": []}
+        return empty
 
     var = color_by if color_by in edges.columns else "length"
     series = edges[var].fillna(0)
-    quantiles, breaks = _prepare_scale(series)
+    quantiles, breaks = _prepare_scale(series, scheme)
 
-    geojson = json.loads(edges.to_json())
-    for feature in geojson.get("features", []):
-        value = feature.get("properties", {}).get(var, 0)
-        feature.setdefault("properties", {})["__style"] = {
-            "color": _color_for(value, quantiles),
-            "weight": 2,
-            "opacity": 0.9,
-        }
-
-    center_lat = edges.geometry.centroid.y.mean()
-    center_lon = edges.geometry.centroid.x.mean()
+    # Centroïdes en mètres ; seule leur moyenne est convertie en WGS84
+    center_lat, center_lon = projection.centre_wgs84(edges)
 
-    legend = [
-        {"label": "Très faible", "color": DEFAULT_COLORS[0]},
-        {"label": "Faible", "color": DEFAULT_COLORS[1]},
-        {"label": "Moyenne", "color": DEFAULT_COLORS[2]},
-        {"label": "Élevée", "color": DEFAULT_COLORS[3]},
-        {"label": "Très élevée", "color": DEFAULT_COLORS[4]},
-    ]
-
-    return {
+    payload = {
         "center": {"lat": center_lat, "lng": center_lon},
         "zoom": 13,
         "colorBy": var,
+        "scheme": scheme,
         "quantiles": quantiles or [],
         "palette": DEFAULT_COLORS,
-        "legend": legend,
+        "legend": _legend(breaks, quantiles),
         "breaks": breaks,
-        "geojson": geojson,
     }
+    if geojson:
+        # Géométries WGS84 déjà calculées par l'analyse : pas de reprojection
+        edges = projection.wgs84_frame(edges, result.get("edges_wgs84")).copy(deep=False)
+        # Classe calculée en une opération sur la colonne ; le client applique la palette
+        edges["class"] = color_classes(series, quantiles)
+        payload["geojson"] = FeatureSource(lod.for_zoom(edges, zoom, levels=result.get("lod")))
+    return payload
 
 
 def h3_payload(result: Dict[str, Any]) -> Optional[Dict[str, Any]]:
@@ -164,8 +261,7 @@ def h3_payload(result: Dict[str, Any]) -> Optional[Dict[str, Any]]:
     if h3_gdf is None or h3_gdf.empty:
         return None
 
-    geojson = json.loads(h3_gdf.to_crs(4326).to_json())
     return {
-        "geojson": geojson,
-        "properties": ["h3", "length_km"],
+        "geojson": FeatureSource(lod.for_zoom(h3_gdf)),
+        "properties": [c for c in h3_gdf.columns if c != h3_gdf.geometry.name],
     }
@@ -0,0 +1,140 @@
+"""Memoisation of the intermediate results of the analysis workflow.
+
+Every stage of :func:`app.analysis._compute` (prepared graph, GeoDataFrames,
+summary, betweenness, each node centrality, H3 layer) is stored in a
+:class:`StageCache` under a key made of the graph identity plus the parameters
+of that stage. A request that differs from a previous one by a single flag
+therefore only computes the missing stage.
+
+The cache is bounded by an approximate byte budget and evicts least recently
+used entries. It lives in the process that runs the analysis, i.e. in each
+worker of the job pool; :class:`app.jobs.JobManager` sends every request on
+the same network to the same worker so that its cache is the one consulted.
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+
+
+__all__ = ["StageCache", "default_cache", "estimate_size"]
+
+
+DEFAULT_MAX_MB = 512
+
+
+def estimate_size(obj: Any) -> int:
+    """Rough in-memory size of a cached value, in bytes."""
+    if obj is None:
+        return 0
+    if isinstance(obj, np.ndarray):
+        return int(obj.nbytes)
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        usage = obj.memory_usage(deep=False)
+        size = int(usage.sum() if isinstance(obj, pd.DataFrame) else usage)
+        geometry = getattr(obj, "geometry", None) if isinstance(obj, pd.DataFrame) else None
+        if geometry is not None:
+            import shapely
+
+            coords = shapely.get_num_coordinates(np.asarray(geometry))
+            size += int(coords.sum()) * 16 + 100 * len(geometry)
+        return size
+    if isinstance(obj, nx.Graph):
+        return obj.number_of_nodes() * 400 + obj.number_of_edges() * 800
+    if isinstance(obj, dict):
+        return 64 + sum(estimate_size(v) for v in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return 64 + sum(estimate_size(v) for v in obj)
+    nbytes = getattr(obj, "nbytes", None)
+    if callable(nbytes):
+        # Objets qui estiment eux-mêmes leur taille (niveaux de détail…)
+        return int(nbytes())
+    arrays = getattr(obj, "__dict__", None)
+    if arrays and any(isinstance(v, np.ndarray) for v in arrays.values()):
+        return sum(int(v.nbytes) for v in arrays.values() if isinstance(v, np.ndarray))
+    return sys.getsizeof(obj)
+
+
+class StageCache:
+    """LRU mapping of stage keys to results, capped at ``max_bytes``."""
+
+    def __init__(self, max_bytes: Optional[int] = None) -> None:
+        if max_bytes is None:
+            max_bytes = int(float(os.environ.get("PIPELINE_CACHE_MB", DEFAULT_MAX_MB)) * 1024 * 1024)
+        self.max_bytes = int(max_bytes)
+        self._entries: "OrderedDict[Hashable, Tuple[Any, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        size = estimate_size(value)
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._entries:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+
+    def memo(self, key: Hashable, compute: Callable[[], Any], store: bool = True) -> Any:
+        """Return the cached value for ``key`` or compute (and keep) it."""
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                return self.get(key)
+            self.misses += 1
+        value = compute()
+        if store:
+            self.put(key, value)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+_DEFAULT: Optional[StageCache] = None
+
+
+def default_cache() -> StageCache:
+    """Process-wide stage cache (``PIPELINE_CACHE_MB``, 512 MB by default)."""
+    global _DEFAULT
+    if _DEFAULT is None:
+        _DEFAULT = StageCache()
+    return _DEFAULT
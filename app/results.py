@@ -0,0 +1,195 @@
+"""Content-addressed storage of analysis downloads.
+
+The analysis response used to inline the edge network, the H3 layer and the
+metrics CSV as strings. They are now written once to a directory named after
+the hash of their content and served on demand by
+``GET /api/results/{id}/{name}``. Because the id identifies the bytes, the
+files never change: identical analyses share one entry and clients may cache
+them forever.
+
+Compressed variants (gzip, and brotli when the ``brotli`` package is
+installed) are produced lazily on the first request that accepts them.
+"""
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+from grafos import projection
+
+from . import isochrones, tiles
+from .geojson import FeatureSource
+
+try:  # pragma: no cover - dépend de l'environnement
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+
+__all__ = ["FILES", "ResultStore", "default_store"]
+
+
+FILES: Dict[str, str] = {
+    "edges.geojson": "application/geo+json",
+    "h3.geojson": "application/geo+json",
+    "metrics.csv": "text/csv; charset=utf-8",
+}
+ENCODINGS = {"br": ".br", "gzip": ".gz"}
+DEFAULT_MAX_ENTRIES = 64
+
+_RESULT_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+def _edge_source(result: Dict[str, Any]) -> Optional[FeatureSource]:
+    edges = result.get("edges")
+    if edges is None:
+        return None
+    return FeatureSource(projection.wgs84_frame(edges, result.get("edges_wgs84")))
+
+
+def _h3_source(result: Dict[str, Any]) -> Optional[FeatureSource]:
+    h3_gdf = result.get("h3_gdf")
+    if h3_gdf is None or h3_gdf.empty:
+        return None
+    return FeatureSource(h3_gdf)
+
+
+def _csv_chunks(result: Dict[str, Any]) -> Optional[Iterable[str]]:
+    csv = result.get("metrics_csv")
+    return [csv] if csv else None
+
+
+class ResultStore:
+    """Directory of immutable result files, one sub-directory per result id."""
+
+    def __init__(self, root: os.PathLike | str, max_entries: int = DEFAULT_MAX_ENTRIES) -> None:
+        self.root = Path(root).expanduser()
+        self.max_entries = int(max_entries)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    # -- écriture --------------------------------------------------------
+    def save(self, result: Dict[str, Any]) -> str:
+        """Write the downloads of an ``analysis.run`` result; return its id."""
+        tmp = self.root / f".tmp-{uuid.uuid4().hex}"
+        tmp.mkdir()
+        digest = hashlib.sha256()
+        try:
+            layers = {
+                "edges.geojson": _edge_source(result),
+                "h3.geojson": _h3_source(result),
+                "metrics.csv": _csv_chunks(result),
+            }
+            for name, source in layers.items():
+                if source is None:
+                    continue
+                chunks: Iterable[str] = (
+                    source.iter_chunks() if isinstance(source, FeatureSource) else source
+                )
+                digest.update(name.encode() + b"\0")
+                with open(tmp / name, "wb") as fh:
+                    for chunk in chunks:
+                        data = chunk.encode("utf-8")
+                        digest.update(data)
+                        fh.write(data)
+            if result.get("edges") is not None:
+                digest.update(tiles.SOURCE_FILE.encode() + b"\0")
+                tiles.write_source(result, tmp / tiles.SOURCE_FILE, digest)
+                digest.update(isochrones.SOURCE_FILE.encode() + b"\0")
+                if isochrones.write_source(result, tmp / isochrones.SOURCE_FILE, digest):
+                    # Hiérarchie de contraction déduite du réseau : hors empreinte
+                    isochrones.write_hierarchy(tmp / isochrones.SOURCE_FILE, tmp / isochrones.HIERARCHY_FILE)
+            result_id = digest.hexdigest()[:32]
+            target = self.root / result_id
+            try:
+                os.replace(tmp, target)
+            except OSError:
+                # Même contenu déjà enregistré (répertoire cible non vide)
+                shutil.rmtree(tmp, ignore_errors=True)
+            os.utime(target)
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        self._prune()
+        return result_id
+
+    def _prune(self) -> None:
+        entries = [p for p in self.root.iterdir() if p.is_dir() and _RESULT_ID.match(p.name)]
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort(key=lambda p: p.stat().st_mtime)
+        for path in entries[: len(entries) - self.max_entries]:
+            shutil.rmtree(path, ignore_errors=True)
+
+    # -- lecture ---------------------------------------------------------
+    def path(self, result_id: str, name: str) -> Optional[Path]:
+        """Location of a stored file, or ``None`` if unknown."""
+        if not _RESULT_ID.match(result_id) or name not in FILES:
+            return None
+        path = self.root / result_id / name
+        return path if path.is_file() else None
+
+    def _source(self, result_id: str, name: str) -> Optional[Path]:
+        if not _RESULT_ID.match(result_id):
+            return None
+        path = self.root / result_id / name
+        return path if path.is_file() else None
+
+    def tile_source(self, result_id: str) -> Optional[Path]:
+        """Edge arrays used to render the vector tiles of a result."""
+        return self._source(result_id, tiles.SOURCE_FILE)
+
+    def network_source(self, result_id: str) -> Optional[Path]:
+        """Routable network of a result, used for isochrones."""
+        return self._source(result_id, isochrones.SOURCE_FILE)
+
+    def hierarchy_source(self, result_id: str) -> Optional[Path]:
+        """Contraction hierarchy of a result's network, used for routing."""
+        return self._source(result_id, isochrones.HIERARCHY_FILE)
+
+    def encoded(self, path: Path, encoding: str) -> Path:
+        """``path`` compressed with ``encoding``, created on first use."""
+        target = path.with_name(path.name + ENCODINGS[encoding])
+        if target.is_file():
+            return target
+        tmp = target.with_name(f".{target.name}.{uuid.uuid4().hex}")
+        if encoding == "gzip":
+            with open(path, "rb") as src, open(tmp, "wb") as raw:
+                # mtime=0 : sortie déterministe, donc ETag stable
+                with gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6, mtime=0) as dst:
+                    shutil.copyfileobj(src, dst, 1024 * 1024)
+        else:
+            tmp.write_bytes(brotli.compress(path.read_bytes(), quality=5))
+        os.replace(tmp, target)
+        return target
+
+    def available_encodings(self) -> Iterator[str]:
+        if brotli is not None:
+            yield "br"
+        yield "gzip"
+
+
+_DEFAULT: Optional[ResultStore] = None
+
+
+def default_store() -> ResultStore:
+    """Store in ``RESULT_STORE_DIR`` (a temporary directory by default).
+
+    ``RESULT_STORE_MAX`` bounds the number of results kept.
+    """
+    global _DEFAULT
+    root = os.environ.get("RESULT_STORE_DIR") or str(
+        Path(tempfile.gettempdir()) / "masciclobis-results"
+    )
+    max_entries = int(os.environ.get("RESULT_STORE_MAX", DEFAULT_MAX_ENTRIES))
+    root = str(Path(root).expanduser())
+    if _DEFAULT is None or str(_DEFAULT.root) != root or _DEFAULT.max_entries != max_entries:
+        _DEFAULT = ResultStore(root, max_entries=max_entries)
+    return _DEFAULT
@@ -0,0 +1,83 @@
+"""Point-to-point routes and origin–destination matrices on a result network.
+
+Both use the directed contraction hierarchy of the stored network
+(:meth:`app.isochrones.NetworkSource.hierarchy`), built when the result is
+saved and kept next to ``network.npz``, so one-way streets are only taken
+in their direction. Points are snapped to their nearest node like
+isochrone origins.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+import shapely
+
+from grafos import projection
+
+from .isochrones import NetworkSource
+
+
+__all__ = ["od_matrix", "route"]
+
+
+def _snapped(source: NetworkSource, nodes: np.ndarray, distances: np.ndarray) -> List[Dict[str, float]]:
+    xy = source.tree.data[nodes]
+    lon, lat = source.to_wgs84.transform(xy[:, 0], xy[:, 1])
+    return [
+        {"lat": float(a), "lon": float(b), "snap_distance_m": float(d)}
+        for a, b, d in zip(np.atleast_1d(lat), np.atleast_1d(lon), distances)
+    ]
+
+
+def _route_line(source: NetworkSource, nodes: List[int]) -> shapely.Geometry:
+    """Path geometry following the street geometries, in the network CRS."""
+    parts = []
+    for a, b in zip(nodes[:-1], nodes[1:]):
+        edge = source.edge_between(a, b)
+        geom = source.geometries[edge] if edge is not None else None
+        if geom is None:
+            parts.append(source.tree.data[[a, b]])
+            continue
+        coords = shapely.get_coordinates(geom)
+        # Géométrie stockée dans le sens u → v
+        parts.append(coords if source.edge_u[edge] == a else coords[::-1])
+    if not parts:
+        return shapely.points(source.tree.data[nodes[0]]) if nodes else None
+    return shapely.linestrings(np.concatenate(parts))
+
+
+def route(
+    source: NetworkSource,
+    origin: Sequence[float],
+    destination: Sequence[float],
+) -> Dict[str, Any]:
+    """Shortest route between two ``(lat, lon)`` points."""
+    nodes, snap = source.snap([origin[0], destination[0]], [origin[1], destination[1]])
+    distance, path = source.hierarchy().path(int(nodes[0]), int(nodes[1]))
+    line = _route_line(source, path) if path else None
+    if line is not None:
+        line = projection.transform_geometries(np.array([line], dtype=object), source.crs, 4326)[0]
+    return {
+        "distance_m": float(distance) if np.isfinite(distance) else None,
+        "geometry": line,
+        "nodes": len(path),
+        "points": _snapped(source, nodes, snap),
+    }
+
+
+def od_matrix(
+    source: NetworkSource,
+    origins: Sequence[Sequence[float]],
+    destinations: Sequence[Sequence[float]],
+) -> Dict[str, Any]:
+    """Network distances (m) between every origin and every destination."""
+    o_nodes, o_snap = source.snap([p[0] for p in origins], [p[1] for p in origins])
+    d_nodes, d_snap = source.snap([p[0] for p in destinations], [p[1] for p in destinations])
+    distances = source.hierarchy().many_to_many(o_nodes, d_nodes)
+    return {
+        "distances": distances,
+        "origins": _snapped(source, o_nodes, o_snap),
+        "destinations": _snapped(source, d_nodes, d_snap),
+    }
@@ -0,0 +1,380 @@
+"""Mapbox Vector Tiles for the edge network of a stored result.
+
+When a result is saved, its edges are written next to the downloads as plain
+arrays in Web Mercator (:func:`write_source`): coordinates, their simplified
+levels of detail, the metric columns and the colour class of every edge. :func:`render_tile` selects the
+edges of one tile through an STRtree, takes their geometry at the level of
+detail of the zoom (see :mod:`app.lod`, sub-pixel edges are left out),
+clips them to the tile (plus a small buffer) and encodes a single ``edges``
+layer with a minimal protobuf writer, following version 2.1 of the Mapbox
+Vector Tile specification.
+
+Loaded sources and rendered tiles are kept in small in-process LRU caches.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import struct
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import shapely
+from shapely import STRtree
+
+from grafos import projection
+
+from . import map as map_mod
+from .lod import ORIGIN, LevelsOfDetail, pack_lines, unpack_lines
+
+
+__all__ = [
+    "LAYER",
+    "SOURCE_FILE",
+    "TileCache",
+    "TileSource",
+    "default_cache",
+    "render_tile",
+    "write_source",
+]
+
+
+LAYER = "edges"
+SOURCE_FILE = "edges.tiles.npz"
+EXTENT = 4096
+BUFFER = 64
+MAX_ZOOM = 22
+
+NUMERIC_COLUMNS = (
+    "length",
+    "betweenness",
+    "closeness",
+    "degree",
+    "straightness",
+    "eigenvector",
+    "pagerank",
+    "katz",
+    "reach",
+    "gravity",
+    "local_closeness",
+)
+TEXT_COLUMNS = ("name", "highway")
+
+
+# -- source ----------------------------------------------------------------
+def _text(value: Any) -> str:
+    if isinstance(value, (list, tuple, set)):
+        return ", ".join(str(v) for v in value)
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return ""
+    return str(value)
+
+
+def write_source(result: Dict[str, Any], path: os.PathLike | str, digest=None) -> None:
+    """Write the tile source of ``result["edges"]`` to ``path`` (npz).
+
+    The levels of detail of ``result["lod"]`` are reused when they match the
+    edges and built here otherwise. ``digest`` (a hashlib object) is updated
+    with the arrays written.
+    """
+    edges = result["edges"]
+    levels = result.get("lod")
+    if levels is None or len(levels.full) != len(edges):
+        # Depuis les géométries WGS84 déjà calculées : une seule transformation
+        levels = LevelsOfDetail.from_wgs84(
+            np.asarray(projection.wgs84_frame(edges, result.get("edges_wgs84")).geometry)
+        )
+    coords, counts = pack_lines(levels.full)
+    arrays: Dict[str, np.ndarray] = {"coords": coords, "counts": counts, **levels.to_arrays()}
+
+    var = result.get("color_by") or "length"
+    var = var if var in edges.columns else "length"
+    if var in edges.columns:
+        quantiles, _ = map_mod._prepare_scale(edges[var], result.get("class_scheme") or "quantile")
+        arrays["class"] = map_mod.color_classes(edges[var], quantiles)
+    else:
+        arrays["class"] = np.zeros(len(edges), dtype=np.int8)
+
+    for col in NUMERIC_COLUMNS:
+        if col in edges.columns:
+            arrays[f"num_{col}"] = pd.to_numeric(edges[col], errors="coerce").to_numpy(dtype=float)
+    for col in TEXT_COLUMNS:
+        if col in edges.columns:
+            arrays[f"txt_{col}"] = np.array([_text(v) for v in edges[col]], dtype=str)
+
+    if digest is not None:
+        for key in sorted(arrays):
+            digest.update(key.encode() + b"\0")
+            digest.update(np.ascontiguousarray(arrays[key]).tobytes())
+    with open(path, "wb") as fh:
+        np.savez(fh, **arrays)
+
+
+@dataclass
+class TileSource:
+    """Edges of a result in Web Mercator, indexed for tile queries."""
+
+    geometries: np.ndarray
+    classes: np.ndarray
+    numeric: Dict[str, np.ndarray]
+    text: Dict[str, np.ndarray]
+    tree: STRtree
+    lod: LevelsOfDetail
+
+    @classmethod
+    def load(cls, path: os.PathLike | str) -> "TileSource":
+        with np.load(path, allow_pickle=False) as data:
+            geometries = unpack_lines(data["coords"], data["counts"])
+            numeric = {k[4:]: data[k] for k in data.files if k.startswith("num_")}
+            text = {k[4:]: data[k] for k in data.files if k.startswith("txt_")}
+            classes = data["class"]
+            # Niveaux enregistrés avec le résultat ; anciennes sources : recalculés
+            if "lod_zooms" in data.files:
+                lod = LevelsOfDetail.from_arrays(geometries, data)
+            else:
+                lod = LevelsOfDetail.build(geometries)
+        return cls(geometries, classes, numeric, text, STRtree(geometries), lod)
+
+    def nbytes(self) -> int:
+        columns = sum(a.nbytes for a in (*self.numeric.values(), *self.text.values()))
+        return self.lod.nbytes() + columns
+
+
+# -- protobuf --------------------------------------------------------------
+def _varint(value: int) -> bytes:
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _varint_lengths(values: np.ndarray) -> np.ndarray:
+    lengths = np.ones(values.size, dtype=np.int64)
+    for k in range(1, 10):
+        lengths += values >= (np.uint64(1) << np.uint64(7 * k))
+    return lengths
+
+
+def _pack_varints(values: np.ndarray) -> Tuple[bytes, np.ndarray]:
+    """Varint encoding of unsigned ``values``; also returns byte offsets."""
+    values = np.asarray(values, dtype=np.uint64)
+    lengths = _varint_lengths(values)
+    width = int(lengths.max(initial=1))
+    shifts = (np.arange(width, dtype=np.uint64) * np.uint64(7))[None, :]
+    groups = ((values[:, None] >> shifts) & np.uint64(0x7F)).astype(np.uint8)
+    position = np.arange(width)[None, :]
+    groups[position < (lengths[:, None] - 1)] |= 0x80
+    packed = groups[position < lengths[:, None]].tobytes()
+    offsets = np.concatenate([[0], np.cumsum(lengths)])
+    return packed, offsets
+
+
+def _zigzag(values: np.ndarray) -> np.ndarray:
+    values = values.astype(np.int64)
+    return ((values << 1) ^ (values >> 63)).astype(np.uint64)
+
+
+def _key(field: int, wire: int) -> bytes:
+    return _varint((field << 3) | wire)
+
+
+def _bytes_field(field: int, payload: bytes) -> bytes:
+    return _key(field, 2) + _varint(len(payload)) + payload
+
+
+def _value(value: Any) -> bytes:
+    if isinstance(value, str):
+        return _bytes_field(1, value.encode("utf-8"))
+    if isinstance(value, (int, np.integer)):
+        return _key(5, 0) + _varint(int(value))
+    return _key(3, 1) + struct.pack("<d", float(value))
+
+
+# -- rendu -----------------------------------------------------------------
+def tile_bounds(z: int, x: int, y: int) -> Tuple[float, float, float, float]:
+    """Web Mercator bounds ``(minx, miny, maxx, maxy)`` of an XYZ tile."""
+    size = 2 * ORIGIN / (1 << z)
+    minx = -ORIGIN + x * size
+    maxy = ORIGIN - y * size
+    return minx, maxy - size, minx + size, maxy
+
+
+def _geometry_commands(coords: np.ndarray, part_sizes: np.ndarray, owner: np.ndarray) -> np.ndarray:
+    """MoveTo/LineTo command integers for consecutive line parts.
+
+    ``owner`` gives the feature of each part; the cursor restarts at the
+    origin for every feature.
+    """
+    lengths = 2 * part_sizes + 2
+    starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    out = np.zeros(int(lengths.sum()), dtype=np.uint64)
+    out[starts] = 9  # MoveTo, un point
+    out[starts + 3] = (2 | ((part_sizes - 1) << 3)).astype(np.uint64)  # LineTo
+    part = np.repeat(np.arange(part_sizes.size), part_sizes)
+    local = np.arange(part.size) - np.repeat(np.cumsum(part_sizes) - part_sizes, part_sizes)
+    pos = starts[part] + 1 + 2 * local + (local >= 1)
+    deltas = np.diff(coords, axis=0, prepend=np.zeros((1, 2), dtype=np.int64))
+    new_feature = np.r_[True, owner[1:] != owner[:-1]]
+    feature_starts = (np.cumsum(part_sizes) - part_sizes)[new_feature]
+    deltas[feature_starts] = coords[feature_starts]
+    out[pos] = _zigzag(deltas[:, 0])
+    out[pos + 1] = _zigzag(deltas[:, 1])
+    return out
+
+
+def render_tile(source: TileSource, z: int, x: int, y: int) -> bytes:
+    """Encode tile ``z/x/y`` of ``source``; empty bytes when nothing is visible."""
+    minx, miny, maxx, maxy = tile_bounds(z, x, y)
+    size = maxx - minx
+    pad = size * BUFFER / EXTENT
+    candidates = source.tree.query(shapely.box(minx - pad, miny - pad, maxx + pad, maxy + pad))
+    # Arêtes plus petites qu'un demi-pixel : invisibles à ce zoom
+    candidates = np.sort(candidates[source.lod.visible(z)[candidates]])
+    if candidates.size == 0:
+        return b""
+
+    geoms = source.lod.geometries(z)[candidates]
+    geoms = shapely.clip_by_rect(geoms, minx - pad, miny - pad, maxx + pad, maxy + pad)
+    parts, owner = shapely.get_parts(geoms, return_index=True)
+    lines = shapely.get_type_id(parts) == 1
+    parts, owner = parts[lines], owner[lines]
+    if parts.size == 0:
+        return b""
+
+    coords, part = shapely.get_coordinates(parts, return_index=True)
+    scale = EXTENT / size
+    tile = np.empty(coords.shape, dtype=np.int64)
+    tile[:, 0] = np.rint((coords[:, 0] - minx) * scale)
+    tile[:, 1] = np.rint((maxy - coords[:, 1]) * scale)
+
+    # Points répétés après arrondi, puis parties réduites à un seul point
+    first = np.r_[True, part[1:] != part[:-1]]
+    keep = first | np.r_[True, (tile[1:] != tile[:-1]).any(axis=1)]
+    tile, part = tile[keep], part[keep]
+    part_sizes = np.bincount(part, minlength=parts.size)
+    valid_part = part_sizes >= 2
+    keep = valid_part[part]
+    tile, part = tile[keep], part[keep]
+    part_sizes, owner = part_sizes[valid_part], owner[valid_part]
+    if part_sizes.size == 0:
+        return b""
+
+    commands = _geometry_commands(tile, part_sizes, owner)
+    packed, offsets = _pack_varints(commands)
+    # Bornes des commandes de chaque entité (parties consécutives d'une arête)
+    part_ends = np.cumsum(2 * part_sizes + 2)
+    boundaries = np.r_[True, owner[1:] != owner[:-1]]
+    first_parts = np.flatnonzero(boundaries)
+    last_parts = np.r_[first_parts[1:] - 1, part_sizes.size - 1]
+    cmd_starts = np.r_[0, part_ends[:-1]][first_parts]
+    cmd_ends = part_ends[last_parts]
+
+    keys: List[str] = ["class", *source.numeric, *source.text]
+    values: "OrderedDict[Tuple[type, Any], int]" = OrderedDict()
+
+    def value_index(value: Any) -> int:
+        token = (type(value), value)
+        if token not in values:
+            values[token] = len(values)
+        return values[token]
+
+    features = []
+    for feature_pos, start, end in zip(owner[first_parts], cmd_starts, cmd_ends):
+        edge = int(candidates[feature_pos])
+        tags = [0, value_index(int(source.classes[edge]))]
+        for k, col in enumerate(source.numeric, start=1):
+            number = float(source.numeric[col][edge])
+            if np.isfinite(number):
+                tags += [k, value_index(number)]
+        for k, col in enumerate(source.text, start=1 + len(source.numeric)):
+            label = str(source.text[col][edge])
+            if label:
+                tags += [k, value_index(label)]
+        geometry = packed[offsets[start] : offsets[end]]
+        body = (
+            _key(1, 0) + _varint(edge)
+            + _bytes_field(2, b"".join(_varint(t) for t in tags))
+            + _key(3, 0) + _varint(2)  # LINESTRING
+            + _bytes_field(4, geometry)
+        )
+        features.append(_bytes_field(2, body))
+
+    layer = (
+        _key(15, 0) + _varint(2)
+        + _bytes_field(1, LAYER.encode())
+        + b"".join(features)
+        + b"".join(_bytes_field(3, key.encode()) for key in keys)
+        + b"".join(_bytes_field(4, _value(value)) for _, value in values)
+        + _key(5, 0) + _varint(EXTENT)
+    )
+    return _bytes_field(3, layer)
+
+
+# -- caches ----------------------------------------------------------------
+class TileCache:
+    """LRU of rendered tiles (by bytes) and of loaded sources (by count)."""
+
+    def __init__(self, max_bytes: Optional[int] = None, max_sources: int = 4) -> None:
+        if max_bytes is None:
+            max_bytes = int(float(os.environ.get("TILE_CACHE_MB", 64)) * 1024 * 1024)
+        self.max_bytes = int(max_bytes)
+        self.max_sources = int(max_sources)
+        self._tiles: "OrderedDict[Tuple[str, int, int, int], bytes]" = OrderedDict()
+        self._sources: "OrderedDict[str, TileSource]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def source(self, path: Path) -> TileSource:
+        key = str(path)
+        with self._lock:
+            if key in self._sources:
+                self._sources.move_to_end(key)
+                return self._sources[key]
+        loaded = TileSource.load(path)
+        with self._lock:
+            self._sources[key] = loaded
+            while len(self._sources) > self.max_sources:
+                self._sources.popitem(last=False)
+        return loaded
+
+    def tile(self, result_id: str, path: Path, z: int, x: int, y: int) -> bytes:
+        key = (result_id, z, x, y)
+        with self._lock:
+            if key in self._tiles:
+                self._tiles.move_to_end(key)
+                return self._tiles[key]
+        data = render_tile(self.source(path), z, x, y)
+        with self._lock:
+            if key not in self._tiles and len(data) <= self.max_bytes:
+                self._tiles[key] = data
+                self._bytes += len(data)
+                while self._bytes > self.max_bytes:
+                    _, evicted = self._tiles.popitem(last=False)
+                    self._bytes -= len(evicted)
+        return data
+
+
+_DEFAULT: Optional[TileCache] = None
+
+
+def default_cache() -> TileCache:
+    """Process-wide tile cache (``TILE_CACHE_MB``, 64 MB by default)."""
+    global _DEFAULT
+    if _DEFAULT is None:
+        _DEFAULT = TileCache()
+    return _DEFAULT
+
+
+def etag(result_id: str, z: int, x: int, y: int) -> str:
+    return '"' + hashlib.sha1(f"{result_id}/{z}/{x}/{y}".encode()).hexdigest()[:20] + '"'
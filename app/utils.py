@@ -1 +1,24 @@
-# Fonctions utilitaires
\ No newline at end of file
+# Fonctions utilitaires
+from __future__ import annotations
+
+from typing import Any
+
+
+def to_native(obj: Any) -> Any:
+    """Convert NumPy scalars and dates nested in dicts/lists to JSON types."""
+    if isinstance(obj, dict):
+        return {k: to_native(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [to_native(v) for v in obj]
+    try:
+        import numpy as np
+        if isinstance(obj, (np.generic,)):
+            return obj.item()
+    except ModuleNotFoundError:
+        pass
+    if hasattr(obj, "isoformat"):
+        try:
+            return obj.isoformat()
+        except Exception:  # pragma: no cover - fallback for unexpected types
+            return str(obj)
+    return obj
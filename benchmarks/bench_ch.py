@@ -0,0 +1,88 @@
+"""Contraction hierarchy against networkx on the synthetic grids.
+
+Usage::
+
+    python -m benchmarks.bench_ch [size_m ...] [--pairs N] [--od N] [--irregular]
+
+For each grid size, times the hierarchy build, ``N`` point-to-point queries
+(``ContractionHierarchy.distance`` against ``nx.shortest_path_length``) and
+an ``M × M`` OD matrix (``many_to_many`` against one networkx Dijkstra per
+origin), and checks that both give the same distances. Both sides use the
+directed graph, so ``--irregular``, which removes streets and adds
+diagonals and one-way streets to the grids, also checks one-way routing.
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+
+import networkx as nx
+import numpy as np
+
+from grafos import ch, loader, prepare
+
+
+def _timed(fn):
+    start = time.perf_counter()
+    out = fn()
+    return out, time.perf_counter() - start
+
+
+def _nx_length(G: nx.MultiDiGraph, a, b) -> float:
+    try:
+        return nx.shortest_path_length(G, a, b, weight="length")
+    except nx.NetworkXNoPath:
+        return np.inf
+
+
+IRREGULAR = dict(remove_fraction=0.1, diagonal_fraction=0.1, oneway_fraction=0.2, jitter=0.3)
+
+
+def run(size_m: int, pairs: int, od: int, seed: int = 0, irregular: bool = False) -> None:
+    options = IRREGULAR if irregular else {}
+    G = prepare.prepare_graph(loader.synthetic_graph(size_m=size_m, step_m=50, seed=seed, **options))
+    nodes = np.asarray(list(G.nodes))
+    position = {node: i for i, node in enumerate(nodes.tolist())}
+    arcs = np.array([(position[a], position[b], d["length"]) for a, b, d in G.edges(data=True)])
+    n_nodes = nodes.size
+    rng = np.random.default_rng(seed)
+
+    hierarchy, build = _timed(
+        lambda: ch.build_hierarchy(n_nodes, arcs[:, 0].astype(np.int64), arcs[:, 1].astype(np.int64), arcs[:, 2])
+    )
+    print(
+        f"grid {size_m} m: {n_nodes} nodes, {len(arcs)} arcs, build {build:.2f} s, "
+        f"{hierarchy.n_shortcuts} shortcuts"
+    )
+
+    s, t = rng.integers(0, n_nodes, (2, pairs))
+    found, t_ch = _timed(lambda: [hierarchy.distance(a, b) for a, b in zip(s, t)])
+    expected, t_nx = _timed(
+        lambda: [_nx_length(G, nodes[a], nodes[b]) for a, b in zip(s, t)]
+    )
+    assert np.allclose(found, expected)
+    print(f"  {pairs} routes: ch {t_ch * 1e3 / pairs:.2f} ms/query, networkx {t_nx * 1e3 / pairs:.2f} ms/query")
+
+    points = rng.choice(n_nodes, min(od, n_nodes), replace=False)
+    matrix, t_ch = _timed(lambda: hierarchy.many_to_many(points, points))
+    reference, t_nx = _timed(
+        lambda: [nx.single_source_dijkstra_path_length(G, nodes[a], weight="length") for a in points]
+    )
+    assert np.allclose(matrix, [[row.get(nodes[b], np.inf) for b in points] for row in reference])
+    print(f"  {points.size}x{points.size} OD matrix: ch {t_ch:.2f} s, networkx {t_nx:.2f} s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("sizes", nargs="*", type=int, default=[1000, 2500])
+    parser.add_argument("--pairs", type=int, default=200)
+    parser.add_argument("--od", type=int, default=200)
+    parser.add_argument("--irregular", action="store_true")
+    args = parser.parse_args()
+    for size in args.sizes:
+        run(size, args.pairs, args.od, irregular=args.irregular)
+
+
+if __name__ == "__main__":
+    main()
@@ -1 +1 @@
-from . import loader, prepare, metrics
+from . import csr, loader, prepare, metrics, store
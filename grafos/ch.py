@@ -0,0 +1,347 @@
+"""Contraction hierarchy for point-to-point distances and OD matrices.
+
+A contraction hierarchy ranks the nodes and removes ("contracts") them one
+by one, adding a *shortcut* between two neighbours of the removed node
+whenever the path through it was the only shortest one (checked with a
+small local *witness* search). Each node then only keeps its edges towards
+higher-ranked nodes. A shortest path between ``s`` and ``t`` always goes up
+the hierarchy from both ends and meets at its top node, so a query only
+explores the small upward search spaces of ``s`` and ``t``.
+
+The graph is directed, so one-way streets are honoured: contracting a node
+joins each of its incoming neighbours to each outgoing one, and the result
+keeps two graphs, the *upward* arcs searched forwards from ``s`` and the
+*downward* arcs searched backwards from ``t``. Preprocessing is plain
+Python and runs once per network, when the result is saved; the result is
+a set of arrays saved with :meth:`ContractionHierarchy.save`. Queries run
+the two searches with SciPy's Dijkstra on the CSR matrices and combine
+them with array operations.
+"""
+
+from __future__ import annotations
+
+import heapq
+import os
+from dataclasses import dataclass, field
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse import csgraph
+
+
+__all__ = ["ContractionHierarchy", "build_hierarchy"]
+
+
+DEFAULT_MAX_SETTLED = 200
+# csgraph ignore les poids nuls implicites : longueur minimale strictement positive
+_EPSILON = 1e-6
+
+
+def _witness(
+    adj: List[Dict[int, float]],
+    source: int,
+    skip: int,
+    targets: Dict[int, float],
+    limit: float,
+    max_settled: int,
+) -> Dict[int, float]:
+    """Distances from ``source`` to ``targets`` avoiding ``skip`` (bounded)."""
+    inf = float("inf")
+    dist = {source: 0.0}
+    heap = [(0.0, source)]
+    remaining = len(targets)
+    found: Dict[int, float] = {}
+    settled = 0
+    pop, push = heapq.heappop, heapq.heappush
+    while heap and remaining and settled < max_settled:
+        d, node = pop(heap)
+        if d > dist[node]:
+            continue
+        if d > limit:
+            break
+        settled += 1
+        if node in targets and node not in found:
+            found[node] = d
+            remaining -= 1
+        for nbr, w in adj[node].items():
+            nd = d + w
+            if nbr != skip and nd <= limit and nd < dist.get(nbr, inf):
+                dist[nbr] = nd
+                push(heap, (nd, nbr))
+    return found
+
+
+def _shortcuts(
+    out: List[Dict[int, float]], inc: List[Dict[int, float]], node: int, max_settled: int
+) -> List[Tuple[int, int, float]]:
+    """Shortcuts ``(u, w, length)`` needed to contract ``node`` from the remaining graph."""
+    outgoing = list(out[node].items())
+    needed = []
+    for u, wu in inc[node].items():
+        targets = {w: wu + ww for w, ww in outgoing if w != u}
+        if not targets:
+            continue
+        found = _witness(out, u, node, targets, max(targets.values()), max_settled)
+        for w, via in targets.items():
+            if found.get(w, np.inf) > via:
+                needed.append((u, w, via))
+    return needed
+
+
+def _csr(n_nodes: int, rows: List[int], cols: List[int], weights: List[float], middle: List[int]):
+    rows_ = np.asarray(rows, dtype=np.int64)
+    cols_ = np.asarray(cols, dtype=np.int64)
+    sort = np.lexsort((cols_, rows_))
+    indptr = np.zeros(n_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows_, minlength=n_nodes), out=indptr[1:])
+    return indptr, cols_[sort], np.asarray(weights, dtype=float)[sort], np.asarray(middle, dtype=np.int64)[sort]
+
+
+def build_hierarchy(
+    n_nodes: int,
+    u: np.ndarray,
+    v: np.ndarray,
+    length: np.ndarray,
+    max_settled: int = DEFAULT_MAX_SETTLED,
+    directed: bool = True,
+) -> "ContractionHierarchy":
+    """Contract a graph given as node-position arcs ``u → v``.
+
+    With ``directed=False`` every arc is also usable from ``v`` to ``u``.
+    Parallel arcs keep their shortest ``length``; self-loops are ignored.
+    Nodes are ordered lazily by edge difference (shortcuts added minus arcs
+    removed) plus the number of already contracted neighbours, which keeps
+    the hierarchy balanced. ``max_settled`` bounds each witness search: a
+    smaller value preprocesses faster but may add superfluous shortcuts
+    (never wrong ones).
+    """
+    out: List[Dict[int, float]] = [dict() for _ in range(n_nodes)]
+    inc: List[Dict[int, float]] = [dict() for _ in range(n_nodes)]
+
+    def add(a: int, b: int, w: float) -> bool:
+        if w < out[a].get(b, np.inf):
+            out[a][b] = w
+            inc[b][a] = w
+            return True
+        return False
+
+    for a, b, w in zip(np.asarray(u).tolist(), np.asarray(v).tolist(), np.asarray(length, dtype=float).tolist()):
+        if a == b or not np.isfinite(w):
+            continue
+        w = max(w, _EPSILON)
+        add(a, b, w)
+        if not directed:
+            add(b, a, w)
+
+    middle: Dict[Tuple[int, int], int] = {}
+    deleted = [0] * n_nodes
+
+    def evaluate(node: int) -> Tuple[int, List[Tuple[int, int, float]]]:
+        added = _shortcuts(out, inc, node, max_settled)
+        return len(added) - len(out[node]) - len(inc[node]) + deleted[node], added
+
+    heap = [(evaluate(node)[0], node) for node in range(n_nodes)]
+    heapq.heapify(heap)
+    rank = np.empty(n_nodes, dtype=np.int64)
+    # Graphe montant (arcs vers un nœud de rang supérieur) et graphe
+    # descendant inversé (arcs venant d'un nœud de rang supérieur)
+    up: Tuple[List[int], List[int], List[float], List[int]] = ([], [], [], [])
+    down: Tuple[List[int], List[int], List[float], List[int]] = ([], [], [], [])
+    order = 0
+    while heap:
+        _, node = heapq.heappop(heap)
+        # Priorité paresseuse : recalculée, le nœud repasse en file s'il a perdu sa place
+        current, added = evaluate(node)
+        if heap and current > heap[0][0]:
+            heapq.heappush(heap, (current, node))
+            continue
+        rank[node] = order
+        order += 1
+        for graph, arcs, reverse in ((up, out, inc), (down, inc, out)):
+            for nbr, w in arcs[node].items():
+                graph[0].append(node)
+                graph[1].append(nbr)
+                graph[2].append(w)
+                graph[3].append(middle.get((node, nbr) if graph is up else (nbr, node), -1))
+                del reverse[nbr][node]
+        for nbr in out[node].keys() | inc[node].keys():
+            deleted[nbr] += 1
+        out[node], inc[node] = {}, {}
+        for a, b, w in added:
+            if add(a, b, w):
+                middle[(a, b)] = node
+
+    up_indptr, up_indices, up_weights, up_middle = _csr(n_nodes, *up)
+    down_indptr, down_indices, down_weights, down_middle = _csr(n_nodes, *down)
+    return ContractionHierarchy(
+        rank=rank,
+        indptr=up_indptr,
+        indices=up_indices,
+        weights=up_weights,
+        middle=up_middle,
+        down_indptr=down_indptr,
+        down_indices=down_indices,
+        down_weights=down_weights,
+        down_middle=down_middle,
+    )
+
+
+_ARRAYS = (
+    "rank", "indptr", "indices", "weights", "middle",
+    "down_indptr", "down_indices", "down_weights", "down_middle",
+)
+
+
+@dataclass(eq=False)
+class ContractionHierarchy:
+    """Upward and downward graphs of a contracted network, in CSR form.
+
+    Row ``i`` of the upward graph (``indptr``, ``indices``, ...) lists the
+    arcs (original or shortcuts) from node ``i`` to higher-ranked nodes;
+    row ``i`` of the downward graph (``down_*``) lists, reversed, the arcs
+    from higher-ranked nodes to ``i``. ``middle`` is the contracted node a
+    shortcut bypasses, ``-1`` for original arcs.
+    """
+
+    rank: np.ndarray
+    indptr: np.ndarray
+    indices: np.ndarray
+    weights: np.ndarray
+    middle: np.ndarray
+    down_indptr: np.ndarray
+    down_indices: np.ndarray
+    down_weights: np.ndarray
+    down_middle: np.ndarray
+    _matrices: Dict[bool, sp.csr_matrix] = field(default_factory=dict, repr=False)
+
+    @property
+    def n_nodes(self) -> int:
+        return int(self.rank.shape[0])
+
+    @property
+    def n_shortcuts(self) -> int:
+        return int((self.middle >= 0).sum() + (self.down_middle >= 0).sum())
+
+    def matrix(self, reverse: bool = False) -> sp.csr_matrix:
+        """Upward graph, or the reversed downward graph when ``reverse``."""
+        if reverse not in self._matrices:
+            n = self.n_nodes
+            arrays = (
+                (self.down_weights, self.down_indices, self.down_indptr)
+                if reverse
+                else (self.weights, self.indices, self.indptr)
+            )
+            self._matrices[reverse] = sp.csr_matrix(arrays, shape=(n, n))
+        return self._matrices[reverse]
+
+    # -- persistance -----------------------------------------------------
+    def save(self, path: os.PathLike | str) -> None:
+        with open(path, "wb") as fh:
+            np.savez(fh, **{name: getattr(self, name) for name in _ARRAYS})
+
+    @classmethod
+    def load(cls, path: os.PathLike | str) -> "ContractionHierarchy":
+        with np.load(path, allow_pickle=False) as data:
+            return cls(**{name: data[name] for name in _ARRAYS})
+
+    # -- requêtes --------------------------------------------------------
+    def upward(self, nodes: Sequence[int], predecessors: bool = False, reverse: bool = False):
+        """Distances (and optionally predecessors) of the upward searches.
+
+        ``reverse`` searches towards ``nodes`` (on the downward graph), as
+        the target side of a query does.
+        """
+        return csgraph.dijkstra(
+            self.matrix(reverse),
+            directed=True,
+            indices=np.asarray(nodes, dtype=np.int64),
+            return_predecessors=predecessors,
+        )
+
+    def distance(self, source: int, target: int) -> float:
+        """Network distance between two node positions (``inf`` if unreachable)."""
+        forward, backward = self.upward([source]), self.upward([target], reverse=True)
+        return float(np.min(forward + backward))
+
+    def _unpack(self, a: int, b: int, out: List[int]) -> None:
+        """Append the original nodes of the arc ``a → b`` of the hierarchy after ``a``."""
+        stack = [(a, b)]
+        while stack:
+            x, y = stack.pop()
+            # Arc montant rangé sous x, arc descendant rangé (inversé) sous y
+            if self.rank[x] < self.rank[y]:
+                low, high, indptr, indices, middle = x, y, self.indptr, self.indices, self.middle
+            else:
+                low, high, indptr, indices, middle = y, x, self.down_indptr, self.down_indices, self.down_middle
+            start, end = indptr[low], indptr[low + 1]
+            k = start + int(np.searchsorted(indices[start:end], high))
+            mid = int(middle[k])
+            if mid < 0:
+                out.append(y)
+            else:
+                # Le second segment est empilé en premier : traité après
+                stack.append((mid, y))
+                stack.append((x, mid))
+
+    def path(self, source: int, target: int) -> Tuple[float, List[int]]:
+        """Distance and node positions of a shortest path (empty if none)."""
+        forward, from_source = self.upward([source], predecessors=True)
+        backward, to_target = self.upward([target], predecessors=True, reverse=True)
+        total = forward[0] + backward[0]
+        meet = int(np.argmin(total))
+        if not np.isfinite(total[meet]):
+            return float("inf"), []
+        up: List[int] = [meet]
+        while up[-1] != source:
+            up.append(int(from_source[0, up[-1]]))
+        # Prédécesseurs de la recherche inversée : arcs suivants vers la cible
+        down: List[int] = [meet]
+        while down[-1] != target:
+            down.append(int(to_target[0, down[-1]]))
+        route = [source]
+        hops = up[::-1] + down[1:]
+        for a, b in zip(hops[:-1], hops[1:]):
+            self._unpack(a, b, route)
+        return float(total[meet]), route
+
+    def many_to_many(
+        self, sources: Sequence[int], targets: Sequence[int], chunk_size: int = 128
+    ) -> np.ndarray:
+        """``len(sources) × len(targets)`` matrix of network distances.
+
+        Every source is searched once upwards and every target once on the
+        downward graph; the distance of a pair is the best sum over the
+        nodes their search spaces share.
+        """
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        out = np.full((sources.size, targets.size), np.inf)
+        if sources.size == 0 or targets.size == 0:
+            return out
+
+        def spaces(points: np.ndarray, reverse: bool):
+            rows, nodes, dists = [], [], []
+            for start in range(0, points.size, chunk_size):
+                dist = np.atleast_2d(self.upward(points[start : start + chunk_size], reverse=reverse))
+                r, c = np.nonzero(np.isfinite(dist))
+                rows.append(r + start)
+                nodes.append(c)
+                dists.append(dist[r, c])
+            return np.concatenate(rows), np.concatenate(nodes), np.concatenate(dists)
+
+        s_rows, s_nodes, s_dist = spaces(sources, False)
+        t_rows, t_nodes, t_dist = spaces(targets, True)
+        # Regroupement par nœud de rencontre
+        s_order = np.argsort(s_nodes, kind="stable")
+        t_order = np.argsort(t_nodes, kind="stable")
+        s_nodes, s_rows, s_dist = s_nodes[s_order], s_rows[s_order], s_dist[s_order]
+        t_nodes, t_rows, t_dist = t_nodes[t_order], t_rows[t_order], t_dist[t_order]
+        common = np.intersect1d(s_nodes, t_nodes, assume_unique=False)
+        s_lo, s_hi = np.searchsorted(s_nodes, common, "left"), np.searchsorted(s_nodes, common, "right")
+        t_lo, t_hi = np.searchsorted(t_nodes, common, "left"), np.searchsorted(t_nodes, common, "right")
+        for a, b, c, d in zip(s_lo.tolist(), s_hi.tolist(), t_lo.tolist(), t_hi.tolist()):
+            rows, cols = s_rows[a:b], t_rows[c:d]
+            block = np.ix_(rows, cols)
+            out[block] = np.minimum(out[block], s_dist[a:b, None] + t_dist[None, c:d])
+        return out
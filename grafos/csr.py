@@ -0,0 +1,233 @@
+"""Array-backed representation of a street network.
+
+The metric functions used to convert the prepared ``MultiDiGraph`` into an
+undirected networkx graph on every call and then walk its dict-of-dict
+adjacency. :class:`CSRGraph` is built once per request instead: nodes are
+mapped to integer positions and the undirected adjacency is stored in CSR form
+(``indptr``/``indices``/``weights``) next to NumPy arrays of the node
+coordinates and of the original directed edges.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from scipy.sparse import csgraph
+
+
+__all__ = ["CSRGraph", "build_csr"]
+
+
+@dataclass(eq=False)
+class CSRGraph:
+    """Compact, read-only view of a street network.
+
+    ``nodes`` holds the original node ids; every other array refers to nodes by
+    their position in it. The CSR adjacency is the undirected simple graph used
+    for shortest paths: parallel and reciprocal edges are collapsed into one
+    *pair* whose weight is the shortest ``length`` among them. ``edge_*`` arrays
+    describe the directed edges of the source graph in ``G.edges(keys=True)``
+    order and ``edge_pair`` links each of them to its undirected pair.
+    ``multi_*`` arrays are the edges of the undirected multigraph view
+    (what ``G.to_undirected()`` keeps), used for degree and spectral measures.
+    """
+
+    nodes: np.ndarray
+    x: np.ndarray
+    y: np.ndarray
+    indptr: np.ndarray
+    indices: np.ndarray
+    weights: np.ndarray
+    pair_ids: np.ndarray
+    pair_u: np.ndarray
+    pair_v: np.ndarray
+    pair_length: np.ndarray
+    edge_u: np.ndarray
+    edge_v: np.ndarray
+    edge_key: np.ndarray
+    edge_length: np.ndarray
+    edge_pair: np.ndarray
+    multi_u: np.ndarray
+    multi_v: np.ndarray
+    multi_length: np.ndarray
+    degree: np.ndarray
+    crs: Any = None
+    _matrix: Optional[sp.csr_matrix] = field(default=None, repr=False)
+    _index: Optional[Dict[Any, int]] = field(default=None, repr=False)
+
+    def __getstate__(self) -> dict:
+        # Les caches se reconstruisent à la demande dans chaque processus
+        state = dict(self.__dict__)
+        state["_matrix"] = None
+        state["_index"] = None
+        return state
+
+    @property
+    def n_nodes(self) -> int:
+        return int(self.nodes.shape[0])
+
+    @property
+    def n_edges(self) -> int:
+        """Number of directed edges in the source graph."""
+        return int(self.edge_u.shape[0])
+
+    @property
+    def n_pairs(self) -> int:
+        """Number of undirected adjacent node pairs."""
+        return int(self.pair_u.shape[0])
+
+    @property
+    def index(self) -> Dict[Any, int]:
+        """Mapping from original node id to position."""
+        if self._index is None:
+            self._index = {node: i for i, node in enumerate(self.nodes.tolist())}
+        return self._index
+
+    @property
+    def matrix(self) -> sp.csr_matrix:
+        """Symmetric adjacency as a SciPy CSR matrix (explicit zeros are edges)."""
+        if self._matrix is None:
+            n = self.n_nodes
+            self._matrix = sp.csr_matrix(
+                (self.weights, self.indices, self.indptr), shape=(n, n)
+            )
+        return self._matrix
+
+    @property
+    def has_coordinates(self) -> np.ndarray:
+        return np.isfinite(self.x) & np.isfinite(self.y)
+
+    def component_labels(self) -> Tuple[int, np.ndarray]:
+        """Number of connected components and the label of every node."""
+        if self.n_nodes == 0:
+            return 0, np.empty(0, dtype=np.int32)
+        return csgraph.connected_components(self.matrix, directed=False)
+
+    def distance_rows(
+        self,
+        sources: Iterable[int],
+        limit: Optional[float] = None,
+        unweighted: bool = False,
+        chunk_size: int = 64,
+    ) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """Yield ``(sources, distances)`` blocks of single-source searches.
+
+        Only ``chunk_size`` rows of the distance matrix are alive at once.
+        Unreached nodes (or those beyond ``limit``) are ``inf``.
+        """
+
+        sources = np.fromiter(sources, dtype=np.int64)
+        if sources.size == 0 or self.n_nodes == 0:
+            return
+        limit = np.inf if limit is None else float(limit)
+        for start in range(0, sources.size, chunk_size):
+            block = sources[start : start + chunk_size]
+            dist = csgraph.dijkstra(
+                self.matrix,
+                directed=True,
+                indices=block,
+                unweighted=unweighted,
+                limit=limit,
+            )
+            yield block, np.atleast_2d(dist)
+
+    def neighbours(self) -> Tuple[list, list, list]:
+        """Python lists of the CSR arrays, handy for pure-Python traversals."""
+        return self.indptr.tolist(), self.indices.tolist(), self.weights.tolist()
+
+
+def _coordinate(value: Any) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def build_csr(G: nx.MultiDiGraph, weight: str = "length") -> CSRGraph:
+    """Build a :class:`CSRGraph` from a (prepared) networkx graph.
+
+    Missing ``weight`` attributes count as ``1`` for shortest paths, as in
+    networkx, but stay ``NaN`` in ``edge_length`` so that totals skip them.
+    """
+
+    node_ids = list(G.nodes())
+    n = len(node_ids)
+    nodes = np.empty(n, dtype=object)
+    nodes[:] = node_ids
+    index = {node: i for i, node in enumerate(node_ids)}
+
+    x = np.fromiter((_coordinate(d.get("x")) for _, d in G.nodes(data=True)), dtype=float, count=n)
+    y = np.fromiter((_coordinate(d.get("y")) for _, d in G.nodes(data=True)), dtype=float, count=n)
+
+    if G.is_multigraph():
+        records = list(G.edges(keys=True, data=weight))
+    else:
+        records = [(u, v, 0, w) for u, v, w in G.edges(data=weight)]
+    m = len(records)
+    edge_u = np.fromiter((index[r[0]] for r in records), dtype=np.int64, count=m)
+    edge_v = np.fromiter((index[r[1]] for r in records), dtype=np.int64, count=m)
+    edge_key = np.empty(m, dtype=object)
+    edge_key[:] = [r[2] for r in records]
+    edge_length = np.fromiter((_coordinate(r[3]) for r in records), dtype=float, count=m)
+    cost = np.where(np.isnan(edge_length), 1.0, edge_length)
+
+    # Undirected pairs (a <= b) with the shortest parallel length.
+    a = np.minimum(edge_u, edge_v)
+    b = np.maximum(edge_u, edge_v)
+    pair_code = a * max(n, 1) + b
+    unique_codes, edge_pair = np.unique(pair_code, return_inverse=True)
+    edge_pair = edge_pair.astype(np.int64).reshape(-1)
+    pair_u = (unique_codes // max(n, 1)).astype(np.int64)
+    pair_v = (unique_codes % max(n, 1)).astype(np.int64)
+    pair_length = np.full(unique_codes.shape[0], np.inf)
+    np.minimum.at(pair_length, edge_pair, cost)
+
+    # Symmetric CSR; self-loops appear once and never shorten a path.
+    loops = pair_u == pair_v
+    pid = np.arange(pair_u.shape[0], dtype=np.int64)
+    rows = np.concatenate([pair_u, pair_v[~loops]])
+    cols = np.concatenate([pair_v, pair_u[~loops]])
+    vals = np.concatenate([pair_length, pair_length[~loops]])
+    pids = np.concatenate([pid, pid[~loops]])
+    order = np.lexsort((cols, rows))
+    rows, cols, vals, pids = rows[order], cols[order], vals[order], pids[order]
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=n), out=indptr[1:])
+
+    # Degree in the undirected multigraph view (as ``G.to_undirected()``):
+    # reciprocal edges sharing a key collapse, self-loops count twice.
+    multi = pd.DataFrame({"a": a, "b": b, "key": edge_key, "length": cost})
+    multi = multi.drop_duplicates(subset=["a", "b", "key"], keep="last")
+    multi_u = multi["a"].to_numpy(dtype=np.int64)
+    multi_v = multi["b"].to_numpy(dtype=np.int64)
+    multi_length = multi["length"].to_numpy(dtype=float)
+    degree = np.bincount(multi_u, minlength=n) + np.bincount(multi_v, minlength=n)
+
+    return CSRGraph(
+        nodes=nodes,
+        x=x,
+        y=y,
+        indptr=indptr,
+        indices=cols.astype(np.int64),
+        weights=vals.astype(float),
+        pair_ids=pids,
+        pair_u=pair_u,
+        pair_v=pair_v,
+        pair_length=pair_length,
+        edge_u=edge_u,
+        edge_v=edge_v,
+        edge_key=edge_key,
+        edge_length=edge_length,
+        edge_pair=edge_pair,
+        multi_u=multi_u,
+        multi_v=multi_v,
+        multi_length=multi_length,
+        degree=degree.astype(np.int64),
+        crs=G.graph.get("crs"),
+        _index=index,
+    )
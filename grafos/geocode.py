@@ -0,0 +1,156 @@
+"""Geocoding with a persistent cache and coordinate shortcuts.
+
+``load_city_graph`` needs a point before it can query Overpass. Queries that
+already are coordinates (``"43.73, 7.42"``) are parsed locally, and place
+names are resolved through ``ox.geocode`` once and then served from a JSON
+cache whose entries expire after a TTL. The JSON file may be shared by
+several worker processes: each write merges with the file on disk under a
+file lock, and a lookup re-reads the file once another process changed it.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import osmnx as ox
+
+from .store import file_lock, unique_tmp
+
+
+__all__ = ["GeocodeCache", "parse_latlon", "resolve", "default_cache"]
+
+
+DEFAULT_TTL = 30 * 24 * 3600
+
+_LATLON = re.compile(r"^\s*\(?\s*([-+]?\d+(?:\.\d+)?)\s*[,;\s]\s*([-+]?\d+(?:\.\d+)?)\s*\)?\s*$")
+
+
+def parse_latlon(text: str) -> Optional[Tuple[float, float]]:
+    """Return ``(lat, lon)`` when ``text`` is a coordinate pair, else ``None``."""
+    match = _LATLON.match(str(text))
+    if not match:
+        return None
+    lat, lon = float(match.group(1)), float(match.group(2))
+    if not (-90.0 <= lat <= 90.0 and -180.0 <= lon <= 180.0):
+        return None
+    return lat, lon
+
+
+def _normalise(query: str) -> str:
+    return unicodedata.normalize("NFC", " ".join(str(query).lower().split()))
+
+
+class GeocodeCache:
+    """Query → point cache, kept in memory and optionally persisted as JSON."""
+
+    def __init__(self, path: Optional[os.PathLike | str] = None, ttl: float = DEFAULT_TTL) -> None:
+        self.path = Path(path).expanduser() if path else None
+        self.ttl = float(ttl)
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, float]] = {}
+        # Date de modification du fichier lors de la dernière lecture
+        self._mtime: Optional[int] = None
+        if self.path is not None:
+            with self._lock:
+                self._refresh()
+
+    def _lock_path(self) -> Path:
+        return self.path.with_name(self.path.name + ".lock")
+
+    def _stamp(self) -> Optional[int]:
+        try:
+            return self.path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _merge(self, entries: Dict[str, Dict[str, float]]) -> Dict[str, Dict[str, float]]:
+        """``self._entries`` updated with the newer of ``entries``."""
+        merged = dict(self._entries)
+        for key, value in entries.items():
+            if value.get("ts", 0.0) >= merged.get(key, {}).get("ts", 0.0):
+                merged[key] = value
+        return merged
+
+    def _refresh(self) -> None:
+        # Appelé sous ``self._lock`` : relit le fichier s'il a changé
+        if self._stamp() == self._mtime:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with file_lock(self._lock_path()):
+            self._mtime = self._stamp()
+            self._entries = self._merge(self._read())
+
+    def get(self, query: str) -> Optional[Tuple[float, float]]:
+        with self._lock:
+            if self.path is not None:
+                # Entrées écrites par les autres processus depuis la dernière lecture
+                self._refresh()
+            entry = self._entries.get(_normalise(query))
+        if entry is None or time.time() - entry.get("ts", 0.0) > self.ttl:
+            return None
+        return entry["lat"], entry["lon"]
+
+    def _read(self) -> Dict[str, Dict[str, float]]:
+        try:
+            return json.loads(self.path.read_text())
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def put(self, query: str, point: Tuple[float, float]) -> None:
+        key = _normalise(query)
+        entry = {"lat": float(point[0]), "lon": float(point[1]), "ts": time.time()}
+        with self._lock:
+            if self.path is None:
+                self._entries[key] = entry
+                return
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with file_lock(self._lock_path()):
+                # Fusion avec les entrées écrites entre-temps par d'autres processus
+                entries = self._merge(self._read())
+                entries[key] = entry
+                tmp = unique_tmp(self.path)
+                tmp.write_text(json.dumps(entries))
+                os.replace(tmp, self.path)
+                self._mtime = self._stamp()
+            self._entries = entries
+
+
+_DEFAULT: Optional[GeocodeCache] = None
+
+
+def default_cache() -> GeocodeCache:
+    """Cache at ``GEOCODE_CACHE_PATH`` (or ``$OSM_CACHE_DIR/geocode.json``).
+
+    Without either variable the cache only lives in memory.
+    """
+    global _DEFAULT
+    path = os.environ.get("GEOCODE_CACHE_PATH")
+    if not path and os.environ.get("OSM_CACHE_DIR"):
+        path = str(Path(os.environ["OSM_CACHE_DIR"]).expanduser() / "geocode.json")
+    ttl = float(os.environ.get("GEOCODE_CACHE_TTL", DEFAULT_TTL))
+    current = str(Path(path).expanduser()) if path else None
+    if _DEFAULT is None or (str(_DEFAULT.path) if _DEFAULT.path else None) != current or _DEFAULT.ttl != ttl:
+        _DEFAULT = GeocodeCache(path, ttl=ttl)
+    return _DEFAULT
+
+
+def resolve(query: str, cache: Optional[GeocodeCache] = None) -> Tuple[float, float]:
+    """Point for ``query``: parsed coordinates, cached result or ``ox.geocode``."""
+    point = parse_latlon(query)
+    if point is not None:
+        return point
+    cache = cache if cache is not None else default_cache()
+    point = cache.get(query)
+    if point is not None:
+        return point
+    lat, lon = ox.geocode(query)
+    point = (float(lat), float(lon))
+    cache.put(query, point)
+    return point
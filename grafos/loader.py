@@ -8,7 +8,9 @@ from pathlib import Path
 
 import networkx as nx
 import osmnx as ox
-from shapely.geometry import LineString
+
+from . import geocode, overpass, synthetic
+from .store import GraphStore, default_store
 
 
 __all__ = [
@@ -26,6 +28,8 @@ DEFAULT_OVERPASS_ENDPOINTS: tuple[str, ...] = (
     "https://overpass.openstreetmap.ru/cgi/interpreter",
 )
 
+DEFAULT_HEDGE_DELAY = 8.0
+
 
 @dataclass
 class OpenStreetMapUnavailable(RuntimeError):
@@ -98,16 +102,32 @@ def configure_osmnx() -> None:
 configure_osmnx()
 
 
+def _hedge_delay() -> float:
+    """``OVERPASS_HEDGE_DELAY`` in seconds (the default if unset or invalid)."""
+    try:
+        delay = float(os.environ.get("OVERPASS_HEDGE_DELAY", DEFAULT_HEDGE_DELAY))
+    except ValueError:
+        delay = DEFAULT_HEDGE_DELAY
+    return delay if math.isfinite(delay) and delay >= 0 else DEFAULT_HEDGE_DELAY
+
+
 def load_city_graph(
     city: str,
     mode: Literal["walk", "bike", "drive"] = "walk",
     distance: int = 2000,
+    point: Optional[tuple[float, float]] = None,
 ) -> nx.MultiDiGraph:
     """Download a graph for ``city`` from Overpass.
 
-    The function iterates through a list of endpoints (user supplied or defaults)
-    and returns as soon as one request succeeds. If all endpoints fail an
-    :class:`OpenStreetMapUnavailable` error is raised with aggregated context.
+    Overpass queries are hedged across the configured endpoints (see
+    :class:`grafos.overpass.HedgedFetcher`): the next endpoint is started after
+    ``OVERPASS_HEDGE_DELAY`` seconds without an answer and the first success
+    wins. If all endpoints fail an :class:`OpenStreetMapUnavailable` error is
+    raised with aggregated context.
+
+    ``point`` (``(lat, lon)``) skips geocoding; otherwise ``city`` goes through
+    :func:`grafos.geocode.resolve`, which accepts ``"lat,lon"`` strings and
+    caches place names.
     """
 
     local_graph = os.environ.get("OSM_GRAPHML_PATH")
@@ -119,7 +139,7 @@ def load_city_graph(
     endpoints = list(_iter_endpoints())
 
     try:
-        lat, lon = ox.geocode(city)
+        lat, lon = point if point is not None else geocode.resolve(city)
     except Exception as exc:  # pragma: no cover - network failure
         raise OpenStreetMapUnavailable(
             city=city,
@@ -131,75 +151,50 @@ def load_city_graph(
 
     network_type = mode if mode in {"walk", "bike", "drive"} else "walk"
 
-    errors: list[str] = []
-    attempted: list[str] = []
-    for endpoint in endpoints:
-        if not endpoint:
-            continue
-        attempted.append(endpoint)
-        ox.settings.overpass_endpoint = endpoint
-        try:
+    fetcher = overpass.HedgedFetcher(
+        endpoints,
+        hedge_delay=_hedge_delay(),
+        timeout=ox.settings.timeout,
+    )
+    try:
+        with overpass.use_fetcher(fetcher):
             return ox.graph_from_point(
                 (lat, lon),
                 dist=distance,
                 network_type=network_type,
                 simplify=True,
             )
-        except Exception as exc:  # pragma: no cover - network errors vary
-            errors.append(f"{endpoint}: {exc}")
-            continue
-
-    raise OpenStreetMapUnavailable(
-        city=city,
-        mode=network_type,
-        distance=distance,
-        endpoints=tuple(attempted),
-        errors=tuple(errors),
-    )
+    except overpass.OverpassFetchError as exc:  # pragma: no cover - network errors vary
+        raise OpenStreetMapUnavailable(
+            city=city,
+            mode=network_type,
+            distance=distance,
+            endpoints=exc.endpoints,
+            errors=exc.errors,
+        ) from exc
+    except Exception as exc:  # pragma: no cover - malformed responses vary
+        raise OpenStreetMapUnavailable(
+            city=city,
+            mode=network_type,
+            distance=distance,
+            endpoints=tuple(fetcher.attempted),
+            errors=(f"{type(exc).__name__}: {exc}",),
+        ) from exc
 
 def synthetic_graph(
-    center=(43.7384, 7.4246),
+    center=synthetic.DEFAULT_CENTER,
     size_m: int = 800,
     step_m: int = 100,
+    **irregularity,
 ) -> nx.MultiDiGraph:
-    deg_lat = step_m / 111320.0
-    deg_lon = step_m / (111320.0 * math.cos(math.radians(center[0])))
-    graph = nx.MultiDiGraph()
-    n = int(size_m / step_m)
-
-    def _node_id(i: int, j: int) -> str:
-        return f"{i}_{j}"
-
-    for i in range(-n // 2, n // 2 + 1):
-        for j in range(-n // 2, n // 2 + 1):
-            lat = center[0] + i * deg_lat
-            lon = center[1] + j * deg_lon
-            graph.add_node(_node_id(i, j), y=lat, x=lon)
-
-    def _edge(u, v):
-        return LineString(
-            [
-                (graph.nodes[u]["x"], graph.nodes[u]["y"]),
-                (graph.nodes[v]["x"], graph.nodes[v]["y"]),
-            ]
-        )
-
-    for i in range(-n // 2, n // 2 + 1):
-        for j in range(-n // 2, n // 2):
-            u = _node_id(i, j)
-            v = _node_id(i, j + 1)
-            graph.add_edge(u, v, length=step_m, geometry=_edge(u, v))
-            graph.add_edge(v, u, length=step_m, geometry=_edge(v, u))
+    """Offline grid graph centred on ``center`` (see :mod:`grafos.synthetic`).
 
-    for i in range(-n // 2, n // 2):
-        for j in range(-n // 2, n // 2 + 1):
-            u = _node_id(i, j)
-            v = _node_id(i + 1, j)
-            graph.add_edge(u, v, length=step_m, geometry=_edge(u, v))
-            graph.add_edge(v, u, length=step_m, geometry=_edge(v, u))
-
-    graph.graph["crs"] = "EPSG:4326"
-    return graph
+    ``irregularity`` takes the options of
+    :func:`~grafos.synthetic.synthetic_network` (``remove_fraction``,
+    ``diagonal_fraction``, ``oneway_fraction``, ``components``, ``jitter``,
+    ``seed``) and ``geometry=False`` skips the edge geometries.
+    """
+    return synthetic.synthetic_graph(center, size_m, step_m, **irregularity)
 
 
 def get_graph(
@@ -207,11 +202,30 @@ def get_graph(
     mode: Literal["walk", "bike", "drive"] = "walk",
     distance: int = 2000,
     fallback_to_synthetic: bool | None = None,
+    store: GraphStore | None | bool = True,
+    point: Optional[tuple[float, float]] = None,
 ) -> nx.MultiDiGraph:
-    """Download a graph, optionally falling back to a synthetic sample."""
+    """Download a graph, optionally falling back to a synthetic sample.
+
+    Graphs are looked up in (and saved to) the persistent :class:`GraphStore`
+    first. ``store=True`` uses the one configured by ``GRAPH_STORE_DIR``,
+    ``False``/``None`` disables it. With an explicit ``point`` the graph is
+    stored under its coordinates rather than under ``city``.
+    """
+
+    if point is None:
+        point = geocode.parse_latlon(city)
+    store_key = f"{point[0]:.6f},{point[1]:.6f}" if point is not None else city
+
+    if store is True:
+        store = default_store()
+    if store:
+        cached = store.get(store_key, mode, distance)
+        if cached is not None:
+            return cached
 
     try:
-        return load_city_graph(city, mode, distance)
+        G = load_city_graph(city, mode, distance, point=point)
     except OpenStreetMapUnavailable:
         allow = (
             fallback_to_synthetic
@@ -221,3 +235,6 @@ def get_graph(
         if allow:
             return synthetic_graph()
         raise
+    if store:
+        store.put(store_key, mode, distance, G)
+    return G
@@ -1,35 +1,119 @@
 from __future__ import annotations
-from typing import Dict
+from typing import Dict, Hashable, Optional, Sequence, Tuple
 
+import functools
+import heapq
+import itertools
 import math
+import random
+import threading
+import time
 
 import geopandas as gpd
 import h3
 import networkx as nx
-import osmnx as ox
+import numpy as np
 import pandas as pd
+import shapely
+from scipy.stats import norm, t as t_dist
+from shapely import STRtree
 from shapely.geometry import Polygon
 
-def compute_metrics(G: nx.MultiDiGraph) -> Dict[str, float]:
-    nodes = G.number_of_nodes()
-    edges = G.number_of_edges()
-    try:
-        ge = ox.graph_to_gdfs(G, nodes=False, edges=True, fill_edge_geometry=True)
-        total_km = float(ge.get("length", pd.Series(0)).sum() / 1000.0)
-    except Exception:
-        total_km = 0.0
-
-    Gu = G.to_undirected()
-    comps = nx.number_connected_components(Gu)
-    component_sizes = sorted((len(c) for c in nx.connected_components(Gu)), reverse=True)
+from . import projection, spectral
+from .accessibility import ACCESS_COLUMNS, DEFAULT_BETA, DEFAULT_RADIUS, local_accessibility
+from .csr import CSRGraph, build_csr
+from .parallel import SourceExecutor
+from .spectral import SPECTRAL_COLUMNS
+
+
+def _ensure_csr(G: nx.MultiDiGraph, csr: Optional[CSRGraph]) -> CSRGraph:
+    return csr if csr is not None else build_csr(G)
+
+
+EXACT_PATH_LENGTH_MAX_NODES = 1500
+PATH_LENGTH_SAMPLES = 200
+
+
+def _mean_distance_kernel(csr: CSRGraph, sources: np.ndarray) -> np.ndarray:
+    """Mean network distance from each source to every node it reaches."""
+    out = []
+    for _, dist in csr.distance_rows(sources):
+        finite = np.isfinite(dist)
+        reached = finite.sum(axis=1) - 1
+        total = np.where(finite, dist, 0.0).sum(axis=1)
+        out.append(np.divide(total, reached, out=np.zeros(dist.shape[0]), where=reached > 0))
+    return np.concatenate(out) if out else np.zeros(0)
+
+
+def average_shortest_path(
+    csr: CSRGraph,
+    mode: str = "auto",
+    samples: int = PATH_LENGTH_SAMPLES,
+    confidence: float = 0.95,
+    max_exact_nodes: int = EXACT_PATH_LENGTH_MAX_NODES,
+    seed: int = 42,
+    workers: Optional[int] = None,
+) -> Dict[str, float]:
+    """Average shortest path length (m) over the largest connected component.
+
+    ``mode="exact"`` averages over every source; ``"sampled"`` averages the
+    mean distance of ``samples`` random sources and reports a Student-t
+    confidence interval (with finite population correction); ``"auto"``
+    picks exact up to ``max_exact_nodes`` nodes in the component.
+    """
+    empty = {"estimate": 0.0, "ci_low": 0.0, "ci_high": 0.0, "samples": 0, "exact": True}
+    comps, labels = csr.component_labels()
+    if comps == 0:
+        return empty
+    giant = np.flatnonzero(labels == np.argmax(np.bincount(labels)))
+    size = giant.size
+    if size < 2:
+        return empty
+
+    if mode == "auto":
+        mode = "exact" if size <= max_exact_nodes else "sampled"
+    if mode == "exact" or samples >= size:
+        sources = giant
+    else:
+        rng = np.random.default_rng(seed)
+        sources = np.sort(rng.choice(giant, size=max(2, samples), replace=False))
+
+    with SourceExecutor(csr, workers=workers) as executor:
+        means = executor.map(_mean_distance_kernel, sources)[sources]
+    estimate = float(means.mean())
+    if sources.size == size:
+        return {"estimate": estimate, "ci_low": estimate, "ci_high": estimate, "samples": int(size), "exact": True}
+
+    k = sources.size
+    fpc = math.sqrt((size - k) / (size - 1))
+    half = float(t_dist.ppf(0.5 + confidence / 2.0, k - 1) * means.std(ddof=1) / math.sqrt(k) * fpc)
+    return {
+        "estimate": estimate,
+        "ci_low": max(0.0, estimate - half),
+        "ci_high": estimate + half,
+        "samples": int(k),
+        "exact": False,
+    }
+
+
+def compute_metrics(
+    G: nx.MultiDiGraph,
+    csr: Optional[CSRGraph] = None,
+    path_length_mode: str = "auto",
+    workers: Optional[int] = None,
+) -> Dict[str, float]:
+    csr = _ensure_csr(G, csr)
+    nodes = csr.n_nodes
+    edges = csr.n_edges
+    total_km = float(np.nansum(csr.edge_length) / 1000.0)
+
+    comps, labels = csr.component_labels()
+    component_sizes = sorted(np.bincount(labels).tolist(), reverse=True) if nodes else []
     giant_size = component_sizes[0] if component_sizes else 0
 
-    avg_deg = sum(dict(G.degree()).values()) / nodes if nodes else 0.0
+    avg_deg = 2.0 * edges / nodes if nodes else 0.0
 
-    try:
-        avg_path_length = nx.average_shortest_path_length(Gu, weight="length")
-    except Exception:
-        avg_path_length = 0.0
+    path = average_shortest_path(csr, mode=path_length_mode, workers=workers)
 
     return {
         "nodes": nodes,
@@ -38,50 +122,258 @@ def compute_metrics(G: nx.MultiDiGraph) -> Dict[str, float]:
         "components": comps,
         "avg_degree": round(avg_deg, 3),
         "largest_component_nodes": giant_size,
-        "avg_shortest_path_m": round(float(avg_path_length), 3) if avg_path_length else 0.0,
+        "avg_shortest_path_m": round(path["estimate"], 3),
+        "avg_shortest_path_ci_low_m": round(path["ci_low"], 3),
+        "avg_shortest_path_ci_high_m": round(path["ci_high"], 3),
+        "avg_shortest_path_samples": path["samples"],
     }
 
-def add_edge_betweenness(G: nx.MultiDiGraph, edges_gdf: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
-    Gu = G.to_undirected()
-    n = Gu.number_of_nodes()
-    k = min(300, max(30, n//15))
-    bt = nx.betweenness_centrality(Gu, k=k, seed=42, normalized=True)
-    def edge_centrality(row):
-        u = row.get("u"); v = row.get("v")
-        if u in bt and v in bt:
-            return (bt[u]+bt[v])/2.0
-        return 0.0
-    if {"u","v"}.issubset(edges_gdf.columns):
-        edges_gdf = edges_gdf.copy()
-        edges_gdf["betweenness"] = edges_gdf.apply(edge_centrality, axis=1)
-    return edges_gdf
 
-def _straightness_centrality(G: nx.Graph) -> Dict:
-    lengths = dict(nx.all_pairs_dijkstra_path_length(G, weight="length"))
-    coords = {n: (data.get("x"), data.get("y")) for n, data in G.nodes(data=True)}
-    straightness = {}
-    for source, targets in lengths.items():
-        sx, sy = coords.get(source, (None, None))
-        if sx is None or sy is None:
-            straightness[source] = 0.0
-            continue
-        total = 0.0
-        count = 0
-        for target, network_dist in targets.items():
-            if source == target or network_dist <= 0:
-                continue
-            tx, ty = coords.get(target, (None, None))
-            if tx is None or ty is None:
+def _edge_betweenness_kernel(csr: CSRGraph, sources: np.ndarray):
+    """Brandes dependencies accumulated on undirected pairs (length-weighted).
+
+    Returns the sum and the sum of squares of the per-source dependencies,
+    the latter feeding the sampling error estimate.
+    """
+    indptr, indices, weights = csr.neighbours()
+    pair_ids = csr.pair_ids.tolist()
+    n = csr.n_nodes
+    acc = [0.0] * csr.n_pairs
+    acc2 = [0.0] * csr.n_pairs
+    for s in sources.tolist():
+        order = []
+        preds = [[] for _ in range(n)]
+        sigma = [0.0] * n
+        dist = [math.inf] * n
+        seen = {s: 0.0}
+        sigma[s] = 1.0
+        heap = [(0.0, s)]
+        while heap:
+            d, v = heapq.heappop(heap)
+            if dist[v] <= d:
                 continue
-            euclidean = math.hypot(float(sx) - float(tx), float(sy) - float(ty))
-            if euclidean <= 0:
+            dist[v] = d
+            order.append(v)
+            for j in range(indptr[v], indptr[v + 1]):
+                w = indices[j]
+                vw = d + weights[j]
+                if dist[w] == math.inf and (w not in seen or vw < seen[w]):
+                    seen[w] = vw
+                    heapq.heappush(heap, (vw, w))
+                    sigma[w] = sigma[v]
+                    preds[w] = [(v, pair_ids[j])]
+                elif vw == seen.get(w):
+                    sigma[w] += sigma[v]
+                    preds[w].append((v, pair_ids[j]))
+        delta = [0.0] * n
+        local: Dict[int, float] = {}
+        for w in reversed(order):
+            coeff = (1.0 + delta[w]) / sigma[w]
+            for v, pair in preds[w]:
+                c = sigma[v] * coeff
+                local[pair] = local.get(pair, 0.0) + c
+                delta[v] += c
+        for pair, c in local.items():
+            acc[pair] += c
+            acc2[pair] += c * c
+    return np.asarray(acc, dtype=float), np.asarray(acc2, dtype=float)
+
+
+def _edge_index(edges_gdf: gpd.GeoDataFrame) -> Optional[pd.MultiIndex]:
+    """``(u, v, key)`` of every row, from the index or from columns."""
+    if isinstance(edges_gdf.index, pd.MultiIndex) and edges_gdf.index.nlevels == 3:
+        return edges_gdf.index
+    if {"u", "v", "key"}.issubset(edges_gdf.columns):
+        return pd.MultiIndex.from_frame(edges_gdf[["u", "v", "key"]])
+    return None
+
+
+def edge_series(csr: CSRGraph, values: np.ndarray, name: str) -> pd.Series:
+    """Per directed edge values indexed by ``(u, v, key)``."""
+    index = pd.MultiIndex.from_arrays(
+        [csr.nodes[csr.edge_u], csr.nodes[csr.edge_v], csr.edge_key],
+        names=["u", "v", "key"],
+    )
+    return pd.Series(values, index=index, name=name)
+
+
+def join_edge_values(edges_gdf: gpd.GeoDataFrame, series: pd.Series) -> gpd.GeoDataFrame:
+    """Attach ``series`` (indexed by ``(u, v, key)``) as a column in one reindex."""
+    index = _edge_index(edges_gdf)
+    if index is None:
+        return edges_gdf
+    edges_gdf = edges_gdf.copy(deep=False)
+    edges_gdf[series.name] = series.reindex(index).fillna(0.0).to_numpy()
+    return edges_gdf
+
+
+def _sampling_bound(
+    total: np.ndarray, total_sq: np.ndarray, k: int, n: int, z: float
+) -> float:
+    """Largest confidence half-width over all pairs of the normalised mean."""
+    if k >= n:
+        return 0.0
+    if k < 2 or n < 2:
+        return math.inf
+    # Contribution normalisée d'une source : dépendance / (n - 1), dans [0, 1]
+    mean = total / (k * (n - 1))
+    var = (total_sq / (n - 1) ** 2 - k * mean**2) / (k - 1)
+    fpc = math.sqrt((n - k) / (n - 1))
+    return float(z * math.sqrt(max(float(var.max(initial=0.0)), 0.0) / k) * fpc)
+
+
+def edge_betweenness(
+    csr: CSRGraph,
+    k: Optional[int] = None,
+    seed: int = 42,
+    workers: Optional[int] = None,
+    epsilon: Optional[float] = None,
+    confidence: float = 0.95,
+    time_budget: Optional[float] = None,
+    batch_size: Optional[int] = None,
+) -> Tuple[np.ndarray, Dict[str, float]]:
+    """Normalised, length-weighted edge betweenness of every directed edge.
+
+    With a fixed ``k`` the sources are sampled once (all of them when ``None``
+    or ``k >= n``). Passing ``epsilon`` and/or ``time_budget`` (seconds)
+    switches to adaptive sampling: pivot batches are added until the
+    ``confidence`` half-width of every edge estimate is below ``epsilon``, the
+    time budget runs out or every node has been used. Sources are split across
+    ``workers`` processes. Parallel edges follow networkx: a pair value goes to
+    the shortest parallel edge(s), split evenly between ties, and both
+    directions of a street carry the same value.
+
+    Returns the values and ``{"samples", "error_bound", "confidence"}``.
+    """
+    n = csr.n_nodes
+    z = float(norm.ppf(0.5 + confidence / 2.0))
+    total = np.zeros(csr.n_pairs)
+    total_sq = np.zeros(csr.n_pairs)
+    adaptive = epsilon is not None or time_budget is not None
+    used = 0
+    bound = math.inf
+    with SourceExecutor(csr, workers=workers) as executor:
+        if not adaptive:
+            if k is None or k >= n:
+                batches = [np.arange(n, dtype=np.int64)]
+            else:
+                batches = [np.sort(np.asarray(random.Random(seed).sample(range(n), k), dtype=np.int64))]
+        else:
+            order = np.asarray(random.Random(seed).sample(range(n), n), dtype=np.int64)
+            size = batch_size or max(32, 8 * executor.workers)
+            batches = (order[i : i + size] for i in range(0, n, size))
+        start = time.monotonic()
+        for batch in batches:
+            if batch.size == 0:
                 continue
-            ratio = euclidean / network_dist
-            if math.isfinite(ratio):
-                total += ratio
-                count += 1
-        straightness[source] = total / count if count else 0.0
-    return straightness
+            part, part_sq = executor.reduce(_edge_betweenness_kernel, batch)
+            total += part
+            total_sq += part_sq
+            used += int(batch.size)
+            bound = _sampling_bound(total, total_sq, used, n, z)
+            if adaptive and (
+                (epsilon is not None and bound <= epsilon)
+                or (time_budget is not None and time.monotonic() - start >= time_budget)
+            ):
+                break
+
+    # Même normalisation que networkx (graphe non orienté, normalisé)
+    pairs = total / (used * (n - 1)) if used and n > 1 else total
+
+    cost = np.where(np.isnan(csr.edge_length), 1.0, csr.edge_length)
+    shortest = cost == csr.pair_length[csr.edge_pair]
+    keys = pd.DataFrame(
+        {"pair": csr.edge_pair[shortest], "key": csr.edge_key[shortest]}
+    ).drop_duplicates()
+    ties = np.bincount(keys["pair"].to_numpy(dtype=np.int64), minlength=csr.n_pairs)
+    values = np.zeros(csr.n_edges)
+    values[shortest] = pairs[csr.edge_pair[shortest]] / ties[csr.edge_pair[shortest]]
+    info = {
+        "samples": used,
+        "error_bound": bound if math.isfinite(bound) else None,
+        "confidence": confidence,
+    }
+    return values, info
+
+
+def add_edge_betweenness(
+    G: nx.MultiDiGraph,
+    edges_gdf: gpd.GeoDataFrame,
+    csr: Optional[CSRGraph] = None,
+    k: Optional[int] = None,
+    workers: Optional[int] = None,
+    epsilon: Optional[float] = None,
+    confidence: float = 0.95,
+    time_budget: Optional[float] = None,
+) -> gpd.GeoDataFrame:
+    """Add an edge ``betweenness`` column joined on ``(u, v, key)``.
+
+    Without ``epsilon``/``time_budget`` a fixed number of pivots is used (see
+    :func:`edge_betweenness`). The sample size and the error bound reached
+    are stored in ``attrs["betweenness_sampling"]`` of the returned frame.
+    """
+    csr = _ensure_csr(G, csr)
+    n = csr.n_nodes
+    if k is None and epsilon is None and time_budget is None:
+        k = min(300, max(30, n//15))
+    values, info = edge_betweenness(
+        csr,
+        k=k,
+        workers=workers,
+        epsilon=epsilon,
+        confidence=confidence,
+        time_budget=time_budget,
+    )
+    edges_gdf = join_edge_values(edges_gdf, edge_series(csr, values, "betweenness"))
+    edges_gdf.attrs["betweenness_sampling"] = info
+    return edges_gdf
+
+def _straightness_kernel(
+    csr: CSRGraph,
+    sources: np.ndarray,
+    cutoff: Optional[float] = None,
+    chunk_size: int = 32,
+) -> np.ndarray:
+    """Mean Euclidean/network distance ratio from each source.
+
+    Sources are searched ``chunk_size`` at a time and each block of distance
+    rows is reduced with array operations and discarded, so memory stays at
+    ``chunk_size × n`` instead of the full distance matrix. With ``cutoff``
+    the searches stop at that network distance (local straightness).
+    """
+    values = np.zeros(sources.size)
+    has_xy = csr.has_coordinates
+    pos = 0
+    for block, dist in csr.distance_rows(sources, limit=cutoff, chunk_size=chunk_size):
+        rows, cols = np.nonzero(np.isfinite(dist) & (dist > 0))
+        src = block[rows]
+        keep = has_xy[src] & has_xy[cols]
+        rows, cols, src = rows[keep], cols[keep], src[keep]
+        euclidean = np.hypot(csr.x[src] - csr.x[cols], csr.y[src] - csr.y[cols])
+        ratio = euclidean / dist[rows, cols]
+        valid = (euclidean > 0) & np.isfinite(ratio)
+        total = np.bincount(rows[valid], weights=ratio[valid], minlength=block.size)
+        count = np.bincount(rows[valid], minlength=block.size)
+        values[pos : pos + block.size] = np.divide(
+            total, count, out=np.zeros(block.size), where=count > 0
+        )
+        pos += block.size
+    return values
+
+
+def _closeness_kernel(csr: CSRGraph, sources: np.ndarray) -> np.ndarray:
+    """Hop-count closeness with the Wasserman–Faust correction (as networkx)."""
+    n = csr.n_nodes
+    out = []
+    for _, dist in csr.distance_rows(sources, unweighted=True):
+        finite = np.isfinite(dist)
+        reached = finite.sum(axis=1) - 1
+        totsp = np.where(finite, dist, 0.0).sum(axis=1)
+        ok = (totsp > 0) & (n > 1)
+        values = np.zeros(dist.shape[0])
+        values[ok] = (reached[ok] / totsp[ok]) * (reached[ok] / (n - 1))
+        out.append(values)
+    return np.concatenate(out) if out else np.zeros(0)
 
 
 def node_centralities(
@@ -90,55 +382,289 @@ def node_centralities(
     degree: bool = True,
     straightness: bool = False,
     eigenvector: bool = False,
+    csr: Optional[CSRGraph] = None,
+    workers: Optional[int] = None,
+    straightness_radius: Optional[float] = None,
+    reach: bool = False,
+    gravity: bool = False,
+    local_closeness: bool = False,
+    access_radius: float = DEFAULT_RADIUS,
+    gravity_beta: float = DEFAULT_BETA,
+    pagerank: bool = False,
+    katz: bool = False,
+    spectral_weight: spectral.Weight = spectral.DEFAULT_WEIGHT,
+    pagerank_damping: float = spectral.DEFAULT_DAMPING,
+    katz_alpha: float = spectral.DEFAULT_KATZ_ALPHA,
+    warm_key: Optional[Hashable] = None,
 ) -> pd.DataFrame:
-    Gu = G.to_undirected()
-    out = pd.DataFrame({"node": list(Gu.nodes())})
-    out.set_index("node", inplace=True)
-    if degree:
-        out["degree"] = pd.Series(dict(Gu.degree()))
-    if closeness:
-        out["closeness"] = pd.Series(nx.closeness_centrality(Gu, wf_improved=True))
-    if straightness:
-        try:
-            out["straightness"] = pd.Series(_straightness_centrality(Gu))
-        except Exception:
-            out["straightness"] = 0.0
-    if eigenvector:
-        try:
-            out["eigenvector"] = pd.Series(
-                nx.eigenvector_centrality_numpy(Gu, weight="length")
-            )
-        except Exception:
-            out["eigenvector"] = 0.0
-    return out.reset_index()
-
-def attach_node_metrics_to_edges(edges_gdf: gpd.GeoDataFrame, nodes_df: pd.DataFrame) -> gpd.GeoDataFrame:
-    g = edges_gdf.copy()
-    if not {"u","v"}.issubset(g.columns):
-        return g
-    for col in [c for c in ["degree", "closeness", "straightness", "eigenvector"] if c in nodes_df.columns]:
-        g = g.merge(nodes_df[["node", col]].rename(columns={"node":"u", col: f"{col}_u"}), on="u", how="left")
-        g = g.merge(nodes_df[["node", col]].rename(columns={"node":"v", col: f"{col}_v"}), on="v", how="left")
-        g[col] = g[[f"{col}_u", f"{col}_v"]].mean(axis=1)
-        g.drop(columns=[f"{col}_u", f"{col}_v"], inplace=True, errors="ignore")
-    return g
-
-def aggregate_h3(edges_gdf: gpd.GeoDataFrame, res: int = 7) -> gpd.GeoDataFrame:
+    """Node-level indicators, one row per node.
+
+    Closeness and straightness run one search per node; ``workers`` spreads
+    them over a process pool (``None`` reads ``GRAFOS_WORKERS``).
+    ``straightness_radius`` (metres of network distance) restricts
+    straightness to targets within that radius. ``reach``, ``gravity`` and
+    ``local_closeness`` only search within ``access_radius`` metres (see
+    :mod:`grafos.accessibility`).
+
+    ``eigenvector``, ``pagerank`` and ``katz`` use the sparse solvers of
+    :mod:`grafos.spectral` on ``spectral_weight`` (inverse length by
+    default); ``warm_key`` identifies the graph so that later calls start
+    from the previous vectors. Their convergence diagnostics are returned
+    in ``out.attrs["spectral"]``.
+    """
+    csr = _ensure_csr(G, csr)
+    out = pd.DataFrame({"node": csr.nodes})
+    with SourceExecutor(csr, workers=workers) as executor:
+        if degree:
+            out["degree"] = csr.degree
+        if closeness:
+            out["closeness"] = executor.map(_closeness_kernel)
+        if straightness:
+            try:
+                out["straightness"] = executor.map(_straightness_kernel, cutoff=straightness_radius)
+            except Exception:
+                out["straightness"] = 0.0
+    solvers = {
+        "eigenvector": (eigenvector, spectral.eigenvector, {}),
+        "pagerank": (pagerank, spectral.pagerank, {"damping": pagerank_damping}),
+        "katz": (katz, spectral.katz, {"alpha": katz_alpha}),
+    }
+    diagnostics = {}
+    for column, (flag, solve, params) in solvers.items():
+        if flag:
+            found = solve(csr, weight=spectral_weight, warm_key=warm_key, **params)
+            out[column] = found.values
+            diagnostics[column] = found.diagnostics()
+    if diagnostics:
+        out.attrs["spectral"] = diagnostics
+    wanted = [c for c, flag in zip(ACCESS_COLUMNS, (reach, gravity, local_closeness)) if flag]
+    if wanted:
+        access = local_accessibility(csr, radius=access_radius, beta=gravity_beta, workers=workers)
+        for column in wanted:
+            out[column] = access[column].to_numpy()
+    return out
+
+NODE_METRIC_COLUMNS = ("degree", "closeness", "straightness", *SPECTRAL_COLUMNS, *ACCESS_COLUMNS)
+ENDPOINT_AGGREGATIONS = ("mean", "min", "max", "length_weighted")
+
+
+def _endpoints(edges_gdf: gpd.GeoDataFrame) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """``u`` and ``v`` of every row, from columns or from the edge index."""
+    if {"u", "v"}.issubset(edges_gdf.columns):
+        return edges_gdf["u"].to_numpy(), edges_gdf["v"].to_numpy()
+    index = edges_gdf.index
+    if isinstance(index, pd.MultiIndex) and index.nlevels >= 2:
+        return index.get_level_values(0).to_numpy(), index.get_level_values(1).to_numpy()
+    return None
+
+
+def attach_node_metrics_to_edges(
+    edges_gdf: gpd.GeoDataFrame,
+    nodes_df: pd.DataFrame,
+    how: str = "mean",
+    columns: Optional[Sequence[str]] = None,
+    inplace: bool = False,
+) -> gpd.GeoDataFrame:
+    """Give every edge an aggregate of the metrics of its two end nodes.
+
+    ``nodes_df`` holds one row per node (ids in a ``node`` column, or in the
+    index). The ids of ``u`` and ``v`` are resolved once to row positions and
+    every metric column is then gathered from a single array, so the cost
+    barely grows with the number of metrics and nothing is merged or copied.
+    ``how`` combines the two endpoints: ``mean``, ``min``, ``max`` or
+    ``length_weighted`` (each endpoint weighted by the street length incident
+    to it). Missing nodes are ignored; an edge with none gets NaN.
+    Without ``inplace`` a shallow copy is returned (geometries are shared).
+    """
+    if how not in ENDPOINT_AGGREGATIONS:
+        raise ValueError(f"how must be one of {ENDPOINT_AGGREGATIONS}, not {how!r}")
+    if not inplace:
+        edges_gdf = edges_gdf.copy(deep=False)
+    endpoints = _endpoints(edges_gdf)
+    if columns is None:
+        columns = [c for c in NODE_METRIC_COLUMNS if c in nodes_df.columns]
+    if endpoints is None or not columns:
+        return edges_gdf
+
+    node_ids = pd.Index(nodes_df["node"] if "node" in nodes_df.columns else nodes_df.index)
+    # Une ligne NaN en fin de tableau : la position -1 des nœuds absents y tombe
+    values = np.vstack([
+        nodes_df[list(columns)].to_numpy(dtype=float),
+        np.full((1, len(columns)), np.nan),
+    ])
+    u, v = endpoints
+    at_u = values[node_ids.get_indexer(u)]
+    at_v = values[node_ids.get_indexer(v)]
+
+    if how == "min":
+        combined = np.fmin(at_u, at_v)
+    elif how == "max":
+        combined = np.fmax(at_u, at_v)
+    else:
+        if how == "length_weighted" and "length" in edges_gdf.columns:
+            length = pd.to_numeric(edges_gdf["length"], errors="coerce").fillna(0).to_numpy(dtype=float)
+            codes, uniques = pd.factorize(np.concatenate([u, v]))
+            incident = np.bincount(codes, weights=np.tile(length, 2), minlength=len(uniques))
+            w_u, w_v = incident[codes[: len(u)]], incident[codes[len(u):]]
+        else:
+            w_u = w_v = np.ones(len(u))
+        known_u, known_v = ~np.isnan(at_u), ~np.isnan(at_v)
+        w_u = np.where(known_u, w_u[:, None], 0.0)
+        w_v = np.where(known_v, w_v[:, None], 0.0)
+        # Extrémités sans longueur incidente : poids égaux
+        flat = (w_u + w_v) == 0
+        w_u = np.where(flat & known_u, 1.0, w_u)
+        w_v = np.where(flat & known_v, 1.0, w_v)
+        weight = w_u + w_v
+        total = np.where(known_u, at_u, 0.0) * w_u + np.where(known_v, at_v, 0.0) * w_v
+        combined = np.divide(total, weight, out=np.full(total.shape, np.nan), where=weight > 0)
+
+    for i, col in enumerate(columns):
+        edges_gdf[col] = combined[:, i]
+    return edges_gdf
+
+
+H3_METRIC_COLUMNS = (
+    "betweenness", "closeness", "degree", "straightness", *SPECTRAL_COLUMNS, *ACCESS_COLUMNS
+)
+
+
+@functools.lru_cache(maxsize=65536)
+def _cell_polygon(cell: str) -> Polygon:
+    """Boundary of an H3 cell (lon/lat), built once per cell."""
+    return Polygon(h3.h3_to_geo_boundary(cell, geo_json=True))
+
+
+def _cell_polygons(cells: Sequence[str]) -> np.ndarray:
+    """Boundaries of many H3 cells (lon/lat), built in one vectorised call."""
+    rings = [h3.h3_to_geo_boundary(c, geo_json=True) for c in cells]
+    sizes = np.fromiter(map(len, rings), dtype=np.int64, count=len(rings))
+    coords = np.fromiter(
+        itertools.chain.from_iterable(itertools.chain.from_iterable(rings)),
+        dtype=float,
+        count=2 * int(sizes.sum()),
+    ).reshape(-1, 2)
+    return shapely.polygons(shapely.linearrings(coords, indices=np.repeat(np.arange(len(rings)), sizes)))
+
+
+# Insertion order gives the eviction order; lookups are lock-free dict reads
+_PROJECTED_CELLS: Dict[Tuple[str, str], Polygon] = {}
+_PROJECTED_CELLS_MAX = 65536
+_PROJECTED_CELLS_LOCK = threading.Lock()
+
+
+def _projected_cell_polygons(cells: Sequence[str], crs: str) -> np.ndarray:
+    """:func:`_cell_polygon` of ``cells`` in ``crs``, cached per (cell, CRS).
+
+    Cells not cached yet are projected together with a single transform. A
+    batch larger than the cache is projected without being stored, so it
+    does not flush the cells other calls keep reusing.
+    """
+    polygons = np.empty(len(cells), dtype=object)
+    polygons[:] = [_PROJECTED_CELLS.get((c, crs)) for c in cells]
+    missing = np.flatnonzero(shapely.is_missing(polygons))
+    if missing.size == 0:
+        return polygons
+    projected = projection.transform_geometries(
+        _cell_polygons([cells[i] for i in missing]), 4326, crs
+    )
+    polygons[missing] = projected
+    if missing.size <= _PROJECTED_CELLS_MAX:
+        entries = {(cells[i], crs): polygon for i, polygon in zip(missing.tolist(), projected)}
+        with _PROJECTED_CELLS_LOCK:
+            _PROJECTED_CELLS.update(entries)
+            excess = len(_PROJECTED_CELLS) - _PROJECTED_CELLS_MAX
+            for key in list(itertools.islice(_PROJECTED_CELLS, max(0, excess))):
+                del _PROJECTED_CELLS[key]
+    return polygons
+
+
+def _candidate_cells(geoms: np.ndarray, crs: str, res: int) -> list:
+    """H3 cells that may intersect the line ``geoms`` (in the metric ``crs``).
+
+    The lines are sampled every half cell edge; every point of a line is then
+    close enough to a sample that the cell containing it is the sample's cell
+    or one of its neighbours. The cost follows the network length, not the
+    area it spans.
+    """
+    dense = shapely.segmentize(geoms, h3.edge_length(res, unit="m") / 2)
+    lon, lat = shapely.get_coordinates(projection.transform_geometries(dense, crs, 4326)).T
+    sampled = pd.unique(
+        np.fromiter((h3.geo_to_h3(y, x, res) for y, x in zip(lat, lon)), dtype=object, count=lat.size)
+    )
+    cells = set()
+    for cell in sampled:
+        cells.update(h3.k_ring(cell, 1))
+    return sorted(cells)
+
+
+def aggregate_h3(
+    edges_gdf: gpd.GeoDataFrame,
+    res: int = 7,
+    columns: Optional[Sequence[str]] = None,
+) -> gpd.GeoDataFrame:
+    """Network length and metric summaries per H3 cell.
+
+    Each edge is intersected with the cell polygons it crosses (found through
+    an STRtree, in a metric CRS) and every cell is credited with the length
+    that lies inside it (rescaled so that the parts add up to the edge
+    ``length``). For every metric column (by default those of
+    :data:`H3_METRIC_COLUMNS` present) the cell gets the length-weighted mean
+    (``<col>_mean``) and the maximum (``<col>_max``) of the edges crossing it.
+    """
+    if columns is None:
+        columns = [c for c in H3_METRIC_COLUMNS if c in edges_gdf.columns]
+    stats = [f"{c}_{s}" for c in columns for s in ("mean", "max")]
     if edges_gdf.empty:
         return gpd.GeoDataFrame(
-            columns=["h3", "length_km", "geometry"], geometry="geometry", crs="EPSG:4326"
+            columns=["h3", "length_m", "length_km", *stats, "geometry"],
+            geometry="geometry",
+            crs="EPSG:4326",
         )
 
-    g_lonlat = edges_gdf.to_crs(4326)
-    g_proj = edges_gdf.to_crs(3857)
-    centers_proj = g_proj.geometry.interpolate(0.5, normalized=True)
-    centers = gpd.GeoSeries(centers_proj, crs=g_proj.crs).to_crs(4326)
-
-    hexes = [h3.geo_to_h3(lat, lon, res) for lat, lon in zip(centers.y, centers.x)]
-    lengths = g_lonlat.get("length", 0).fillna(0).values
-    df = pd.DataFrame({"h3": hexes, "length_m": lengths})
-    agg = df.groupby("h3", as_index=False)["length_m"].sum()
-    polys = [Polygon(h3.h3_to_geo_boundary(h, geo_json=True)) for h in agg["h3"]]
-    out = gpd.GeoDataFrame(agg, geometry=polys, crs="EPSG:4326")
+    # Calculs de longueur dans un CRS métrique (celui du graphe préparé s'il l'est)
+    metric_crs = edges_gdf.crs if edges_gdf.crs is not None and edges_gdf.crs.is_projected else (
+        edges_gdf.estimate_utm_crs()
+    )
+    geoms = np.asarray(edges_gdf.geometry)
+    if metric_crs != edges_gdf.crs:
+        geoms = projection.transform_geometries(geoms, edges_gdf.crs, metric_crs)
+
+    # Cellules candidates autour du réseau, polygones projetés gardés en cache
+    crs = metric_crs.to_string()
+    candidates = _candidate_cells(geoms, crs, res)
+    polygons = _projected_cell_polygons(candidates, crs)
+    edge, cell = STRtree(polygons).query(geoms, predicate="intersects")
+    # Un tronçon entièrement dans la cellule n'a pas besoin d'être découpé
+    inside = shapely.length(geoms)[edge]
+    shapely.prepare(polygons)
+    crossing = np.flatnonzero(~shapely.contains_properly(polygons[cell], geoms[edge]))
+    inside[crossing] = shapely.length(shapely.intersection(geoms[edge[crossing]], polygons[cell[crossing]]))
+    # Seules les cellules réellement traversées sont gardées
+    used, cell = np.unique(cell, return_inverse=True)
+    cells = np.asarray(candidates, dtype=object)[used]
+
+    n = len(edges_gdf)
+    total = np.bincount(edge, weights=inside, minlength=n)
+    if "length" in edges_gdf.columns:
+        lengths = pd.to_numeric(edges_gdf["length"], errors="coerce").fillna(0).to_numpy(dtype=float)
+    else:
+        lengths = shapely.length(geoms)
+    scale = np.divide(lengths, total, out=np.zeros(n), where=total > 0)
+    share = inside * scale[edge]
+
+    out = pd.DataFrame({"h3": cells, "length_m": np.bincount(cell, weights=share, minlength=len(cells))})
+    for col in columns:
+        values = pd.to_numeric(edges_gdf[col], errors="coerce").to_numpy(dtype=float)[edge]
+        valid = np.isfinite(values)
+        weight = np.bincount(cell[valid], weights=share[valid], minlength=len(cells))
+        weighted = np.bincount(cell[valid], weights=(share * values)[valid], minlength=len(cells))
+        out[f"{col}_mean"] = np.divide(weighted, weight, out=np.full(len(cells), np.nan), where=weight > 0)
+        peak = np.full(len(cells), -np.inf)
+        np.maximum.at(peak, cell[valid], values[valid])
+        out[f"{col}_max"] = np.where(np.isfinite(peak), peak, np.nan)
+
+    out = out[out["length_m"] > 0].reset_index(drop=True)
     out["length_km"] = out["length_m"] / 1000.0
-    return out
+    out = out[["h3", "length_m", "length_km", *stats]]
+    return gpd.GeoDataFrame(out, geometry=_cell_polygons(out["h3"].tolist()), crs="EPSG:4326")
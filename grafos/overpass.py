@@ -0,0 +1,346 @@
+"""Hedged Overpass requests across several endpoints.
+
+Trying mirrors one after another means a single slow endpoint can block for
+``OVERPASS_TIMEOUT`` before the next one is even contacted. :class:`HedgedFetcher`
+starts the best-ranked endpoint, launches the next one whenever there is no
+answer after ``hedge_delay`` seconds (or as soon as an attempt fails), returns
+the first successful response and aborts the others.
+
+:class:`EndpointHealth` keeps a moving average of the latency and the recent
+failures of every endpoint so that the fastest healthy mirrors are tried
+first on later requests.
+
+An endpoint answering 429 or 504 is not counted as failing: it is paused
+for its ``Retry-After`` (or ``rate_limit_pause`` seconds), other requests rank
+it last meanwhile, and the query is sent to it again once the pause is over.
+
+osmnx builds the street graph itself; only its HTTP call
+(``osmnx._overpass._overpass_request``) is routed through the fetcher that
+:func:`use_fetcher` sets for the current context. The hook is installed on
+the first :func:`use_fetcher`, not at import, and outside such a context
+osmnx's own request (with its rate-limit pauses) runs unchanged.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import contextvars
+import email.utils
+import json
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+import requests
+from osmnx import _downloader, _overpass
+from osmnx import settings as ox_settings
+
+
+__all__ = [
+    "EndpointHealth",
+    "HedgedFetcher",
+    "OverpassFetchError",
+    "default_health",
+    "use_fetcher",
+]
+
+
+@dataclass
+class OverpassFetchError(RuntimeError):
+    """Every endpoint failed (or timed out) for one Overpass query."""
+
+    endpoints: tuple[str, ...]
+    errors: tuple[str, ...]
+
+    def __str__(self) -> str:  # pragma: no cover - trivial formatting
+        return "; ".join(self.errors) or "no Overpass endpoint answered"
+
+
+@dataclass
+class _EndpointStats:
+    latency: Optional[float] = None
+    successes: int = 0
+    failures: int = 0
+    consecutive_failures: int = 0
+    last_failure: float = 0.0
+    paused_until: float = 0.0
+
+
+@dataclass
+class EndpointHealth:
+    """Latency and failure history per endpoint.
+
+    ``alpha`` weights the newest latency in the moving average; an endpoint
+    that failed within ``cooldown`` seconds ranks after the healthy ones.
+    """
+
+    alpha: float = 0.3
+    cooldown: float = 300.0
+    _stats: Dict[str, _EndpointStats] = field(default_factory=dict)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def _observe(self, stats: _EndpointStats, latency: float) -> None:
+        stats.latency = latency if stats.latency is None else (
+            self.alpha * latency + (1 - self.alpha) * stats.latency
+        )
+
+    def record_success(self, endpoint: str, latency: float) -> None:
+        with self._lock:
+            stats = self._stats.setdefault(endpoint, _EndpointStats())
+            self._observe(stats, latency)
+            stats.successes += 1
+            stats.consecutive_failures = 0
+
+    def record_abandoned(self, endpoint: str, elapsed: float) -> None:
+        """An attempt that lost the race: ``elapsed`` is a latency lower bound."""
+        with self._lock:
+            self._observe(self._stats.setdefault(endpoint, _EndpointStats()), elapsed)
+
+    def record_failure(self, endpoint: str) -> None:
+        with self._lock:
+            stats = self._stats.setdefault(endpoint, _EndpointStats())
+            stats.failures += 1
+            stats.consecutive_failures += 1
+            stats.last_failure = time.monotonic()
+
+    def record_rate_limited(self, endpoint: str, pause: float) -> None:
+        """The endpoint asked (429/504) not to be queried for ``pause`` seconds."""
+        with self._lock:
+            stats = self._stats.setdefault(endpoint, _EndpointStats())
+            stats.paused_until = max(stats.paused_until, time.monotonic() + pause)
+
+    def pause_remaining(self, endpoint: str) -> float:
+        """Seconds before ``endpoint`` may be queried again (``0`` if now)."""
+        with self._lock:
+            stats = self._stats.get(endpoint)
+            return max(0.0, stats.paused_until - time.monotonic()) if stats is not None else 0.0
+
+    def rank(self, endpoints: Sequence[str]) -> List[str]:
+        """Healthy endpoints by latency, then unknown ones, then failing ones.
+
+        Endpoints paused after a 429/504 come last. Ties keep the configured
+        order.
+        """
+        now = time.monotonic()
+        with self._lock:
+            def key(item):
+                position, endpoint = item
+                stats = self._stats.get(endpoint)
+                if stats is None:
+                    return (0, 0, float("inf"), position)
+                paused = stats.paused_until > now
+                failing = stats.consecutive_failures > 0 and now - stats.last_failure < self.cooldown
+                latency = stats.latency if stats.latency is not None else float("inf")
+                return (int(paused), int(failing) * (1 + stats.consecutive_failures), latency, position)
+
+            ordered = sorted(enumerate(dict.fromkeys(endpoints)), key=key)
+        return [endpoint for _, endpoint in ordered]
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {
+                endpoint: {
+                    "latency_s": stats.latency,
+                    "successes": stats.successes,
+                    "failures": stats.failures,
+                    "consecutive_failures": stats.consecutive_failures,
+                }
+                for endpoint, stats in self._stats.items()
+            }
+
+
+_HEALTH = EndpointHealth()
+
+
+def default_health() -> EndpointHealth:
+    """Process-wide endpoint history shared by every request."""
+    return _HEALTH
+
+
+class _Cancelled(Exception):
+    pass
+
+
+class _RateLimited(RuntimeError):
+    """HTTP 429/504: the endpoint is paused, the query may be retried there."""
+
+
+def _retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds of a ``Retry-After`` header (delay or HTTP date)."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+class HedgedFetcher:
+    """Race Overpass ``endpoints`` (full interpreter URLs) for each query.
+
+    An endpoint that answers 429/504 is queried again after its pause, at most
+    ``rate_limit_retries`` times per query; pauses are capped at ``timeout``.
+    """
+
+    def __init__(
+        self,
+        endpoints: Sequence[str],
+        hedge_delay: float = 8.0,
+        timeout: Optional[float] = None,
+        health: Optional[EndpointHealth] = None,
+        use_cache: Optional[bool] = None,
+        rate_limit_pause: float = 10.0,
+        rate_limit_retries: int = 1,
+    ) -> None:
+        self.endpoints = [e for e in dict.fromkeys(endpoints) if e]
+        self.hedge_delay = max(0.0, float(hedge_delay))
+        self.rate_limit_pause = max(0.0, float(rate_limit_pause))
+        self.rate_limit_retries = max(0, int(rate_limit_retries))
+        self.timeout = float(timeout if timeout is not None else ox_settings.timeout)
+        self.health = health if health is not None else _HEALTH
+        self.use_cache = ox_settings.use_cache if use_cache is None else use_cache
+        self.attempted: List[str] = []
+
+    # -- single attempt --------------------------------------------------
+    def _attempt(self, endpoint: str, data: Dict[str, Any], cancel: threading.Event) -> Dict[str, Any]:
+        start = time.monotonic()
+        try:
+            with requests.post(
+                endpoint,
+                data=data,
+                timeout=self.timeout,
+                headers=_downloader._get_http_headers(),
+                stream=True,
+                **(ox_settings.requests_kwargs or {}),
+            ) as response:
+                if response.status_code in (429, 504):
+                    # Surcharge signalée : pause demandée, pas une panne
+                    pause = _retry_after(response.headers.get("Retry-After"))
+                    pause = min(self.rate_limit_pause if pause is None else pause, self.timeout)
+                    self.health.record_rate_limited(endpoint, pause)
+                    raise _RateLimited(f"HTTP {response.status_code} {response.reason}, pause {pause:.0f} s")
+                if response.status_code != 200:
+                    raise RuntimeError(f"HTTP {response.status_code} {response.reason}")
+                body = bytearray()
+                for chunk in response.iter_content(chunk_size=64 * 1024):
+                    if cancel.is_set():
+                        raise _Cancelled()
+                    body.extend(chunk)
+            payload = json.loads(body)
+        except (_Cancelled, _RateLimited):
+            raise
+        except Exception:
+            if not cancel.is_set():
+                self.health.record_failure(endpoint)
+            raise
+        self.health.record_success(endpoint, time.monotonic() - start)
+        return payload
+
+    def _cache_url(self, endpoint: str, data: Dict[str, Any]) -> str:
+        return requests.Request("GET", endpoint, params=data).prepare().url
+
+    # -- public ----------------------------------------------------------
+    def fetch(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Return the first successful JSON response for the query ``data``."""
+
+        order = self.health.rank(self.endpoints)
+        if self.use_cache:
+            for endpoint in order:
+                cached = _downloader._retrieve_from_cache(self._cache_url(endpoint, data))
+                if cached is not None:
+                    return cached
+
+        cancel = threading.Event()
+        errors: List[str] = []
+        pool = ThreadPoolExecutor(max_workers=max(1, len(order)), thread_name_prefix="overpass")
+        running: Dict[Future, str] = {}
+        pending = list(order)
+        retries: Dict[str, int] = {}
+        try:
+            while pending or running:
+                # Les endpoints en pause (429/504) attendent la fin de celle-ci
+                ready = [e for e in pending if self.health.pause_remaining(e) <= 0]
+                if ready and (not running or self._should_hedge(running)):
+                    endpoint = ready[0]
+                    pending.remove(endpoint)
+                    self.attempted.append(endpoint)
+                    future = pool.submit(self._attempt, endpoint, data, cancel)
+                    future.started_at = time.monotonic()  # type: ignore[attr-defined]
+                    running[future] = endpoint
+                    continue
+                waits = [self.health.pause_remaining(e) for e in pending if e not in ready]
+                if ready:
+                    waits.append(self._time_to_next_hedge(running))
+                timeout = max(0.0, min(waits)) if waits else None
+                if not running:
+                    time.sleep(timeout)
+                    continue
+                done, _ = wait(list(running), timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    endpoint = running.pop(future)
+                    try:
+                        payload = future.result()
+                    except _RateLimited as exc:
+                        errors.append(f"{endpoint}: {exc}")
+                        if retries.get(endpoint, 0) < self.rate_limit_retries:
+                            retries[endpoint] = retries.get(endpoint, 0) + 1
+                            pending.append(endpoint)
+                        continue
+                    except Exception as exc:  # network errors vary
+                        errors.append(f"{endpoint}: {exc}")
+                        continue
+                    if self.use_cache:
+                        _downloader._save_to_cache(self._cache_url(endpoint, data), payload, 200)
+                    return payload
+        finally:
+            cancel.set()
+            now = time.monotonic()
+            for future, endpoint in running.items():
+                self.health.record_abandoned(endpoint, now - future.started_at)  # type: ignore[attr-defined]
+            pool.shutdown(wait=False, cancel_futures=True)
+        raise OverpassFetchError(endpoints=tuple(self.attempted), errors=tuple(errors))
+
+    def _should_hedge(self, running: Dict[Future, str]) -> bool:
+        return self._time_to_next_hedge(running) <= 0
+
+    def _time_to_next_hedge(self, running: Dict[Future, str]) -> float:
+        latest = max(f.started_at for f in running)  # type: ignore[attr-defined]
+        return latest + self.hedge_delay - time.monotonic()
+
+
+_CURRENT: contextvars.ContextVar[Optional[HedgedFetcher]] = contextvars.ContextVar(
+    "overpass_fetcher", default=None
+)
+_ORIGINAL_REQUEST = _overpass._overpass_request
+_INSTALL_LOCK = threading.Lock()
+
+
+def _routed_overpass_request(data, pause=None, error_pause=60):
+    fetcher = _CURRENT.get()
+    if fetcher is None:
+        return _ORIGINAL_REQUEST(data, pause=pause, error_pause=error_pause)
+    return fetcher.fetch(data)
+
+
+def _install() -> None:
+    with _INSTALL_LOCK:
+        if _overpass._overpass_request is not _routed_overpass_request:
+            _overpass._overpass_request = _routed_overpass_request
+
+
+@contextlib.contextmanager
+def use_fetcher(fetcher: HedgedFetcher) -> Iterator[HedgedFetcher]:
+    """Send the Overpass queries osmnx makes in this context through ``fetcher``."""
+    _install()
+    token = _CURRENT.set(fetcher)
+    try:
+        yield fetcher
+    finally:
+        _CURRENT.reset(token)
@@ -0,0 +1,143 @@
+"""Process-pool execution of per-source graph searches.
+
+Closeness, straightness and betweenness all run one shortest-path search per
+source node and only combine the results at the end. :class:`SourceExecutor`
+splits the sources into chunks, runs a *kernel* on each chunk in worker
+processes that hold one read-only copy of the :class:`~grafos.csr.CSRGraph`
+(inherited copy-on-write under ``fork``, pickled once per worker otherwise)
+and merges the partial results.
+
+A kernel is a module-level function ``kernel(csr, sources, **kwargs)``. For
+:meth:`SourceExecutor.map` it returns one value per source, in order; for
+:meth:`SourceExecutor.reduce` it returns an accumulator array (or a tuple of
+arrays) that is summed across chunks.
+"""
+
+from __future__ import annotations
+
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Optional, Sequence
+
+import numpy as np
+
+from .csr import CSRGraph
+
+
+__all__ = ["SourceExecutor", "default_workers"]
+
+
+_SHARED: Optional[CSRGraph] = None
+
+
+def _init_worker(csr: CSRGraph) -> None:
+    global _SHARED
+    _SHARED = csr
+
+
+def _run_chunk(kernel: Callable, sources: np.ndarray, kwargs: dict) -> Any:
+    return kernel(_SHARED, sources, **kwargs)
+
+
+def default_workers() -> int:
+    """Worker count from ``GRAFOS_WORKERS`` (``0`` means one per CPU)."""
+    try:
+        workers = int(os.environ.get("GRAFOS_WORKERS", 1))
+    except ValueError:
+        workers = 1
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    return workers
+
+
+class SourceExecutor:
+    """Run per-source kernels over a shared graph, optionally in parallel.
+
+    With ``workers <= 1`` (or a single chunk) kernels run in the calling
+    process, so the serial and parallel paths share the exact same code.
+    Use as a context manager to reuse one pool for several kernels.
+    """
+
+    def __init__(
+        self,
+        csr: CSRGraph,
+        workers: Optional[int] = None,
+        chunks_per_worker: int = 4,
+    ) -> None:
+        self.csr = csr
+        self.workers = default_workers() if workers is None else max(1, int(workers))
+        self.chunks_per_worker = max(1, chunks_per_worker)
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def __enter__(self) -> "SourceExecutor":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+    def _sources(self, sources: Optional[Sequence[int]]) -> np.ndarray:
+        if sources is None:
+            return np.arange(self.csr.n_nodes, dtype=np.int64)
+        return np.asarray(sources, dtype=np.int64).reshape(-1)
+
+    def _chunks(self, sources: np.ndarray) -> list:
+        if self.workers <= 1 or sources.size == 0:
+            return [sources]
+        n_chunks = min(sources.size, self.workers * self.chunks_per_worker)
+        size = math.ceil(sources.size / n_chunks)
+        return [sources[i : i + size] for i in range(0, sources.size, size)]
+
+    def _execute(self, kernel: Callable, chunks: list, kwargs: dict) -> list:
+        if len(chunks) <= 1:
+            return [kernel(self.csr, chunk, **kwargs) for chunk in chunks]
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_init_worker,
+                initargs=(self.csr,),
+            )
+        futures = [self._pool.submit(_run_chunk, kernel, chunk, kwargs) for chunk in chunks]
+        return [future.result() for future in futures]
+
+    def map(
+        self,
+        kernel: Callable,
+        sources: Optional[Sequence[int]] = None,
+        **kwargs: Any,
+    ) -> np.ndarray:
+        """Per-source results as an array aligned with ``csr.nodes``.
+
+        Nodes that are not in ``sources`` keep ``0``.
+        """
+
+        sources = self._sources(sources)
+        out = np.zeros(self.csr.n_nodes)
+        chunks = self._chunks(sources)
+        for chunk, values in zip(chunks, self._execute(kernel, chunks, kwargs)):
+            out[chunk] = values
+        return out
+
+    def reduce(
+        self,
+        kernel: Callable,
+        sources: Optional[Sequence[int]] = None,
+        **kwargs: Any,
+    ) -> Any:
+        """Sum of the accumulators returned by ``kernel`` for every chunk."""
+
+        chunks = self._chunks(self._sources(sources))
+        total = None
+        for part in self._execute(kernel, chunks, kwargs):
+            if total is None:
+                total = part
+            elif isinstance(part, tuple):
+                total = tuple(a + b for a, b in zip(total, part))
+            else:
+                total = total + part
+        return total
@@ -1,9 +1,29 @@
 from __future__ import annotations
+import numpy as np
 import osmnx as ox
 import networkx as nx
 
-def prepare_graph(G: nx.MultiDiGraph) -> nx.MultiDiGraph:
+from . import projection
+
+
+def prepare_graph(G: nx.MultiDiGraph, inplace: bool = False) -> nx.MultiDiGraph:
+    """Project ``G`` to its local UTM zone (unchanged if that fails)."""
     try:
-        return ox.project_graph(G)
+        return projection.project_graph(G, inplace=inplace)
     except Exception:
         return G
+
+
+def prepare_network(G: nx.MultiDiGraph) -> projection.ProjectedNetwork:
+    """Project ``G`` in place and return it with its node and edge frames.
+
+    The WGS84 edge geometries are kept alongside the projected ones, see
+    :func:`grafos.projection.project_network`.
+    """
+    try:
+        return projection.project_network(G)
+    except Exception:
+        # Projection impossible : on garde le graphe tel quel
+        nodes, edges = ox.graph_to_gdfs(G, nodes=True, edges=True, fill_edge_geometry=True)
+        wgs84 = np.asarray(edges.geometry) if edges.crs is None or edges.crs.is_geographic else None
+        return projection.ProjectedNetwork(G, nodes, edges, wgs84, edges.crs)
@@ -0,0 +1,170 @@
+"""Single, vectorised projection of a street network.
+
+``ox.project_graph`` converts the graph to GeoDataFrames, reprojects them and
+rebuilds a new graph; the map and export code then reprojected the same
+geometries back to WGS84 several times per request. :func:`project_network`
+projects every coordinate once, with one pyproj transformer over flat
+coordinate arrays, into the local UTM zone. It returns the projected frames
+together with the original WGS84 edge geometries so that later stages can
+use whichever they need.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Optional
+
+import geopandas as gpd
+import networkx as nx
+import numpy as np
+import osmnx as ox
+import shapely
+from pyproj import CRS, Transformer
+
+
+__all__ = [
+    "ProjectedNetwork",
+    "centre_wgs84",
+    "local_utm_crs",
+    "project_graph",
+    "project_network",
+    "transform_geometries",
+    "wgs84_frame",
+    "with_geometry",
+]
+
+
+def local_utm_crs(lon: np.ndarray, lat: np.ndarray) -> CRS:
+    """UTM zone (WGS84 datum) of the centre of the given coordinates."""
+    lon = np.asarray(lon, dtype=float)
+    lat = np.asarray(lat, dtype=float)
+    centre_lon = (np.nanmin(lon) + np.nanmax(lon)) / 2.0
+    centre_lat = (np.nanmin(lat) + np.nanmax(lat)) / 2.0
+    zone = int(np.floor((centre_lon + 180.0) / 6.0)) % 60 + 1
+    return CRS.from_epsg((32600 if centre_lat >= 0 else 32700) + zone)
+
+
+def _transformer(src, dst) -> Transformer:
+    return Transformer.from_crs(src, dst, always_xy=True)
+
+
+def transform_geometries(geometries: np.ndarray, src, dst) -> np.ndarray:
+    """Reproject an array of geometries with a single coordinate transform."""
+    transformer = _transformer(src, dst)
+
+    def apply(coords: np.ndarray) -> np.ndarray:
+        x, y = transformer.transform(coords[:, 0], coords[:, 1])
+        return np.column_stack([x, y])
+
+    return shapely.transform(np.asarray(geometries, dtype=object), apply)
+
+
+def with_geometry(frame: gpd.GeoDataFrame, geometries: np.ndarray, crs) -> gpd.GeoDataFrame:
+    """Shallow copy of ``frame`` whose active geometry is ``geometries``."""
+    out = frame.copy(deep=False)
+    out[out.geometry.name] = gpd.GeoSeries(geometries, index=frame.index, crs=crs)
+    return out
+
+
+@dataclass
+class ProjectedNetwork:
+    """A projected graph, its frames and the WGS84 edge geometries."""
+
+    graph: nx.MultiDiGraph
+    nodes: gpd.GeoDataFrame
+    edges: gpd.GeoDataFrame
+    edges_wgs84: Optional[np.ndarray]
+    crs: CRS
+
+
+def _write_back(G: nx.MultiDiGraph, x: np.ndarray, y: np.ndarray, edge_geoms, crs) -> None:
+    for (node, data), nx_, ny_ in zip(G.nodes(data=True), x.tolist(), y.tolist()):
+        data.setdefault("lon", data["x"])
+        data.setdefault("lat", data["y"])
+        data["x"], data["y"] = nx_, ny_
+    if edge_geoms is not None:
+        for (_, _, data), geom in zip(G.edges(data=True), edge_geoms):
+            if "geometry" in data:
+                data["geometry"] = geom
+    G.graph["crs"] = crs
+
+
+def project_graph(
+    G: nx.MultiDiGraph, to_crs=None, inplace: bool = False
+) -> nx.MultiDiGraph:
+    """Project node coordinates and edge geometries of ``G`` (vectorised).
+
+    Without ``to_crs`` the local UTM zone is used. Original coordinates are
+    kept in the ``lon``/``lat`` node attributes, as osmnx does.
+    """
+    if not inplace:
+        G = G.copy()
+    src = G.graph.get("crs", "EPSG:4326")
+    x = np.fromiter((d["x"] for _, d in G.nodes(data=True)), dtype=float, count=len(G))
+    y = np.fromiter((d["y"] for _, d in G.nodes(data=True)), dtype=float, count=len(G))
+    to_crs = CRS.from_user_input(to_crs) if to_crs is not None else local_utm_crs(x, y)
+    px, py = _transformer(src, to_crs).transform(x, y)
+
+    geoms = [d["geometry"] for _, _, d in G.edges(data=True) if "geometry" in d]
+    projected = iter(transform_geometries(np.array(geoms, dtype=object), src, to_crs)) if geoms else None
+    edge_geoms = None
+    if projected is not None:
+        edge_geoms = [next(projected) if "geometry" in d else None for _, _, d in G.edges(data=True)]
+    _write_back(G, np.asarray(px), np.asarray(py), edge_geoms, to_crs)
+    return G
+
+
+def project_network(G: nx.MultiDiGraph, to_crs=None) -> ProjectedNetwork:
+    """Project ``G`` in place and build its node and edge frames.
+
+    The edge frame is built once in the graph's CRS; its geometry array is
+    projected with one transform, kept in both CRSs, and written back to the
+    graph without projecting anything again.
+    """
+    src = CRS.from_user_input(G.graph.get("crs", "EPSG:4326"))
+    nodes, edges = ox.graph_to_gdfs(G, nodes=True, edges=True, fill_edge_geometry=True)
+    if src.is_projected:
+        # Graphe déjà projeté : une seule conversion vers WGS84
+        wgs84 = transform_geometries(np.asarray(edges.geometry), src, 4326)
+        return ProjectedNetwork(G, nodes, edges, wgs84, src)
+
+    wgs84 = np.asarray(edges.geometry)
+    to_crs = CRS.from_user_input(to_crs) if to_crs is not None else local_utm_crs(
+        nodes["x"].to_numpy(), nodes["y"].to_numpy()
+    )
+    px, py = _transformer(src, to_crs).transform(nodes["x"].to_numpy(), nodes["y"].to_numpy())
+    px, py = np.asarray(px), np.asarray(py)
+    projected = transform_geometries(wgs84, src, to_crs)
+
+    nodes = with_geometry(nodes, shapely.points(px, py), to_crs)
+    nodes["lon"], nodes["lat"] = nodes["x"].to_numpy(), nodes["y"].to_numpy()
+    nodes["x"], nodes["y"] = px, py
+    edges = with_geometry(edges, projected, to_crs)
+    # graph_to_gdfs parcourt G.edges dans le même ordre que ci-dessous
+    _write_back(G, px, py, projected, to_crs)
+    return ProjectedNetwork(G, nodes, edges, wgs84, to_crs)
+
+
+def wgs84_frame(frame: gpd.GeoDataFrame, wgs84: Optional[np.ndarray] = None) -> gpd.GeoDataFrame:
+    """``frame`` in EPSG:4326, reusing ``wgs84`` geometries when given.
+
+    A frame already in EPSG:4326 is returned as is.
+    """
+    if wgs84 is not None and len(wgs84) == len(frame):
+        return with_geometry(frame, wgs84, 4326)
+    if frame.crs is not None and frame.crs.equals(4326):
+        return frame
+    return frame.to_crs(4326)
+
+
+def centre_wgs84(frame: gpd.GeoDataFrame) -> tuple:
+    """``(lat, lon)`` of the mean centroid of ``frame``.
+
+    Centroids are taken in the frame's CRS (metric once projected) and only
+    their mean is converted to WGS84.
+    """
+    centroids = shapely.get_coordinates(shapely.centroid(np.asarray(frame.geometry)))
+    x, y = np.nanmean(centroids, axis=0)
+    if frame.crs is not None and not frame.crs.is_geographic:
+        x, y = _transformer(frame.crs, 4326).transform(x, y)
+    return float(y), float(x)
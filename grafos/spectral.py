@@ -0,0 +1,340 @@
+"""Spectral centralities on a sparse weighted adjacency: eigenvector, PageRank, Katz.
+
+The three measures share one symmetric adjacency built from the undirected
+multigraph view of :class:`~grafos.csr.CSRGraph` (``multi_*`` arrays).
+Its weights say how strongly two nodes are linked:
+
+``inverse_length`` (default)
+    ``1 / length``: a short street is a strong link;
+``length``
+    the raw length, as the former ``eigenvector`` column did;
+``unit``
+    every edge counts once (the topological measures);
+
+or an array with one non-negative weight per ``multi_*`` edge.
+
+Each solver is iterative and starts from a previous vector when one is
+available (``warm_start``, or the :class:`WarmStarts` entry of ``warm_key``):
+recomputing a measure on the same graph with another damping, ``alpha``
+or weighting then takes a few iterations. A solver that stops before
+converging keeps its best estimate and says so in
+:class:`SpectralResult` instead of returning zeros.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Hashable, Optional, Union
+
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.linalg import ArpackNoConvergence, LinearOperator, cg, eigsh
+
+from .csr import CSRGraph
+
+
+__all__ = [
+    "DEFAULT_DAMPING",
+    "DEFAULT_KATZ_ALPHA",
+    "DEFAULT_WEIGHT",
+    "SPECTRAL_COLUMNS",
+    "SpectralResult",
+    "WEIGHTINGS",
+    "WarmStarts",
+    "adjacency",
+    "default_warm_starts",
+    "eigenvector",
+    "katz",
+    "pagerank",
+]
+
+
+SPECTRAL_COLUMNS = ("eigenvector", "pagerank", "katz")
+WEIGHTINGS = ("inverse_length", "length", "unit")
+DEFAULT_WEIGHT = "inverse_length"
+DEFAULT_DAMPING = 0.85
+# Fraction de 1/λmax : le paramètre de Katz ne dépend pas de l'échelle des poids
+DEFAULT_KATZ_ALPHA = 0.5
+DEFAULT_TOL = 1e-8
+DEFAULT_MAX_ITER = 1000
+# En dessous, décomposition dense (ARPACK exige k < n)
+_DENSE_MAX_NODES = 32
+# Tronçons dégénérés : un mètre minimum pour l'inverse de la longueur
+_MIN_LENGTH = 1.0
+
+Weight = Union[str, np.ndarray]
+
+
+@dataclass
+class SpectralResult:
+    """Centrality values and how the solver got there.
+
+    ``iterations`` counts matrix–vector products, ``residual`` is the
+    solver's own error measure (relative eigen-residual, last L1 change of
+    PageRank, relative residual of the Katz system) and ``warm_start`` tells
+    whether a previous vector was used.
+    """
+
+    values: np.ndarray
+    converged: bool
+    iterations: int
+    residual: float
+    warm_start: bool
+
+    def diagnostics(self) -> Dict[str, Any]:
+        return {
+            "converged": bool(self.converged),
+            "iterations": int(self.iterations),
+            "residual": float(self.residual),
+            "warm_start": bool(self.warm_start),
+        }
+
+
+class WarmStarts:
+    """Last vector of each ``(key, measure)``, least recently used evicted first."""
+
+    def __init__(self, max_entries: int = 32):
+        self.max_entries = max_entries
+        self._vectors: "OrderedDict[tuple, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, measure: str, n: int) -> Optional[np.ndarray]:
+        with self._lock:
+            vector = self._vectors.get((key, measure))
+            if vector is None or vector.shape[0] != n:
+                return None
+            self._vectors.move_to_end((key, measure))
+            return vector
+
+    def put(self, key: Hashable, measure: str, vector: np.ndarray) -> None:
+        with self._lock:
+            self._vectors[(key, measure)] = vector
+            self._vectors.move_to_end((key, measure))
+            while len(self._vectors) > self.max_entries:
+                self._vectors.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._vectors.clear()
+
+
+_default_warm_starts: Optional[WarmStarts] = None
+_default_lock = threading.Lock()
+
+
+def default_warm_starts() -> WarmStarts:
+    """Process-wide warm starts (``SPECTRAL_WARM_STARTS`` vectors, 32 by default)."""
+    global _default_warm_starts
+    with _default_lock:
+        if _default_warm_starts is None:
+            _default_warm_starts = WarmStarts(int(os.getenv("SPECTRAL_WARM_STARTS", "32")))
+        return _default_warm_starts
+
+
+def adjacency(csr: CSRGraph, weight: Weight = DEFAULT_WEIGHT) -> sp.csr_matrix:
+    """Symmetric weighted adjacency of the undirected multigraph view.
+
+    Parallel edges add up; a self-loop appears once on the diagonal.
+    """
+    if isinstance(weight, str):
+        if weight not in WEIGHTINGS:
+            raise ValueError(f"weight must be one of {WEIGHTINGS} or an array, got {weight!r}")
+        length = np.nan_to_num(np.asarray(csr.multi_length, dtype=float), nan=0.0)
+        if weight == "inverse_length":
+            values = 1.0 / np.maximum(length, _MIN_LENGTH)
+        elif weight == "length":
+            values = length
+        else:
+            values = np.ones(csr.multi_u.shape[0])
+    else:
+        values = np.asarray(weight, dtype=float)
+        if values.shape != csr.multi_u.shape:
+            raise ValueError(
+                f"expected one weight per edge ({csr.multi_u.shape[0]}), got shape {values.shape}"
+            )
+        if not np.isfinite(values).all() or (values < 0).any():
+            raise ValueError("edge weights must be finite and non-negative")
+    n = csr.n_nodes
+    loops = csr.multi_u == csr.multi_v
+    rows = np.concatenate([csr.multi_u, csr.multi_v[~loops]])
+    cols = np.concatenate([csr.multi_v, csr.multi_u[~loops]])
+    vals = np.concatenate([values, values[~loops]])
+    return sp.csr_matrix((vals, (rows, cols)), shape=(n, n), dtype=float)
+
+
+def _start(
+    warm_start: Optional[np.ndarray],
+    warm_starts: Optional[WarmStarts],
+    warm_key: Optional[Hashable],
+    measure: str,
+    n: int,
+) -> Optional[np.ndarray]:
+    if warm_start is not None:
+        warm_start = np.asarray(warm_start, dtype=float)
+        return warm_start if warm_start.shape == (n,) else None
+    if warm_key is None:
+        return None
+    return (warm_starts or default_warm_starts()).get(warm_key, measure, n)
+
+
+def _remember(
+    warm_starts: Optional[WarmStarts], warm_key: Optional[Hashable], measure: str, vector: np.ndarray
+) -> None:
+    if warm_key is not None:
+        (warm_starts or default_warm_starts()).put(warm_key, measure, vector)
+
+
+def _leading(
+    A: sp.csr_matrix, v0: Optional[np.ndarray], tol: float, max_iter: int
+) -> tuple:
+    """Largest eigenpair of ``A``: ``(value, vector, converged, products, residual)``."""
+    n = A.shape[0]
+    if n <= _DENSE_MAX_NODES:
+        values, vectors = np.linalg.eigh(A.toarray())
+        value, vector = float(values[-1]), vectors[:, -1]
+        products = 0
+        converged = True
+    else:
+        products = 0
+
+        def matvec(x):
+            nonlocal products
+            products += 1
+            return A @ x
+
+        operator = LinearOperator(A.shape, matvec=matvec, dtype=float)
+        # Un vecteur de départ strictement nul ferait échouer ARPACK
+        if v0 is not None and not np.any(v0):
+            v0 = None
+        try:
+            values, vectors = eigsh(operator, k=1, which="LA", v0=v0, tol=tol, maxiter=max_iter)
+            value, vector = float(values[0]), vectors[:, 0]
+            converged = True
+        except ArpackNoConvergence as exc:
+            if exc.eigenvectors.shape[1]:
+                vector = exc.eigenvectors[:, 0]
+            else:
+                vector = v0 if v0 is not None else np.ones(n)
+            vector = vector / (np.linalg.norm(vector) or 1.0)
+            value = float(vector @ (A @ vector))
+            converged = False
+    sign = np.sign(vector.sum()) or 1.0
+    vector = vector * sign
+    vector = vector / (np.linalg.norm(vector) or 1.0)
+    residual = float(np.linalg.norm(A @ vector - value * vector) / (abs(value) or 1.0))
+    return value, vector, converged, products, residual
+
+
+def eigenvector(
+    csr: CSRGraph,
+    weight: Weight = DEFAULT_WEIGHT,
+    tol: float = DEFAULT_TOL,
+    max_iter: int = DEFAULT_MAX_ITER,
+    warm_start: Optional[np.ndarray] = None,
+    warm_key: Optional[Hashable] = None,
+    warm_starts: Optional[WarmStarts] = None,
+) -> SpectralResult:
+    """Leading eigenvector of the adjacency, unit L2 norm and non-negative sum."""
+    n = csr.n_nodes
+    if n == 0:
+        return SpectralResult(np.zeros(0), True, 0, 0.0, False)
+    A = adjacency(csr, weight)
+    v0 = _start(warm_start, warm_starts, warm_key, "eigenvector", n)
+    _, vector, converged, products, residual = _leading(A, v0, tol, max_iter)
+    if converged:
+        _remember(warm_starts, warm_key, "eigenvector", vector)
+    return SpectralResult(vector, converged, products, residual, v0 is not None)
+
+
+def pagerank(
+    csr: CSRGraph,
+    weight: Weight = DEFAULT_WEIGHT,
+    damping: float = DEFAULT_DAMPING,
+    tol: float = DEFAULT_TOL,
+    max_iter: int = DEFAULT_MAX_ITER,
+    warm_start: Optional[np.ndarray] = None,
+    warm_key: Optional[Hashable] = None,
+    warm_starts: Optional[WarmStarts] = None,
+) -> SpectralResult:
+    """PageRank by power iteration (values sum to 1).
+
+    The walk follows each edge in proportion to its weight; nodes without
+    edges jump uniformly, as in networkx. Iterations stop once the L1 change
+    falls below ``tol``.
+    """
+    if not 0 < damping < 1:
+        raise ValueError(f"damping must be in (0, 1), got {damping}")
+    n = csr.n_nodes
+    if n == 0:
+        return SpectralResult(np.zeros(0), True, 0, 0.0, False)
+    A = adjacency(csr, weight)
+    strength = np.asarray(A.sum(axis=1)).ravel()
+    dangling = strength <= 0
+    inverse = np.divide(1.0, strength, out=np.zeros(n), where=~dangling)
+    start = _start(warm_start, warm_starts, warm_key, "pagerank", n)
+    if start is not None and start.sum() > 0 and (start >= 0).all():
+        x = start / start.sum()
+    else:
+        x = np.full(n, 1.0 / n)
+    change = np.inf
+    iterations = 0
+    while iterations < max_iter:
+        # Matrice symétrique : Aᵀ (x / s) = A (x / s)
+        y = damping * (A @ (x * inverse))
+        y += (1.0 - damping + damping * x[dangling].sum()) / n
+        change = float(np.abs(y - x).sum())
+        x = y
+        iterations += 1
+        if change < tol:
+            break
+    converged = change < tol
+    if converged:
+        _remember(warm_starts, warm_key, "pagerank", x)
+    return SpectralResult(x, converged, iterations, change, start is not None)
+
+
+def katz(
+    csr: CSRGraph,
+    weight: Weight = DEFAULT_WEIGHT,
+    alpha: float = DEFAULT_KATZ_ALPHA,
+    tol: float = DEFAULT_TOL,
+    max_iter: int = DEFAULT_MAX_ITER,
+    warm_start: Optional[np.ndarray] = None,
+    warm_key: Optional[Hashable] = None,
+    warm_starts: Optional[WarmStarts] = None,
+) -> SpectralResult:
+    """Katz centrality, solution of ``(I - a·A) x = 1``, unit L2 norm.
+
+    ``alpha`` is a fraction of ``1 / λmax`` so that it does not depend on the
+    scale of the weights; ``a = alpha / λmax`` keeps the system positive
+    definite and it is solved by conjugate gradients. The leading eigenvalue
+    comes from the (warm-started) eigenvector solver.
+    """
+    if not 0 < alpha < 1:
+        raise ValueError(f"alpha must be in (0, 1), got {alpha}")
+    n = csr.n_nodes
+    if n == 0:
+        return SpectralResult(np.zeros(0), True, 0, 0.0, False)
+    A = adjacency(csr, weight)
+    v0 = _start(None, warm_starts, warm_key, "eigenvector", n)
+    value, vector, eig_converged, products, _ = _leading(A, v0, tol, max_iter)
+    if eig_converged:
+        _remember(warm_starts, warm_key, "eigenvector", vector)
+    factor = alpha / value if value > 0 else 0.0
+    system = sp.identity(n, format="csr") - factor * A
+    b = np.ones(n)
+    start = _start(warm_start, warm_starts, warm_key, "katz", n)
+
+    def count(_):
+        nonlocal products
+        products += 1
+
+    x, info = cg(system, b, x0=start, rtol=tol, maxiter=max_iter, callback=count)
+    residual = float(np.linalg.norm(b - system @ x) / np.linalg.norm(b))
+    converged = info == 0 and eig_converged
+    if converged:
+        _remember(warm_starts, warm_key, "katz", x)
+    return SpectralResult(x / (np.linalg.norm(x) or 1.0), converged, products, residual, start is not None)
@@ -0,0 +1,334 @@
+"""Persistent on-disk store for downloaded street graphs.
+
+Graphs are saved under a key made of the normalised ``(city, mode, distance)``
+as a single uncompressed ``.npz`` file: node ids and coordinates, edge
+endpoints, keys and lengths are NumPy arrays, edge geometries are WKB blobs
+concatenated with an offsets array, and the remaining (heterogeneous) OSM
+attributes are kept as JSON. Loading one back skips geocoding, Overpass and
+the osmnx graph construction entirely.
+
+The store is size-capped: when the total exceeds ``max_bytes`` the least
+recently used graphs are evicted. Hit/miss/eviction counters are available
+through :meth:`GraphStore.stats`.
+
+Several processes (the analysis workers) may share one store: files are
+written under unique temporary names and every read-modify-write of the
+index happens under an exclusive :func:`file_lock`, re-reading the index
+from disk first.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+import unicodedata
+import uuid
+import zipfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional
+
+import networkx as nx
+import numpy as np
+import shapely
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows : verrou limité au processus
+    fcntl = None
+
+
+__all__ = ["GraphStore", "normalise_key", "default_store", "file_lock", "unique_tmp"]
+
+
+DEFAULT_MAX_MB = 1024
+INDEX_FILE = "index.json"
+LOCK_FILE = "index.lock"
+
+
+@contextmanager
+def file_lock(path: os.PathLike | str) -> Iterator[None]:
+    """Exclusive lock on ``path`` shared by every process (and thread)."""
+    # Chaque ouverture a sa propre description de fichier : flock exclut
+    # aussi les autres threads du même processus
+    with open(path, "a+b") as fh:
+        if fcntl is not None:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+
+
+def unique_tmp(target: Path) -> Path:
+    """Temporary sibling of ``target`` that no other writer can pick."""
+    return target.with_name(f".{target.name}.{os.getpid()}.{uuid.uuid4().hex}")
+
+
+def normalise_key(city: str, mode: str, distance: int) -> str:
+    """Canonical textual key for a graph request."""
+    city = unicodedata.normalize("NFC", " ".join(str(city).lower().split()))
+    return f"{city}|{str(mode).strip().lower()}|{int(distance)}"
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (set, tuple)):
+        return list(value)
+    return str(value)
+
+
+def _encode_ids(values: list) -> Dict[str, np.ndarray]:
+    if all(isinstance(v, (int, np.integer)) and not isinstance(v, bool) for v in values):
+        return {"ids": np.asarray(values, dtype=np.int64)}
+    return {"ids_json": np.frombuffer(json.dumps(values, default=_json_default).encode(), dtype=np.uint8)}
+
+
+def _decode_ids(data, prefix: str) -> list:
+    if f"{prefix}ids" in data:
+        return data[f"{prefix}ids"].tolist()
+    return json.loads(data[f"{prefix}ids_json"].tobytes().decode())
+
+
+def _text(payload: Any) -> np.ndarray:
+    return np.frombuffer(json.dumps(payload, default=_json_default).encode(), dtype=np.uint8)
+
+
+def _from_text(array: np.ndarray) -> Any:
+    return json.loads(array.tobytes().decode())
+
+
+def _serialise(G: nx.MultiDiGraph) -> Dict[str, np.ndarray]:
+    node_ids = list(G.nodes())
+    position = {node: i for i, node in enumerate(node_ids)}
+    node_attrs = []
+    xs = np.empty(len(node_ids))
+    ys = np.empty(len(node_ids))
+    for i, (_, data) in enumerate(G.nodes(data=True)):
+        attrs = dict(data)
+        xs[i] = float(attrs.pop("x", np.nan))
+        ys[i] = float(attrs.pop("y", np.nan))
+        node_attrs.append(attrs)
+
+    edges = list(G.edges(keys=True, data=True))
+    u = np.fromiter((position[e[0]] for e in edges), dtype=np.int64, count=len(edges))
+    v = np.fromiter((position[e[1]] for e in edges), dtype=np.int64, count=len(edges))
+    lengths = np.empty(len(edges))
+    geoms = np.empty(len(edges), dtype=object)
+    edge_attrs = []
+    for i, (_, _, _, data) in enumerate(edges):
+        attrs = dict(data)
+        lengths[i] = float(attrs.pop("length", np.nan))
+        geoms[i] = attrs.pop("geometry", None)
+        edge_attrs.append(attrs)
+
+    wkb = shapely.to_wkb(geoms)
+    sizes = np.fromiter((len(b) if b is not None else 0 for b in wkb), dtype=np.int64, count=len(wkb))
+    offsets = np.zeros(len(wkb) + 1, dtype=np.int64)
+    np.cumsum(sizes, out=offsets[1:])
+    blob = b"".join(b for b in wkb if b is not None)
+
+    arrays = {
+        "node_x": xs,
+        "node_y": ys,
+        "node_attrs": _text(node_attrs),
+        "edge_u": u,
+        "edge_v": v,
+        "edge_length": lengths,
+        "edge_wkb": np.frombuffer(blob, dtype=np.uint8),
+        "edge_wkb_offsets": offsets,
+        "edge_attrs": _text(edge_attrs),
+        "graph_attrs": _text(dict(G.graph)),
+    }
+    arrays.update({f"node_{k}": a for k, a in _encode_ids(node_ids).items()})
+    arrays.update({f"edge_key_{k}": a for k, a in _encode_ids([e[2] for e in edges]).items()})
+    return arrays
+
+
+def _deserialise(data) -> nx.MultiDiGraph:
+    node_ids = _decode_ids(data, "node_")
+    keys = _decode_ids(data, "edge_key_")
+    node_attrs = _from_text(data["node_attrs"])
+    edge_attrs = _from_text(data["edge_attrs"])
+
+    blob = data["edge_wkb"].tobytes()
+    offsets = data["edge_wkb_offsets"]
+    chunks = np.empty(len(keys), dtype=object)
+    chunks[:] = [blob[a:b] if b > a else None for a, b in zip(offsets[:-1].tolist(), offsets[1:].tolist())]
+    geoms = shapely.from_wkb(chunks)
+
+    xs, ys = data["node_x"].tolist(), data["node_y"].tolist()
+    for attrs, x, y in zip(node_attrs, xs, ys):
+        attrs["x"] = x
+        attrs["y"] = y
+    lengths = data["edge_length"].tolist()
+    for attrs, length, geom in zip(edge_attrs, lengths, geoms.tolist()):
+        if length == length:  # NaN → attribut absent
+            attrs["length"] = length
+        if geom is not None:
+            attrs["geometry"] = geom
+
+    G = nx.MultiDiGraph()
+    G.graph.update(_from_text(data["graph_attrs"]))
+    G.add_nodes_from(zip(node_ids, node_attrs))
+    # Extrémités résolues en une indexation ; clés d'arêtes conservées
+    ids = np.empty(len(node_ids), dtype=object)
+    ids[:] = node_ids
+    us = ids[data["edge_u"]].tolist()
+    vs = ids[data["edge_v"]].tolist()
+    G.add_edges_from(zip(us, vs, keys, edge_attrs))
+    return G
+
+
+class GraphStore:
+    """Size-capped LRU store of graphs in ``root``."""
+
+    def __init__(self, root: os.PathLike | str, max_bytes: Optional[int] = None) -> None:
+        self.root = Path(root).expanduser()
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = int(max_bytes) if max_bytes is not None else DEFAULT_MAX_MB * 1024 * 1024
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+
+    # -- index -----------------------------------------------------------
+    def _index_path(self) -> Path:
+        return self.root / INDEX_FILE
+
+    def _read_index(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            return json.loads(self._index_path().read_text())
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _write_index(self, index: Dict[str, Dict[str, Any]]) -> None:
+        # Appelé sous ``_locked()`` uniquement
+        tmp = unique_tmp(self._index_path())
+        tmp.write_text(json.dumps(index))
+        os.replace(tmp, self._index_path())
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        """Thread and process lock around a read-modify-write of the index."""
+        with self._lock, file_lock(self.root / LOCK_FILE):
+            yield
+
+    @staticmethod
+    def _digest(key: str) -> str:
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+    def path_for(self, city: str, mode: str, distance: int) -> Path:
+        return self.root / f"{self._digest(normalise_key(city, mode, distance))}.npz"
+
+    # -- API -------------------------------------------------------------
+    def get(self, city: str, mode: str, distance: int) -> Optional[nx.MultiDiGraph]:
+        """Load a stored graph or return ``None`` (counted as a miss)."""
+        key = normalise_key(city, mode, distance)
+        path = self.path_for(city, mode, distance)
+        try:
+            # Remplacement atomique : la lecture n'a pas besoin du verrou
+            stamp = path.stat().st_mtime_ns
+            with np.load(path, allow_pickle=False) as data:
+                G = _deserialise(data)
+        except FileNotFoundError:
+            with self._lock:
+                self._counters["misses"] += 1
+            return None
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+            # Fichier tronqué ou illisible : évincé, le graphe sera retéléchargé
+            with self._locked():
+                self._counters["misses"] += 1
+                try:
+                    # Sauf s'il vient d'être remplacé par un autre processus
+                    if path.stat().st_mtime_ns == stamp:
+                        path.unlink()
+                        index = self._read_index()
+                        index.pop(key, None)
+                        self._write_index(index)
+                except FileNotFoundError:
+                    pass
+            return None
+        with self._locked():
+            self._counters["hits"] += 1
+            index = self._read_index()
+            entry = index.setdefault(key, {"file": path.name})
+            try:
+                entry["bytes"] = path.stat().st_size
+            except FileNotFoundError:
+                # Évincé entre-temps par un autre processus
+                index.pop(key)
+            else:
+                entry["last_access"] = time.time()
+            self._write_index(index)
+        return G
+
+    def put(self, city: str, mode: str, distance: int, G: nx.MultiDiGraph) -> Path:
+        """Save ``G`` and evict least recently used graphs over the size cap."""
+        key = normalise_key(city, mode, distance)
+        path = self.path_for(city, mode, distance)
+        arrays = _serialise(G)
+        tmp = unique_tmp(path)
+        with open(tmp, "wb") as fh:
+            np.savez(fh, **arrays)
+        with self._locked():
+            os.replace(tmp, path)
+            self._counters["writes"] += 1
+            index = self._read_index()
+            index[key] = {"file": path.name, "bytes": path.stat().st_size, "last_access": time.time()}
+            self._evict(index, keep=key)
+            self._write_index(index)
+        return path
+
+    def _evict(self, index: Dict[str, Dict[str, Any]], keep: str) -> None:
+        total = sum(entry.get("bytes", 0) for entry in index.values())
+        for key in sorted(index, key=lambda k: index[k].get("last_access", 0.0)):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            entry = index.pop(key)
+            total -= entry.get("bytes", 0)
+            (self.root / entry["file"]).unlink(missing_ok=True)
+            self._counters["evictions"] += 1
+
+    def clear(self) -> None:
+        with self._locked():
+            for entry in self._read_index().values():
+                (self.root / entry["file"]).unlink(missing_ok=True)
+            self._write_index({})
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            index = self._read_index()
+            counters = dict(self._counters)
+        lookups = counters["hits"] + counters["misses"]
+        counters.update(
+            {
+                "entries": len(index),
+                "bytes": sum(entry.get("bytes", 0) for entry in index.values()),
+                "max_bytes": self.max_bytes,
+                "hit_rate": counters["hits"] / lookups if lookups else 0.0,
+            }
+        )
+        return counters
+
+
+_DEFAULT: Optional[GraphStore] = None
+_DEFAULT_ROOT: Optional[str] = None
+
+
+def default_store() -> Optional[GraphStore]:
+    """Store configured by ``GRAPH_STORE_DIR``/``GRAPH_STORE_MAX_MB`` (or ``None``)."""
+    global _DEFAULT, _DEFAULT_ROOT
+    root = os.environ.get("GRAPH_STORE_DIR")
+    if not root:
+        return None
+    if _DEFAULT is None or _DEFAULT_ROOT != root:
+        max_mb = float(os.environ.get("GRAPH_STORE_MAX_MB", DEFAULT_MAX_MB))
+        _DEFAULT = GraphStore(root, max_bytes=int(max_mb * 1024 * 1024))
+        _DEFAULT_ROOT = root
+    return _DEFAULT
@@ -0,0 +1,228 @@
+"""Synthetic street networks built from NumPy arrays.
+
+The fallback grid used to be built node by node with string ids, which
+limited it to small offline demos. :func:`synthetic_network` builds nodes,
+directed edges, lengths and geometries as arrays with integer ids, so a
+grid of a million nodes takes seconds, and can make the grid look more like
+a real street network:
+
+``remove_fraction``
+    share of street segments removed at random (nodes left without any
+    street are dropped);
+``diagonal_fraction``
+    share of blocks crossed by a diagonal street;
+``oneway_fraction``
+    share of streets that can only be travelled in one (random) direction;
+``components``
+    number of vertical strips the grid is cut into (no street crosses a cut);
+``jitter``
+    random displacement of every node, as a fraction of ``step_m``.
+
+:func:`synthetic_graph` turns the arrays into the ``MultiDiGraph`` that
+:func:`grafos.loader.get_graph` returns for OpenStreetMap (``EPSG:4326``,
+``x``/``y`` on nodes, ``length``/``oneway``/``geometry`` on edges).
+"""
+
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+import networkx as nx
+import numpy as np
+import shapely
+
+
+__all__ = ["SyntheticNetwork", "synthetic_graph", "synthetic_network"]
+
+
+DEFAULT_CENTER = (43.7384, 7.4246)
+_METRES_PER_DEGREE = 111320.0
+
+
+@dataclass(eq=False)
+class SyntheticNetwork:
+    """Nodes and directed edges of a synthetic network.
+
+    ``u``/``v`` are node ids (values of ``node_id``, not positions); every
+    two-way street appears as two reciprocal edges.
+    """
+
+    node_id: np.ndarray
+    lon: np.ndarray
+    lat: np.ndarray
+    u: np.ndarray
+    v: np.ndarray
+    length: np.ndarray
+    oneway: np.ndarray
+
+    @property
+    def n_nodes(self) -> int:
+        return int(self.node_id.shape[0])
+
+    @property
+    def n_edges(self) -> int:
+        return int(self.u.shape[0])
+
+    def positions(self, ids: np.ndarray) -> np.ndarray:
+        """Positions in the node arrays of the given ids."""
+        return np.searchsorted(self.node_id, ids)
+
+    def geometries(self) -> np.ndarray:
+        """Straight ``LineString`` of every edge, from ``u`` to ``v`` (WGS84)."""
+        a, b = self.positions(self.u), self.positions(self.v)
+        coords = np.empty((self.n_edges, 2, 2))
+        coords[:, 0, 0], coords[:, 0, 1] = self.lon[a], self.lat[a]
+        coords[:, 1, 0], coords[:, 1, 1] = self.lon[b], self.lat[b]
+        return shapely.linestrings(coords)
+
+    def to_graph(self, geometry: bool = True) -> nx.MultiDiGraph:
+        """``MultiDiGraph`` shaped like an osmnx graph.
+
+        ``geometry=False`` leaves the edges without geometry (osmnx then
+        draws straight lines), which saves most of the memory on very large
+        grids. Filling networkx is the slow part here (about half a minute
+        per million nodes); the arrays themselves take well under a second.
+        """
+        graph = nx.MultiDiGraph(crs="EPSG:4326", synthetic=True)
+        graph.add_nodes_from(
+            (node, {"y": y, "x": x})
+            for node, x, y in zip(self.node_id.tolist(), self.lon.tolist(), self.lat.tolist())
+        )
+        columns = [self.u.tolist(), self.v.tolist(), self.length.tolist(), self.oneway.tolist()]
+        if geometry:
+            columns.append(self.geometries())
+            attrs = (
+                {"length": length, "oneway": oneway, "geometry": geom}
+                for _, _, length, oneway, geom in zip(*columns)
+            )
+        else:
+            attrs = ({"length": length, "oneway": oneway} for _, _, length, oneway in zip(*columns))
+        graph.add_edges_from(zip(columns[0], columns[1], attrs))
+        return graph
+
+
+def _grid_segments(rows: int, cols: int, components: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Horizontal then vertical segments of a ``rows × cols`` grid (positions)."""
+    ids = np.arange(rows * cols).reshape(rows, cols)
+    horizontal = np.stack([ids[:, :-1].ravel(), ids[:, 1:].ravel()], axis=1)
+    vertical = np.stack([ids[:-1, :].ravel(), ids[1:, :].ravel()], axis=1)
+    if components > 1:
+        # Coupures verticales : aucun segment horizontal ne les traverse
+        cuts = (np.arange(1, components) * cols) // components
+        crossing = np.isin(horizontal[:, 1] % cols, cuts)
+        horizontal = horizontal[~crossing]
+    return horizontal, vertical
+
+
+def synthetic_network(
+    center: Tuple[float, float] = DEFAULT_CENTER,
+    size_m: float = 800,
+    step_m: float = 100,
+    remove_fraction: float = 0.0,
+    diagonal_fraction: float = 0.0,
+    oneway_fraction: float = 0.0,
+    components: int = 1,
+    jitter: float = 0.0,
+    seed: Optional[int] = 0,
+) -> SyntheticNetwork:
+    """Square grid of side ``size_m`` centred on ``center`` (``(lat, lon)``).
+
+    Streets are ``step_m`` apart; lengths are measured on the (jittered)
+    node positions in a local equirectangular projection, so an untouched
+    grid has every length equal to ``step_m``. ``seed`` makes the random
+    irregularities reproducible.
+    """
+    for name, value in (
+        ("remove_fraction", remove_fraction),
+        ("diagonal_fraction", diagonal_fraction),
+        ("oneway_fraction", oneway_fraction),
+    ):
+        if not 0 <= value <= 1:
+            raise ValueError(f"{name} must be in [0, 1], got {value}")
+    if not 0 <= jitter < 1:
+        raise ValueError(f"jitter must be in [0, 1), got {jitter}")
+    if components < 1:
+        raise ValueError(f"components must be at least 1, got {components}")
+    rng = np.random.default_rng(seed)
+
+    n = int(size_m / step_m)
+    # Indices -n//2 … n//2 comme l'ancienne grille
+    offsets = np.arange(-n // 2, n // 2 + 1)
+    side = offsets.size
+    row, col = np.divmod(np.arange(side * side), side)
+    north = offsets[row] * float(step_m)
+    east = offsets[col] * float(step_m)
+    if jitter:
+        north = north + rng.uniform(-0.5, 0.5, north.size) * jitter * step_m
+        east = east + rng.uniform(-0.5, 0.5, east.size) * jitter * step_m
+
+    horizontal, vertical = _grid_segments(side, side, components)
+    segments = np.concatenate([horizontal, vertical])
+    if remove_fraction:
+        segments = segments[rng.random(segments.shape[0]) >= remove_fraction]
+    if diagonal_fraction and side > 1:
+        corner = np.arange(side * side).reshape(side, side)[:-1, :-1].ravel()
+        corner = corner[rng.random(corner.size) < diagonal_fraction]
+        if components > 1:
+            cuts = (np.arange(1, components) * side) // components
+            corner = corner[~np.isin(corner % side + 1, cuts)]
+        # Diagonale montante ou descendante au hasard
+        rising = rng.random(corner.size) < 0.5
+        diagonals = np.where(
+            rising[:, None],
+            np.stack([corner, corner + side + 1], axis=1),
+            np.stack([corner + 1, corner + side], axis=1),
+        )
+        segments = np.concatenate([segments, diagonals])
+
+    a, b = segments[:, 0], segments[:, 1]
+    length = np.hypot(north[a] - north[b], east[a] - east[b])
+    oneway = rng.random(a.size) < oneway_fraction if oneway_fraction else np.zeros(a.size, dtype=bool)
+    flip = oneway & (rng.random(a.size) < 0.5)
+    a, b = np.where(flip, b, a), np.where(flip, a, b)
+    # Aller puis retour pour chaque rue à double sens
+    two_way = ~oneway
+    u = np.empty(a.size + two_way.sum(), dtype=np.int64)
+    v = np.empty_like(u)
+    forward = np.arange(a.size) + np.cumsum(two_way) - two_way
+    u[forward], v[forward] = a, b
+    backward = forward[two_way] + 1
+    u[backward], v[backward] = b[two_way], a[two_way]
+    edge_length = np.empty(u.size)
+    edge_length[forward] = length
+    edge_length[backward] = length[two_way]
+    edge_oneway = np.zeros(u.size, dtype=bool)
+    edge_oneway[forward] = oneway
+
+    if remove_fraction:
+        # Les nœuds privés de toute rue disparaissent, comme dans OSM
+        used = np.zeros(side * side, dtype=bool)
+        used[u] = used[v] = True
+        node_id = np.flatnonzero(used)
+    else:
+        node_id = np.arange(side * side)
+    lat0 = center[0]
+    deg_lat = 1.0 / _METRES_PER_DEGREE
+    deg_lon = 1.0 / (_METRES_PER_DEGREE * math.cos(math.radians(lat0)))
+    return SyntheticNetwork(
+        node_id=node_id,
+        lon=center[1] + east[node_id] * deg_lon,
+        lat=lat0 + north[node_id] * deg_lat,
+        u=u,
+        v=v,
+        length=edge_length,
+        oneway=edge_oneway,
+    )
+
+
+def synthetic_graph(
+    center: Tuple[float, float] = DEFAULT_CENTER,
+    size_m: float = 800,
+    step_m: float = 100,
+    geometry: bool = True,
+    **irregularity,
+) -> nx.MultiDiGraph:
+    """Synthetic ``MultiDiGraph``; ``irregularity`` as :func:`synthetic_network`."""
+    return synthetic_network(center, size_m, step_m, **irregularity).to_graph(geometry=geometry)
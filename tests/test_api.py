@@ -0,0 +1,278 @@
+"""Tests for the HTTP API and its job subsystem."""
+
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import api, jobs, results
+from grafos import loader
+
+PAYLOAD = {"city": "Nowhere", "radius_km": 0.5, "allow_synthetic": True, "do_h3": False}
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    monkeypatch.setenv("RESULT_STORE_DIR", str(tmp_path / "results"))
+    def always_fail(*args, **kwargs):
+        raise loader.OpenStreetMapUnavailable("city", "walk", 500, tuple(), tuple())
+
+    # Les processus du pool sont forkés après ce patch et en héritent
+    monkeypatch.setattr(loader, "load_city_graph", always_fail)
+    manager = jobs.JobManager(max_workers=1, max_queue=1)
+    monkeypatch.setattr(jobs, "_MANAGER", manager)
+    with TestClient(api.app) as test_client:
+        yield test_client
+
+
+def _wait_done(client, job_id, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = client.get(f"/api/jobs/{job_id}").json()
+        if status["status"] not in {"queued", "running", "cancelling"}:
+            return status
+        time.sleep(0.05)
+    raise AssertionError("job did not finish")
+
+
+def test_analyze_runs_through_pool(client):
+    response = client.post("/api/analyze", json=PAYLOAD)
+    assert response.status_code == 200
+    body = response.json()
+    assert body["metrics"]["nodes"] > 0
+    assert body["map"]["tiles"] == f"/api/results/{body['resultId']}/tiles/{{z}}/{{x}}/{{y}}.mvt"
+    assert "geojson" not in body["map"]
+    assert body["downloads"]["edgesGeoJSON"] == f"/api/results/{body['resultId']}/edges.geojson"
+    assert body["downloads"]["h3GeoJSON"] is None
+
+
+def test_result_downloads(client, monkeypatch):
+    body = client.post("/api/analyze", json=PAYLOAD).json()
+    url = body["downloads"]["edgesGeoJSON"]
+
+    plain = client.get(url, headers={"Accept-Encoding": "identity"})
+    assert plain.status_code == 200
+    assert "Content-Encoding" not in plain.headers
+    edges = plain.json()
+    assert len(edges["features"]) == body["metrics"]["edges"]
+
+    zipped = client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert zipped.headers["Content-Encoding"] == "gzip"
+    assert zipped.json() == edges
+
+    etag = zipped.headers["ETag"]
+    cached = client.get(url, headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert cached.status_code == 304
+    # Un 304 ne compresse rien
+    csv_url = body["downloads"]["metricsCSV"]
+    csv_etag = f'"{body["resultId"]}-metrics.csv-gzip"'
+    with monkeypatch.context() as patch:
+        patch.setattr(results.ResultStore, "encoded", lambda *a: pytest.fail("compressed for a 304"))
+        not_modified = client.get(csv_url, headers={"Accept-Encoding": "gzip", "If-None-Match": csv_etag})
+    assert not_modified.status_code == 304
+
+    partial = client.get(url, headers={"Accept-Encoding": "identity", "Range": "bytes=0-9"})
+    assert partial.status_code == 206
+    assert partial.content == plain.content[:10]
+    assert partial.headers["Content-Range"] == f"bytes 0-9/{len(plain.content)}"
+    tail = client.get(url, headers={"Accept-Encoding": "identity", "Range": "bytes=-5"})
+    assert tail.content == plain.content[-5:]
+    too_far = client.get(url, headers={"Accept-Encoding": "identity", "Range": "bytes=999999999-"})
+    assert too_far.status_code == 416
+
+    csv = client.get(body["downloads"]["metricsCSV"])
+    assert csv.text.startswith("indicateur,valeur")
+    assert client.get(f"/api/results/{body['resultId']}/h3.geojson").status_code == 404
+    assert client.get("/api/results/../edges.geojson").status_code == 404
+
+
+def test_result_tiles(client):
+    body = client.post("/api/analyze", json=PAYLOAD).json()
+    (south, west), (north, east) = body["map"]["bounds"]
+    z = 14
+    x = int(((west + east) / 2 + 180) / 360 * 2**z)
+    lat = math.radians((south + north) / 2)
+    y = int((1 - math.asinh(math.tan(lat)) / math.pi) / 2 * 2**z)
+    url = body["map"]["tiles"].format(z=z, x=x, y=y)
+
+    tile = client.get(url)
+    assert tile.status_code == 200
+    assert tile.headers["content-type"] == "application/vnd.mapbox-vector-tile"
+    assert tile.content
+    assert client.get(url, headers={"If-None-Match": tile.headers["ETag"]}).status_code == 304
+    assert client.get(body["map"]["tiles"].format(z=z, x=0, y=0)).status_code == 204
+    assert client.get(body["map"]["tiles"].format(z=1, x=5, y=0)).status_code == 404
+
+
+def test_isochrones(client):
+    body = client.post("/api/analyze", json=PAYLOAD).json()
+    centre = body["map"]["center"]
+    request = {
+        "result_id": body["resultId"],
+        "origins": [{"lat": centre["lat"], "lon": centre["lng"]}],
+        "thresholds": [2, 5],
+    }
+    response = client.post("/api/isochrones", json=request)
+    assert response.status_code == 200
+    found = response.json()
+    assert [f["properties"]["threshold"] for f in found["features"]] == [2, 5]
+    assert found["features"][0]["geometry"]["type"] in {"Polygon", "MultiPolygon"}
+    assert found["features"][0]["properties"]["distance_m"] == pytest.approx(160)
+    areas = [f["properties"]["area_m2"] for f in found["features"]]
+    assert 0 < areas[0] < areas[1]
+    assert found["origins"][0]["snap_distance_m"] < 200
+
+    unknown = {**request, "result_id": "0" * 32}
+    assert client.post("/api/isochrones", json=unknown).status_code == 404
+    assert client.post("/api/isochrones", json={**request, "thresholds": [-1]}).status_code == 422
+
+
+def test_route_and_od_matrix(client):
+    body = client.post("/api/analyze", json=PAYLOAD).json()
+    centre = body["map"]["center"]
+    a = {"lat": centre["lat"] - 0.002, "lon": centre["lng"] - 0.002}
+    b = {"lat": centre["lat"] + 0.002, "lon": centre["lng"] + 0.002}
+
+    response = client.post("/api/route", json={"result_id": body["resultId"], "origin": a, "destination": b})
+    assert response.status_code == 200
+    found = response.json()
+    assert found["distance_m"] > 0
+    assert found["geometry"]["type"] == "LineString"
+
+    request = {"result_id": body["resultId"], "origins": [a, b], "destinations": [a, b]}
+    response = client.post("/api/od-matrix", json=request)
+    assert response.status_code == 200
+    distances = response.json()["distances_m"]
+    assert distances[0][0] == 0 and distances[1][1] == 0
+    assert distances[0][1] == pytest.approx(found["distance_m"])
+    assert distances[1][0] == pytest.approx(distances[0][1])
+
+    unknown = {**request, "result_id": "0" * 32}
+    assert client.post("/api/od-matrix", json=unknown).status_code == 404
+    assert client.post("/api/od-matrix", json={**request, "origins": []}).status_code == 422
+
+    # Hiérarchie écrite avec le résultat ; sans elle, pas de contraction à la requête
+    hierarchy = results.default_store().hierarchy_source(body["resultId"])
+    assert hierarchy is not None
+    hierarchy.unlink()
+    response = client.post("/api/od-matrix", json=request)
+    assert response.status_code == 404
+    assert "relancez" in response.json()["detail"]
+
+
+def test_job_lifecycle(client):
+    response = client.post("/api/jobs", json=PAYLOAD)
+    assert response.status_code == 202
+    job_id = response.json()["id"]
+    status = _wait_done(client, job_id)
+    assert status["status"] == "done"
+    assert status["progress"] == 1.0
+    assert all(stage["status"] == "done" for stage in status["stages"])
+    assert status["result"]["metrics"]["edges"] > 0
+    assert client.get("/api/jobs/unknown").status_code == 404
+
+
+def test_queue_limit_and_cancellation(client):
+    # Des paramètres distincts pour ne pas être fusionnés
+    first = client.post("/api/jobs", json=PAYLOAD).json()["id"]
+    second = client.post("/api/jobs", json={**PAYLOAD, "radius_km": 0.6}).json()["id"]
+    assert client.post("/api/jobs", json={**PAYLOAD, "radius_km": 0.7}).status_code == 429
+
+    cancelled = client.delete(f"/api/jobs/{second}").json()
+    assert cancelled["status"] in {"cancelled", "cancelling"}
+    assert _wait_done(client, second)["status"] == "cancelled"
+    assert _wait_done(client, first)["status"] == "done"
+    assert client.get("/api/health").json() == {"status": "ok"}
+
+
+def test_identical_requests_are_coalesced(client):
+    first = client.post("/api/jobs", json=PAYLOAD).json()["id"]
+    duplicate = {**PAYLOAD, "city": "  NOWHERE "}
+    second = client.post("/api/jobs", json=duplicate).json()["id"]
+    assert first != second
+
+    stats = client.get("/api/stats").json()
+    assert stats["coalesced"] == 1
+    assert stats["submitted"] == 2
+    assert stats["active"] == 1
+    assert _wait_done(client, first)["status"] == "done"
+    assert _wait_done(client, second)["result"] == _wait_done(client, first)["result"]
+
+    # Une fois terminé, le même calcul relance un nouveau travail
+    third = client.post("/api/jobs", json=PAYLOAD).json()["id"]
+    assert third != first
+    _wait_done(client, third)
+
+
+def test_repeated_cancel_only_withdraws_its_caller(monkeypatch):
+    release = threading.Event()
+    monkeypatch.setattr(jobs, "run_analysis", lambda params, job_id, shared: release.wait(5) and {"ok": True})
+    manager = jobs.JobManager(max_workers=1, max_queue=1, executor=ThreadPoolExecutor(1))
+    try:
+        first = manager.submit(PAYLOAD)
+        second = manager.submit(PAYLOAD)
+        assert first.future is second.future
+
+        # Double clic : la seconde annulation du même client ne compte pas
+        assert manager.cancel(first.id) and manager.cancel(first.id)
+        assert manager.status(first)["status"] == "cancelled"
+        assert not second.cancel_requested
+        release.set()
+        assert second.future.result(5) == {"ok": True}
+        assert manager.status(second)["status"] == "done"
+    finally:
+        release.set()
+        manager.shutdown()
+
+
+def _pid_after(delay):
+    time.sleep(delay)
+    return os.getpid()
+
+
+def test_same_network_prefers_its_worker():
+    manager = jobs.JobManager(max_workers=3, max_queue=1)
+    try:
+        toggled = {**PAYLOAD, "do_degree": True, "city": " nowhere"}
+        assert jobs.affinity_key(PAYLOAD) == jobs.affinity_key(toggled)
+        pids = set()
+        for params in (PAYLOAD, toggled) * 3:
+            with manager._lock:
+                manager._ensure_started()
+                future = manager._submit_task(params, os.getpid)
+            pids.add(future.result(30))
+        assert len(pids) == 1
+    finally:
+        manager.shutdown()
+
+
+def test_colliding_networks_use_idle_workers():
+    manager = jobs.JobManager(max_workers=2, max_queue=4)
+    try:
+        with manager._lock:
+            manager._ensure_started()
+            # Deux villes dont le processus préféré est le même
+            cities = {}
+            for i in range(100):
+                params = {**PAYLOAD, "city": f"Ville {i}"}
+                cities.setdefault(manager._preferred(jobs.affinity_key(params)), []).append(params)
+            first, second = next(group for group in cities.values() if len(group) >= 2)[:2]
+
+        start = time.monotonic()
+        with manager._lock:
+            futures = [manager._submit_task(p, _pid_after, 1.0) for p in (first, second)]
+        pids = [f.result(30) for f in futures]
+        # En parallèle sur les deux processus, pas l'un derrière l'autre
+        assert pids[0] != pids[1]
+        assert time.monotonic() - start < 1.9
+
+        # Tous occupés : le travail attend et part sur le premier libéré
+        with manager._lock:
+            futures = [manager._submit_task(p, _pid_after, 0.3) for p in (first, second, first)]
+        assert len({f.result(30) for f in futures}) == 2
+    finally:
+        manager.shutdown()
@@ -0,0 +1,103 @@
+"""Tests for the contraction hierarchy."""
+
+import networkx as nx
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse import csgraph
+
+from app import isochrones, routing
+from grafos import ch, loader, prepare
+
+
+def _grid(side, seed=0):
+    rng = np.random.default_rng(seed)
+    G = nx.grid_2d_graph(side, side)
+    index = {node: i for i, node in enumerate(G.nodes)}
+    u = np.array([index[a] for a, _ in G.edges])
+    v = np.array([index[b] for _, b in G.edges])
+    return len(index), u, v, rng.uniform(10.0, 100.0, u.size)
+
+
+def test_matches_dijkstra_on_grid(tmp_path):
+    n, u, v, length = _grid(12)
+    hierarchy = ch.build_hierarchy(n, u, v, length, directed=False)
+    path = tmp_path / "grid.ch.npz"
+    hierarchy.save(path)
+    hierarchy = ch.ContractionHierarchy.load(path)
+
+    matrix = sp.coo_matrix((length, (u, v)), shape=(n, n)).tocsr()
+    expected = csgraph.dijkstra(matrix, directed=False)
+    sources, targets = np.arange(0, n, 7), np.arange(3, n, 5)
+    found = hierarchy.many_to_many(sources, targets, chunk_size=4)
+    np.testing.assert_allclose(found, expected[np.ix_(sources, targets)])
+
+    distance, nodes = hierarchy.path(0, n - 1)
+    assert np.isclose(distance, expected[0, n - 1])
+    assert nodes[0] == 0 and nodes[-1] == n - 1
+    hops = sum(matrix[a, b] or matrix[b, a] for a, b in zip(nodes[:-1], nodes[1:]))
+    assert np.isclose(hops, distance)
+
+
+def test_matches_dijkstra_with_one_way_arcs():
+    n, u, v, length = _grid(10, seed=1)
+    # Un tiers des rues à sens unique, dans un sens tiré au hasard
+    rng = np.random.default_rng(1)
+    oneway = rng.random(u.size) < 1 / 3
+    flip = oneway & (rng.random(u.size) < 0.5)
+    u, v = np.where(flip, v, u), np.where(flip, u, v)
+    arcs_u, arcs_v = np.r_[u, v[~oneway]], np.r_[v, u[~oneway]]
+    arcs_length = np.r_[length, length[~oneway]]
+    hierarchy = ch.build_hierarchy(n, arcs_u, arcs_v, arcs_length)
+
+    matrix = sp.coo_matrix((arcs_length, (arcs_u, arcs_v)), shape=(n, n)).tocsr()
+    expected = csgraph.dijkstra(matrix, directed=True)
+    assert not np.allclose(expected, expected.T)
+    nodes = np.arange(n)
+    np.testing.assert_allclose(hierarchy.many_to_many(nodes, nodes, chunk_size=16), expected)
+
+    for a, b in [(0, n - 1), (n - 1, 0), (7, 53)]:
+        distance, route = hierarchy.path(a, b)
+        assert np.isclose(distance, expected[a, b])
+        assert route[0] == a and route[-1] == b
+        assert np.isclose(sum(matrix[x, y] for x, y in zip(route[:-1], route[1:])), distance)
+
+
+def test_disconnected_pairs_are_infinite():
+    u, v, length = np.array([0, 2]), np.array([1, 3]), np.array([5.0, 7.0])
+    hierarchy = ch.build_hierarchy(4, u, v, length)
+    assert hierarchy.distance(0, 1) == 5.0
+    assert hierarchy.distance(1, 0) == np.inf
+    assert hierarchy.distance(0, 3) == np.inf
+    assert hierarchy.path(1, 2) == (np.inf, [])
+
+
+def test_routes_on_stored_network(tmp_path, monkeypatch):
+    network = prepare.prepare_network(loader.synthetic_graph(oneway_fraction=0.3))
+    path = tmp_path / isochrones.SOURCE_FILE
+    assert isochrones.write_source({"nodes": network.nodes, "edges": network.edges}, path)
+    isochrones.write_hierarchy(path, tmp_path / isochrones.HIERARCHY_FILE)
+    source = isochrones.NetworkSource.load(path)
+    # Hiérarchie relue depuis le fichier : aucune contraction à la requête
+    monkeypatch.setattr(isochrones.NetworkSource, "build_hierarchy", None)
+    nodes = network.nodes
+    # Graphe orienté : les sens uniques ne se remontent pas
+    G = network.graph
+
+    first, last = nodes.index[0], nodes.index[-1]
+    for a, b in [(first, last), (last, first)]:
+        found = routing.route(
+            source,
+            (nodes.loc[a, "lat"], nodes.loc[a, "lon"]),
+            (nodes.loc[b, "lat"], nodes.loc[b, "lon"]),
+        )
+        expected = nx.shortest_path_length(G, a, b, weight="length")
+        assert np.isclose(found["distance_m"], expected)
+        assert found["geometry"].geom_type == "LineString"
+
+    picks = nodes.index[::5]
+    points = [(nodes.loc[n, "lat"], nodes.loc[n, "lon"]) for n in picks]
+    matrix = routing.od_matrix(source, points, points)["distances"]
+    assert not np.allclose(matrix, matrix.T)
+    for i, a in enumerate(picks):
+        lengths = nx.single_source_dijkstra_path_length(G, a, weight="length")
+        np.testing.assert_allclose(matrix[i], [lengths.get(b, np.inf) for b in picks])
@@ -0,0 +1,92 @@
+"""Tests for the streaming GeoJSON writer."""
+
+import json
+
+import geopandas as gpd
+import numpy as np
+from shapely.geometry import LineString, Point
+
+from app import map as map_mod
+from app.geojson import FeatureSource, dumps, iter_json
+
+
+def _frame():
+    return gpd.GeoDataFrame(
+        {
+            "name": ["a", None, "c"],
+            "length": [1.5, np.nan, 3.0],
+        },
+        geometry=[LineString([(0, 0), (1, 1)]), Point(2, 3), None],
+        crs="EPSG:4326",
+    )
+
+
+def test_feature_source_matches_geopandas():
+    frame = _frame()
+    expected = json.loads(frame.to_json(drop_id=True))
+    written = FeatureSource(frame, chunk_size=2).to_dict()
+
+    assert written["type"] == "FeatureCollection"
+    assert len(written["features"]) == 3
+    for ours, theirs in zip(written["features"], expected["features"]):
+        assert ours["properties"] == theirs["properties"]
+        assert ours["geometry"] == theirs["geometry"]
+
+
+def test_document_is_streamed_in_chunks():
+    frame = gpd.GeoDataFrame(
+        {"v": np.arange(2000)},
+        geometry=[Point(i, i) for i in range(2000)],
+        crs="EPSG:4326",
+    )
+    document = {"meta": {"n": np.int64(2000)}, "layer": FeatureSource(frame, chunk_size=100)}
+    chunks = list(iter_json(document, flush_bytes=4096))
+
+    assert len(chunks) > 1
+    parsed = json.loads(b"".join(chunks))
+    assert parsed["meta"]["n"] == 2000
+    assert parsed["layer"]["features"][-1]["properties"]["v"] == 1999
+    assert json.loads(dumps(document)) == parsed
+
+
+
+def test_non_finite_numbers_become_null():
+    document = {
+        "metrics": {"closeness_mean": np.nan, "betweenness_error_bound": float("inf"), "n": 3},
+        "values": [np.float64("-inf"), 1.5],
+    }
+    parsed = json.loads(dumps(document))
+    assert parsed["metrics"] == {"closeness_mean": None, "betweenness_error_bound": None, "n": 3}
+    assert parsed["values"] == [None, 1.5]
+
+def test_map_payload_classes_are_a_column():
+    edges = gpd.GeoDataFrame(
+        {"length": np.arange(10.0)},
+        geometry=[LineString([(i, 0), (i + 1, 0)]) for i in range(10)],
+        crs="EPSG:4326",
+    )
+    payload = map_mod.build_map_payload({"edges": edges}, color_by="length")
+    features = payload["geojson"].to_dict()["features"]
+    quantiles = payload["quantiles"]
+
+    for feature in features:
+        value = feature["properties"]["length"]
+        colour = payload["palette"][feature["properties"]["class"]]
+        assert colour == map_mod._color_for(value, quantiles)
+
+
+def test_map_payload_is_quantised_and_thinned():
+    edges = gpd.GeoDataFrame(
+        {"length": [1000.0, 2.0]},
+        geometry=[
+            LineString([(7.4212345678, 43.7312345678), (7.4312345678, 43.7412345678)]),
+            LineString([(7.40, 43.70), (7.40002, 43.70)]),
+        ],
+        crs="EPSG:4326",
+    )
+    full = map_mod.build_map_payload({"edges": edges})["geojson"].to_dict()["features"]
+    assert full[0]["geometry"]["coordinates"][0] == [7.421235, 43.731235]
+    assert len(full) == 2
+
+    thinned = map_mod.build_map_payload({"edges": edges}, zoom=12)["geojson"].to_dict()["features"]
+    assert [f["properties"]["length"] for f in thinned] == [1000.0]
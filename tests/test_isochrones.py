@@ -0,0 +1,81 @@
+"""Tests for isochrones on a stored network."""
+
+import networkx as nx
+import numpy as np
+import shapely
+from pyproj import Transformer
+
+from app import isochrones
+from grafos import loader, prepare
+
+
+def _source(tmp_path, **irregularity):
+    network = prepare.prepare_network(loader.synthetic_graph(**irregularity))
+    path = tmp_path / isochrones.SOURCE_FILE
+    assert isochrones.write_source({"nodes": network.nodes, "edges": network.edges}, path)
+    return network, isochrones.NetworkSource.load(path)
+
+
+def test_isochrone_covers_reached_nodes(tmp_path):
+    network, source = _source(tmp_path)
+    G, nodes = network.graph, network.nodes
+    origin = nodes.index[len(nodes) // 2]
+    lat, lon = nodes.loc[origin, "lat"], nodes.loc[origin, "lon"]
+
+    found = isochrones.isochrones(source, [lat], [lon], [150.0, 400.0], buffer_m=10)
+    assert found["snap_distances"][0] < 1e-6
+    small, large = found["polygons"]
+    assert found["areas"][0] < found["areas"][1]
+    assert shapely.contains(large, small.buffer(-1e-6))
+
+    dist = nx.single_source_dijkstra_path_length(G.to_undirected(), origin, weight="length")
+    to_wgs84 = Transformer.from_crs(network.crs, 4326, always_xy=True)
+    for node, d in dist.items():
+        x, y = to_wgs84.transform(nodes.loc[node, "x"], nodes.loc[node, "y"])
+        inside = shapely.intersects(small, shapely.Point(x, y))
+        if d <= 140:
+            assert inside
+        elif d >= 200:
+            assert not inside
+
+
+def test_several_origins_share_one_search(tmp_path):
+    network, source = _source(tmp_path)
+    nodes = network.nodes
+    first, last = nodes.index[0], nodes.index[-1]
+    found = isochrones.isochrones(
+        source,
+        [nodes.loc[first, "lat"], nodes.loc[last, "lat"]],
+        [nodes.loc[first, "lon"], nodes.loc[last, "lon"]],
+        [100.0],
+    )
+    single = isochrones.isochrones(source, [nodes.loc[first, "lat"]], [nodes.loc[first, "lon"]], [100.0])
+    assert len(found["snapped"]) == 2
+    assert found["areas"][0] > single["areas"][0]
+    assert np.isfinite(found["areas"]).all()
+
+
+def test_isochrone_follows_one_way_streets(tmp_path):
+    network, source = _source(tmp_path, oneway_fraction=0.5, seed=0)
+    G, nodes = network.graph, network.nodes
+    assert not source.forward.all() or not source.backward.all()
+    origin = nodes.index[len(nodes) // 2]
+    lat, lon = nodes.loc[origin, "lat"], nodes.loc[origin, "lon"]
+
+    # Distances du Dijkstra orienté identiques à celles de networkx
+    position = nodes.index.get_loc(origin)
+    dist = isochrones.csgraph.dijkstra(source.matrix, directed=True, indices=position)
+    expected = nx.single_source_dijkstra_path_length(G, origin, weight="length")
+    reached = {nodes.index[i]: d for i, d in enumerate(dist) if np.isfinite(d)}
+    assert reached.keys() == expected.keys()
+    assert np.allclose([reached[n] for n in expected], list(expected.values()))
+
+    found = isochrones.isochrones(source, [lat], [lon], [150.0], buffer_m=10)
+    undirected = nx.single_source_dijkstra_path_length(G.to_undirected(), origin, weight="length")
+    to_wgs84 = Transformer.from_crs(network.crs, 4326, always_xy=True)
+    # Nœuds proches à vol d'oiseau mais seulement joignables à contresens
+    against = [n for n, d in undirected.items() if d <= 100 and expected.get(n, np.inf) >= 250]
+    assert against
+    for node in against:
+        x, y = to_wgs84.transform(nodes.loc[node, "x"], nodes.loc[node, "y"])
+        assert not shapely.intersects(found["polygons"][0], shapely.Point(x, y))
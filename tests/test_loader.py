@@ -2,7 +2,7 @@
 
 import pytest
 
-from grafos import loader
+from grafos import geocode, loader
 
 
 def test_synthetic_graph_shape():
@@ -32,3 +32,50 @@ def test_get_graph_allows_synthetic(monkeypatch):
     monkeypatch.setattr(loader, "load_city_graph", always_fail)
     G = loader.get_graph("Nowhere", fallback_to_synthetic=True)
     assert G.number_of_nodes() > 0
+
+
+def test_parse_latlon():
+    assert geocode.parse_latlon("43.7384, 7.4246") == (43.7384, 7.4246)
+    assert geocode.parse_latlon("(-33.45 -70.66)") == (-33.45, -70.66)
+    assert geocode.parse_latlon("Monaco, Monaco") is None
+    assert geocode.parse_latlon("120, 7") is None
+
+
+def test_geocode_cache_ttl(tmp_path, monkeypatch):
+    calls = []
+
+    def fake_geocode(query):
+        calls.append(query)
+        return (43.7, 7.4)
+
+    monkeypatch.setattr(geocode.ox, "geocode", fake_geocode)
+    cache = geocode.GeocodeCache(tmp_path / "geocode.json", ttl=60)
+    assert geocode.resolve("Monaco", cache=cache) == (43.7, 7.4)
+    assert geocode.resolve(" monaco ", cache=cache) == (43.7, 7.4)
+    assert geocode.resolve("1.5,2.5", cache=cache) == (1.5, 2.5)
+    assert calls == ["Monaco"]
+
+    reloaded = geocode.GeocodeCache(tmp_path / "geocode.json", ttl=0)
+    assert reloaded.get("Monaco") is None
+
+
+def test_geocode_cache_merges_concurrent_writers(tmp_path):
+    path = tmp_path / "geocode.json"
+    first = geocode.GeocodeCache(path)
+    second = geocode.GeocodeCache(path)
+    first.put("Monaco", (43.7, 7.4))
+    second.put("Nice", (43.7, 7.26))
+    reloaded = geocode.GeocodeCache(path)
+    assert reloaded.get("Monaco") == (43.7, 7.4)
+    assert reloaded.get("Nice") == (43.7, 7.26)
+    assert [p.name for p in tmp_path.iterdir() if not p.name.endswith(".lock")] == ["geocode.json"]
+
+
+def test_geocode_cache_sees_other_writers_on_lookup(tmp_path, monkeypatch):
+    path = tmp_path / "geocode.json"
+    reader = geocode.GeocodeCache(path)
+    assert reader.get("Monaco") is None
+    geocode.GeocodeCache(path).put("Monaco", (43.7, 7.4))
+
+    monkeypatch.setattr(geocode.ox, "geocode", lambda q: pytest.fail("Nominatim queried"))
+    assert geocode.resolve("monaco", cache=reader) == (43.7, 7.4)
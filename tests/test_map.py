@@ -0,0 +1,86 @@
+"""Tests for the colour classification of the map layers."""
+
+import itertools
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pytest
+
+from app import map as map_mod
+from grafos import loader, prepare
+
+
+def _ssd(values):
+    return float(((values - values.mean()) ** 2).sum()) if values.size else 0.0
+
+
+def test_jenks_matches_exhaustive_search():
+    rng = np.random.default_rng(3)
+    values = np.sort(np.concatenate([rng.normal(0, 1, 5), rng.normal(10, 1, 5), rng.normal(30, 2, 4)]))
+    k = 3
+    best = min(
+        itertools.combinations(range(1, values.size), k - 1),
+        key=lambda cuts: sum(_ssd(part) for part in np.split(values, cuts)),
+    )
+    expected = [values[c - 1] for c in best]
+    assert map_mod.class_breaks(values, "jenks", k=k) == pytest.approx(expected)
+
+
+def test_classes_follow_thresholds_for_every_scheme():
+    series = pd.Series(np.random.default_rng(0).lognormal(size=500))
+    for scheme in map_mod.SCHEMES:
+        thresholds = map_mod.class_breaks(series, scheme)
+        assert len(thresholds) == len(map_mod.DEFAULT_COLORS) - 1
+        assert thresholds == sorted(thresholds)
+        classes = map_mod.color_classes(series, thresholds)
+        expected = [map_mod.DEFAULT_COLORS.index(map_mod._color_for(v, thresholds)) for v in series]
+        assert classes.tolist() == expected
+
+    equal = map_mod.class_breaks(pd.Series([0.0, 10.0]), "equal")
+    assert equal == pytest.approx([2.0, 4.0, 6.0, 8.0])
+    log = map_mod.class_breaks(pd.Series([1.0, 100000.0]), "log")
+    assert log == pytest.approx([10.0, 100.0, 1000.0, 10000.0])
+
+
+def test_constant_column_has_single_class():
+    series = pd.Series([4.0] * 10)
+    assert map_mod.class_breaks(series) is None
+    assert set(map_mod.color_classes(series, None)) == {len(map_mod.DEFAULT_COLORS) // 2}
+    with pytest.raises(ValueError):
+        map_mod.class_breaks(pd.Series([1.0, 2.0]), "unknown")
+
+
+def test_payload_reuses_wgs84_geometries(monkeypatch):
+    network = prepare.prepare_network(loader.synthetic_graph())
+    result = {"edges": network.edges, "edges_wgs84": network.edges_wgs84}
+    calls = []
+    original = gpd.GeoDataFrame.to_crs
+
+    def spy(self, *args, **kwargs):
+        calls.append(args or kwargs)
+        return original(self, *args, **kwargs)
+
+    monkeypatch.setattr(gpd.GeoDataFrame, "to_crs", spy)
+    payload = map_mod.build_map_payload(result, zoom=14)
+    features = payload["geojson"].to_dict()["features"]
+    assert calls == []
+    assert len(features) == len(network.edges)
+    assert -180 <= features[0]["geometry"]["coordinates"][0][0] <= 180
+
+    assert "geojson" not in map_mod.build_map_payload(result, geojson=False)
+
+
+def test_payload_uses_precomputed_levels(monkeypatch):
+    from app import lod
+
+    network = prepare.prepare_network(loader.synthetic_graph())
+    result = {"edges": network.edges, "edges_wgs84": network.edges_wgs84}
+    expected = map_mod.build_map_payload(result, zoom=12)["geojson"].to_dict()
+    result["lod"] = lod.LevelsOfDetail.from_wgs84(np.asarray(network.edges_wgs84))
+
+    def fail(*args, **kwargs):
+        raise AssertionError("levels rebuilt")
+
+    monkeypatch.setattr(lod.LevelsOfDetail, "build", fail)
+    assert map_mod.build_map_payload(result, zoom=12)["geojson"].to_dict() == expected
@@ -1,8 +1,13 @@
 """Tests for the metrics computation module."""
 
+import geopandas as gpd
+import networkx as nx
+import numpy as np
 import osmnx as ox
+import pandas as pd
+import pytest
 
-from grafos import loader, metrics
+from grafos import loader, metrics, prepare
 
 
 def _sample_edges():
@@ -56,6 +61,34 @@ def test_attach_node_metrics_to_edges():
         assert column in enriched.columns
 
 
+def test_attach_node_metrics_aggregations():
+    G = loader.synthetic_graph()
+    _, edges = ox.graph_to_gdfs(G, nodes=True, edges=True, fill_edge_geometry=True)
+    nodes = list(G.nodes)
+    node_df = pd.DataFrame({"node": nodes[:-1], "degree": np.arange(len(nodes) - 1, dtype=float)})
+    position = {node: i for i, node in enumerate(nodes[:-1])}
+
+    # Index (u, v, key) d'osmnx, sans colonnes u/v
+    means = metrics.attach_node_metrics_to_edges(edges, node_df)
+    assert "degree" not in edges.columns
+    assert np.shares_memory(np.asarray(means.geometry), np.asarray(edges.geometry))
+    lows = metrics.attach_node_metrics_to_edges(edges, node_df, how="min")
+    highs = metrics.attach_node_metrics_to_edges(edges, node_df, how="max")
+    for (u, v, _), mean, low, high in zip(edges.index, means["degree"], lows["degree"], highs["degree"]):
+        known = [position[n] for n in (u, v) if n in position]
+        assert mean == pytest.approx(np.mean(known))
+        assert low == min(known) and high == max(known)
+
+    weighted = metrics.attach_node_metrics_to_edges(edges, node_df, how="length_weighted")
+    assert weighted["degree"].between(lows["degree"], highs["degree"]).all()
+
+    frame = edges.copy(deep=False)
+    assert metrics.attach_node_metrics_to_edges(frame, node_df, inplace=True) is frame
+    assert "degree" in frame.columns
+    with pytest.raises(ValueError):
+        metrics.attach_node_metrics_to_edges(edges, node_df, how="median")
+
+
 def test_add_edge_betweenness():
     G, _, edges = _sample_edges()
     enriched = metrics.add_edge_betweenness(G, edges)
@@ -66,3 +99,187 @@ def test_aggregate_h3_structure():
     _, _, edges = _sample_edges()
     h3_gdf = metrics.aggregate_h3(edges, res=7)
     assert set(["h3", "length_km"]).issubset(h3_gdf.columns)
+
+
+def test_aggregate_h3_splits_length_across_cells():
+    from shapely.geometry import LineString
+
+    lines = gpd.GeoDataFrame(
+        {"betweenness": [0.2, 0.8]},
+        geometry=[
+            LineString([(7.40, 43.73), (7.46, 43.74)]),
+            LineString([(7.420, 43.731), (7.421, 43.731)]),
+        ],
+        crs="EPSG:4326",
+    ).to_crs(32632)
+    lines["length"] = lines.length
+
+    h3_gdf = metrics.aggregate_h3(lines, res=9)
+    # Longueur conservée, répartie sur toutes les cellules traversées
+    assert h3_gdf["length_m"].sum() == pytest.approx(lines["length"].sum())
+    assert len(h3_gdf) > 10
+    assert h3_gdf["length_m"].max() < 0.2 * lines["length"].iloc[0]
+    assert h3_gdf["betweenness_max"].max() == pytest.approx(0.8)
+    shared = h3_gdf[h3_gdf["betweenness_max"] == 0.8]
+    assert (shared["betweenness_mean"] >= 0.2).all()
+    assert (shared["betweenness_mean"] <= 0.8).all()
+
+
+def test_aggregate_h3_intersects_cell_polygons(monkeypatch):
+    from shapely.geometry import LineString
+
+    from grafos import projection
+
+    # Segment court en diagonale : traverse des cellules sans y avoir de sommet
+    lines = gpd.GeoDataFrame(
+        geometry=[LineString([(7.4200, 43.7300), (7.4230, 43.7320)])], crs="EPSG:4326"
+    ).to_crs(32632)
+    h3_gdf = metrics.aggregate_h3(lines, res=11)
+    assert h3_gdf["length_m"].sum() == pytest.approx(lines.length.sum())
+    assert len(h3_gdf) >= 5
+
+    # Polygones projetés réutilisés au second appel
+    calls = []
+    original = projection.transform_geometries
+    monkeypatch.setattr(
+        projection, "transform_geometries", lambda g, *a: calls.append(len(g)) or original(g, *a)
+    )
+    again = metrics.aggregate_h3(lines, res=11)
+    assert calls == [1]
+    assert again["h3"].tolist() == h3_gdf["h3"].tolist()
+
+
+def test_aggregate_h3_fine_resolution_follows_the_network(monkeypatch):
+    import h3
+    from shapely.geometry import box
+
+    # Quadrillage lâche de 4 km : la boîte englobante est surtout vide
+    G = loader.synthetic_graph(size_m=4000, step_m=500)
+    edges = prepare.prepare_network(G).edges
+    searched = []
+    original = metrics._projected_cell_polygons
+    monkeypatch.setattr(
+        metrics, "_projected_cell_polygons", lambda cells, crs: searched.append(len(cells)) or original(cells, crs)
+    )
+    h3_gdf = metrics.aggregate_h3(edges, res=11)
+
+    assert h3_gdf["length_m"].sum() == pytest.approx(edges["length"].sum())
+    assert h3_gdf["h3"].map(h3.h3_get_resolution).eq(11).all()
+    bbox = box(*edges.to_crs(4326).total_bounds)
+    in_bbox = len(h3.polyfill(bbox.__geo_interface__, 11, geo_json_conformant=True))
+    assert searched[0] < 3 * len(h3_gdf) < in_bbox
+
+
+def test_build_csr_matches_undirected_graph():
+    G, _, _ = _sample_edges()
+    csr = metrics.build_csr(G)
+    Gu = G.to_undirected()
+    assert csr.n_nodes == Gu.number_of_nodes()
+    assert csr.n_edges == G.number_of_edges()
+    degrees = dict(Gu.degree())
+    assert [degrees[n] for n in csr.nodes] == csr.degree.tolist()
+    assert csr.indices.size == 2 * nx.Graph(Gu).number_of_edges()
+
+
+def test_metrics_accept_shared_csr():
+    G, _, edges = _sample_edges()
+    csr = metrics.build_csr(G)
+    assert metrics.compute_metrics(G, csr=csr) == metrics.compute_metrics(G)
+    df = metrics.node_centralities(G, closeness=True, degree=True, csr=csr)
+    expected = nx.closeness_centrality(G.to_undirected(), wf_improved=True)
+    for node, value in zip(df["node"], df["closeness"]):
+        assert abs(expected[node] - value) < 1e-12
+    enriched = metrics.add_edge_betweenness(G, edges, csr=csr)
+    assert "betweenness" in enriched.columns
+
+
+def test_parallel_centralities_match_serial():
+    G, _, _ = _sample_edges()
+    csr = metrics.build_csr(G)
+    serial = metrics.node_centralities(G, straightness=True, csr=csr, workers=1)
+    parallel = metrics.node_centralities(G, straightness=True, csr=csr, workers=2)
+    for column in ["closeness", "straightness"]:
+        assert serial[column].tolist() == parallel[column].tolist()
+
+
+def test_local_straightness_respects_radius():
+    G = prepare.prepare_graph(loader.synthetic_graph())
+    csr = metrics.build_csr(G)
+    full = metrics.node_centralities(G, closeness=False, straightness=True, csr=csr)
+    local = metrics.node_centralities(
+        G, closeness=False, straightness=True, csr=csr, straightness_radius=150
+    )
+    # Dans un rayon d'une seule maille, seuls les voisins directs comptent
+    assert local["straightness"].between(0.99, 1.01).all()
+    assert not full["straightness"].equals(local["straightness"])
+
+
+def test_average_shortest_path_sampled_bounds_exact():
+    G = loader.synthetic_graph(size_m=2000)
+    csr = metrics.build_csr(G)
+    exact = metrics.average_shortest_path(csr, mode="exact")
+    sampled = metrics.average_shortest_path(csr, mode="sampled", samples=120)
+    assert exact["exact"] and exact["samples"] == csr.n_nodes
+    assert not sampled["exact"] and sampled["samples"] == 120
+    assert sampled["ci_low"] <= exact["estimate"] <= sampled["ci_high"]
+
+
+def test_average_shortest_path_uses_largest_component():
+    G = loader.synthetic_graph()
+    G.add_edge("island_a", "island_b", length=10.0)
+    csr = metrics.build_csr(G)
+    result = metrics.compute_metrics(G, csr=csr)
+    assert result["components"] == 2
+    assert result["avg_shortest_path_m"] > 0
+    assert result["avg_shortest_path_samples"] == result["largest_component_nodes"]
+
+
+def test_edge_betweenness_matches_networkx():
+    G, _, edges = _sample_edges()
+    u, v, _ = next(iter(G.edges(keys=True)))
+    G.add_edge(u, v, length=500.0)  # parallel edge never on a shortest path
+    csr = metrics.build_csr(G)
+    expected = nx.edge_betweenness_centrality(G.to_undirected(), weight="length")
+    enriched = metrics.add_edge_betweenness(G, edges, csr=csr, k=csr.n_nodes, workers=2)
+    for (a, b, key), value in enriched.set_index(["u", "v", "key"])["betweenness"].items():
+        reference = expected.get((a, b, key), expected.get((b, a, key)))
+        assert abs(reference - value) < 1e-12
+
+
+def test_adaptive_betweenness_reports_bound():
+    G = loader.synthetic_graph(size_m=1600)
+    csr = metrics.build_csr(G)
+    exact, info = metrics.edge_betweenness(csr)
+    assert info["samples"] == csr.n_nodes and info["error_bound"] == 0.0
+    values, info = metrics.edge_betweenness(csr, epsilon=0.02, confidence=0.95)
+    assert 0 < info["samples"] <= csr.n_nodes
+    assert info["error_bound"] <= 0.02
+    assert abs(values - exact).max() <= 0.05
+
+
+def test_local_accessibility_matches_bounded_dijkstra():
+    G = prepare.prepare_graph(loader.synthetic_graph())
+    csr = metrics.build_csr(G)
+    radius, beta = 250.0, 0.004
+    table = metrics.node_centralities(
+        G,
+        closeness=False,
+        degree=False,
+        csr=csr,
+        reach=True,
+        gravity=True,
+        local_closeness=True,
+        access_radius=radius,
+        gravity_beta=beta,
+    ).set_index("node")
+
+    Gu = nx.Graph()
+    for u, v, length in G.edges(data="length"):
+        if not Gu.has_edge(u, v) or Gu[u][v]["length"] > length:
+            Gu.add_edge(u, v, length=length)
+    for node in list(G.nodes)[::7]:
+        dist = nx.single_source_dijkstra_path_length(Gu, node, cutoff=radius, weight="length")
+        others = np.array([d for target, d in dist.items() if target != node])
+        assert table.loc[node, "reach"] == len(others)
+        assert table.loc[node, "gravity"] == pytest.approx(np.exp(-beta * others).sum())
+        assert table.loc[node, "local_closeness"] == pytest.approx(len(others) / others.sum())
@@ -0,0 +1,159 @@
+"""Tests for hedged Overpass requests against local stand-in servers."""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from grafos import overpass
+
+
+def _serve(delay=0.0, status=200, limited=0, retry_after=None):
+    calls = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            calls.append(time.monotonic())
+            time.sleep(delay)
+            body = json.dumps({"elements": [], "server": self.server.server_port}).encode()
+            # Les ``limited`` premières requêtes reçoivent un 429
+            code = 429 if len(calls) <= limited else status
+            try:
+                self.send_response(code)
+                if code == 429 and retry_after is not None:
+                    self.send_header("Retry-After", str(retry_after))
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            except OSError:
+                pass
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.calls = calls
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/api/interpreter"
+
+
+@pytest.fixture
+def servers():
+    started = []
+
+    def start(**kwargs):
+        server, url = _serve(**kwargs)
+        started.append(server)
+        return server.server_port, url
+
+    yield start
+    for server in started:
+        server.shutdown()
+        server.server_close()
+
+
+def _fetcher(endpoints, health, delay=0.2, pause=0.1):
+    return overpass.HedgedFetcher(
+        endpoints, hedge_delay=delay, timeout=10, health=health, use_cache=False, rate_limit_pause=pause
+    )
+
+
+def test_hedge_beats_slow_primary(servers):
+    _, slow = servers(delay=1.5)
+    fast_port, fast = servers()
+    health = overpass.EndpointHealth()
+    start = time.monotonic()
+    payload = _fetcher([slow, fast], health).fetch({"data": "[out:json];"})
+    assert payload["server"] == fast_port
+    assert time.monotonic() - start < 1.0
+    # Le miroir rapide passe devant pour les requêtes suivantes
+    assert health.rank([slow, fast]) == [fast, slow]
+
+
+def test_failing_endpoint_falls_through_and_ranks_last(servers):
+    _, failing = servers(status=500)
+    ok_port, ok = servers()
+    health = overpass.EndpointHealth()
+    fetcher = _fetcher([failing, ok], health, delay=30)
+    start = time.monotonic()
+    assert fetcher.fetch({"data": "q"})["server"] == ok_port
+    assert time.monotonic() - start < 5.0
+    assert fetcher.attempted == [failing, ok]
+    assert health.rank([failing, ok]) == [ok, failing]
+    assert health.snapshot()[failing]["failures"] == 1
+
+
+def test_all_endpoints_failing(servers):
+    _, first = servers(status=429)
+    _, second = servers(status=504)
+    with pytest.raises(overpass.OverpassFetchError) as info:
+        _fetcher([first, second], overpass.EndpointHealth()).fetch({"data": "q"})
+    assert set(info.value.endpoints) == {first, second}
+    # Chaque endpoint surchargé est réessayé une fois après sa pause
+    assert len(info.value.errors) == 4
+
+
+def test_rate_limited_endpoint_is_retried_after_retry_after():
+    server, url = _serve(limited=1, retry_after=1)
+    try:
+        health = overpass.EndpointHealth()
+        payload = _fetcher([url], health).fetch({"data": "q"})
+        assert payload["server"] == server.server_port
+        assert len(server.calls) == 2
+        assert server.calls[1] - server.calls[0] >= 0.9
+        # Une pause n'est pas une panne
+        assert health.snapshot()[url]["failures"] == 0
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_paused_endpoint_ranks_last():
+    health = overpass.EndpointHealth()
+    health.record_success("a", 0.1)
+    health.record_success("b", 0.5)
+    health.record_rate_limited("a", 30)
+    assert health.rank(["a", "b"]) == ["b", "a"]
+    assert 29 < health.pause_remaining("a") <= 30
+
+
+def test_retry_after_parsing():
+    assert overpass._retry_after("3") == 3.0
+    assert overpass._retry_after("soon") is None
+    assert overpass._retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+
+
+def test_use_fetcher_routes_osmnx_requests(servers):
+    port, url = servers()
+    fetcher = _fetcher([url], overpass.EndpointHealth())
+    with overpass.use_fetcher(fetcher):
+        payload = overpass._overpass._overpass_request(data={"data": "q"})
+    assert payload["server"] == port
+
+
+def test_import_leaves_osmnx_untouched():
+    import os
+    import subprocess
+    import sys
+
+    code = (
+        "from osmnx import _overpass; original = _overpass._overpass_request; "
+        "import grafos.overpass; assert _overpass._overpass_request is original"
+    )
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.run([sys.executable, "-c", code], check=True, cwd=root)
+
+
+def test_invalid_hedge_delay_falls_back_to_default(monkeypatch):
+    from grafos import loader
+
+    for value in ("soon", "-1", "nan"):
+        monkeypatch.setenv("OVERPASS_HEDGE_DELAY", value)
+        assert loader._hedge_delay() == loader.DEFAULT_HEDGE_DELAY
+    monkeypatch.setenv("OVERPASS_HEDGE_DELAY", "2.5")
+    assert loader._hedge_delay() == 2.5
@@ -0,0 +1,56 @@
+"""Tests for the memoised analysis stages."""
+
+import numpy as np
+
+from app import analysis
+from app.pipeline import StageCache
+from grafos import loader, metrics
+
+
+def test_stage_cache_evicts_least_recently_used():
+    cache = StageCache(max_bytes=3 * 800)
+    for name in "abc":
+        cache.put(name, np.zeros(100))
+    cache.get("a")
+    cache.put("d", np.zeros(100))
+
+    assert "a" in cache and "d" in cache
+    assert "b" not in cache
+    assert cache.stats()["bytes"] <= cache.max_bytes
+
+
+def test_changed_flag_only_computes_missing_stage(monkeypatch, tmp_path):
+    monkeypatch.setenv("RESULT_STORE_DIR", str(tmp_path))
+    def always_fail(*args, **kwargs):
+        raise loader.OpenStreetMapUnavailable("city", "walk", 500, tuple(), tuple())
+
+    monkeypatch.setattr(loader, "load_city_graph", always_fail)
+    calls = []
+    original = metrics.node_centralities
+
+    def counting(G, **kwargs):
+        calls.append(tuple(k for k in ("closeness", "degree", "straightness", "eigenvector") if kwargs.get(k)))
+        return original(G, **kwargs)
+
+    monkeypatch.setattr(metrics, "node_centralities", counting)
+    cache = StageCache()
+    params = dict(
+        city="Nowhere",
+        mode="walk",
+        radius_km=0.5,
+        do_centrality=True,
+        do_closeness=True,
+        do_degree=False,
+        do_h3=False,
+        allow_synthetic=True,
+        cache=cache,
+    )
+
+    first = analysis._compute(**params)
+    misses = cache.stats()["misses"]
+    second = analysis._compute(**{**params, "do_eigenvector": True})
+
+    assert calls == [("closeness",), ("eigenvector",)]
+    # Seule l'entrée « eigenvector » manque au second appel
+    assert cache.stats()["misses"] == misses + 1
+    assert first["metrics"]["betweenness_mean"] == second["metrics"]["betweenness_mean"]
@@ -0,0 +1,45 @@
+"""Tests for the single-pass projection of street networks."""
+
+import numpy as np
+import osmnx as ox
+import shapely
+
+from grafos import loader, projection
+
+
+def test_project_graph_matches_osmnx():
+    G = loader.synthetic_graph()
+    expected = ox.project_graph(G)
+    projected = projection.project_graph(G)
+
+    assert projected.graph["crs"].is_projected
+    assert G.graph["crs"] == "EPSG:4326"  # copie par défaut
+    for node, data in expected.nodes(data=True):
+        assert np.isclose(projected.nodes[node]["x"], data["x"], atol=1e-6)
+        assert np.isclose(projected.nodes[node]["y"], data["y"], atol=1e-6)
+        assert projected.nodes[node]["lon"] == G.nodes[node]["x"]
+
+
+def test_project_network_keeps_both_geometries():
+    G = loader.synthetic_graph()
+    nodes, edges = ox.graph_to_gdfs(G, nodes=True, edges=True, fill_edge_geometry=True)
+
+    network = projection.project_network(G)
+    expected = edges.to_crs(network.crs)
+
+    assert network.crs == projection.local_utm_crs(nodes["x"], nodes["y"])
+    assert network.edges.crs == network.crs
+    assert network.graph is G and G.graph["crs"] == network.crs
+    assert all(shapely.equals_exact(network.edges_wgs84, np.asarray(edges.geometry), 0))
+    assert all(
+        shapely.equals_exact(np.asarray(network.edges.geometry), np.asarray(expected.geometry), 1e-6)
+    )
+    assert np.allclose(network.nodes["lon"], nodes["x"])
+    node = next(iter(G.nodes))
+    assert G.nodes[node]["x"] == network.nodes.loc[node, "x"]
+
+    lat, lon = projection.centre_wgs84(network.edges)
+    assert np.isclose(lat, nodes["y"].mean(), atol=1e-4)
+    assert np.isclose(lon, nodes["x"].mean(), atol=1e-4)
+    restored = projection.wgs84_frame(network.edges, network.edges_wgs84)
+    assert restored.crs.to_epsg() == 4326
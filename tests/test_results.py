@@ -0,0 +1,35 @@
+"""Tests for the content-addressed result store."""
+
+import gzip
+
+import geopandas as gpd
+from shapely.geometry import LineString
+
+from app.results import ResultStore
+
+
+def _result(length=1.0):
+    edges = gpd.GeoDataFrame(
+        {"length": [length]}, geometry=[LineString([(0, 0), (1, 1)])], crs="EPSG:4326"
+    )
+    return {"edges": edges, "metrics_csv": "indicateur,valeur\nnodes,2\n"}
+
+
+def test_identical_results_share_one_entry(tmp_path):
+    store = ResultStore(tmp_path)
+    first = store.save(_result())
+    assert store.save(_result()) == first
+    assert store.save(_result(length=2.0)) != first
+    assert store.path(first, "edges.geojson").read_bytes().startswith(b'{"type":"FeatureCollection"')
+    assert store.path(first, "h3.geojson") is None
+    assert store.path(first, "../secret") is None
+
+
+def test_compressed_variant_and_pruning(tmp_path):
+    store = ResultStore(tmp_path, max_entries=2)
+    ids = [store.save(_result(length=float(i))) for i in range(3)]
+    path = store.path(ids[-1], "edges.geojson")
+
+    encoded = store.encoded(path, "gzip")
+    assert gzip.decompress(encoded.read_bytes()) == path.read_bytes()
+    assert store.path(ids[0], "edges.geojson") is None
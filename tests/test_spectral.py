@@ -0,0 +1,67 @@
+"""Tests for the sparse spectral centralities."""
+
+import networkx as nx
+import numpy as np
+import pytest
+
+from grafos import csr, loader, metrics, prepare, spectral
+
+
+def _graphs():
+    G = prepare.prepare_graph(loader.synthetic_graph())
+    graph = csr.build_csr(G)
+    U = nx.Graph()
+    for a, b, data in G.to_undirected().edges(data=True):
+        weight = U.get_edge_data(a, b, {"weight": 0.0})["weight"]
+        U.add_edge(a, b, weight=weight + 1.0 / max(data["length"], 1.0))
+    return graph, U
+
+
+def _aligned(graph, values):
+    return np.array([values[node] for node in graph.nodes])
+
+
+def test_matches_networkx_with_inverse_length():
+    graph, U = _graphs()
+
+    found = spectral.eigenvector(graph)
+    assert found.converged
+    expected = nx.eigenvector_centrality_numpy(U, weight="weight")
+    np.testing.assert_allclose(found.values, _aligned(graph, expected), atol=1e-9)
+
+    found = spectral.pagerank(graph, damping=0.9)
+    assert found.converged and found.values.sum() == pytest.approx(1.0)
+    expected = nx.pagerank(U, alpha=0.9, weight="weight", tol=1e-12, max_iter=1000)
+    np.testing.assert_allclose(found.values, _aligned(graph, expected), atol=1e-9)
+
+    found = spectral.katz(graph, alpha=0.5)
+    largest = np.linalg.eigvalsh(nx.to_numpy_array(U, nodelist=list(graph.nodes))).max()
+    expected = nx.katz_centrality_numpy(U, alpha=0.5 / largest, weight="weight")
+    np.testing.assert_allclose(found.values, _aligned(graph, expected), atol=1e-9)
+
+
+def test_warm_start_and_diagnostics():
+    graph, _ = _graphs()
+    warm = spectral.WarmStarts()
+    cold = spectral.pagerank(graph, warm_key="g", warm_starts=warm)
+    again = spectral.pagerank(graph, damping=0.8, warm_key="g", warm_starts=warm)
+    assert not cold.warm_start and again.warm_start
+    assert again.iterations < cold.iterations
+
+    stopped = spectral.pagerank(graph, max_iter=2)
+    assert not stopped.converged
+    assert stopped.values.sum() == pytest.approx(1.0)
+    assert stopped.diagnostics()["residual"] > 0
+
+    with pytest.raises(ValueError):
+        spectral.adjacency(graph, "width")
+
+
+def test_node_centralities_reports_diagnostics():
+    G = prepare.prepare_graph(loader.synthetic_graph())
+    df = metrics.node_centralities(
+        G, closeness=False, degree=False, eigenvector=True, pagerank=True, katz=True, spectral_weight="unit"
+    )
+    assert set(df.attrs["spectral"]) == {"eigenvector", "pagerank", "katz"}
+    assert all(d["converged"] for d in df.attrs["spectral"].values())
+    assert (df[["eigenvector", "pagerank", "katz"]] > 0).all().all()
@@ -0,0 +1,92 @@
+"""Tests for the persistent graph store."""
+
+from concurrent.futures import ProcessPoolExecutor
+
+from grafos import loader
+from grafos.store import GraphStore, normalise_key
+
+
+def test_normalise_key():
+    assert normalise_key("  Monaco,  MONACO ", "Walk", 1000.0) == "monaco, monaco|walk|1000"
+
+
+def test_round_trip_preserves_graph(tmp_path):
+    G = loader.synthetic_graph()
+    G.graph["simplified"] = True
+    u, v, k = next(iter(G.edges(keys=True)))
+    G.edges[u, v, k]["highway"] = ["residential", "footway"]
+    store = GraphStore(tmp_path)
+    store.put("Monaco", "walk", 800, G)
+
+    loaded = store.get("monaco", "walk", 800)
+    assert loaded is not None
+    assert list(loaded.nodes(data=True)) == list(G.nodes(data=True))
+    assert loaded.graph == G.graph
+    for (a, b, key, data), (c, d, key2, data2) in zip(
+        G.edges(keys=True, data=True), loaded.edges(keys=True, data=True)
+    ):
+        assert (a, b, key) == (c, d, key2)
+        assert data["length"] == data2["length"]
+        assert data["geometry"].equals(data2["geometry"])
+    assert loaded.edges[u, v, k]["highway"] == ["residential", "footway"]
+
+
+def test_lru_eviction_and_stats(tmp_path):
+    G = loader.synthetic_graph()
+    store = GraphStore(tmp_path)
+    size = store.put("a", "walk", 1, G).stat().st_size
+    store.max_bytes = int(size * 2.5)
+    store.put("b", "walk", 1, G)
+    assert store.get("a", "walk", 1) is not None  # « a » devient le plus récent
+    store.put("c", "walk", 1, G)
+
+    assert store.get("b", "walk", 1) is None
+    assert store.get("a", "walk", 1) is not None
+    stats = store.stats()
+    assert stats["entries"] == 2
+    assert stats["evictions"] == 1
+    assert stats["hits"] == 2 and stats["misses"] == 1
+
+
+def test_get_graph_uses_store(tmp_path, monkeypatch):
+    calls = []
+
+    def fake_load(city, mode, distance, point=None):
+        calls.append(city)
+        return loader.synthetic_graph()
+
+    monkeypatch.setattr(loader, "load_city_graph", fake_load)
+    store = GraphStore(tmp_path)
+    first = loader.get_graph("Monaco", distance=800, store=store)
+    second = loader.get_graph("monaco ", distance=800, store=store)
+    assert calls == ["Monaco"]
+    assert second.number_of_edges() == first.number_of_edges()
+
+
+def test_corrupt_file_is_evicted_and_reloaded(tmp_path, monkeypatch):
+    monkeypatch.setattr(loader, "load_city_graph", lambda *a, **k: loader.synthetic_graph())
+    store = GraphStore(tmp_path)
+    path = store.put("Monaco", "walk", 800, loader.synthetic_graph())
+    path.write_bytes(path.read_bytes()[: path.stat().st_size // 2])
+
+    assert store.get("Monaco", "walk", 800) is None
+    assert not path.exists() and store.stats()["entries"] == 0
+    assert loader.get_graph("Monaco", distance=800, store=store).number_of_edges() > 0
+    assert store.get("Monaco", "walk", 800) is not None
+
+
+def _put_many(root, prefix):
+    G = loader.synthetic_graph(size_m=200)
+    store = GraphStore(root)
+    for i in range(10):
+        store.put(f"{prefix}{i}", "walk", 1, G)
+        store.put("shared", "walk", 1, G)
+
+
+def test_concurrent_processes_share_index(tmp_path):
+    with ProcessPoolExecutor(max_workers=3) as pool:
+        list(pool.map(_put_many, [tmp_path] * 3, "abc"))
+
+    stats = GraphStore(tmp_path).stats()
+    assert stats["entries"] == 31
+    assert not [p for p in tmp_path.iterdir() if p.name.startswith(".")]
@@ -0,0 +1,42 @@
+"""Tests for the array-built synthetic networks."""
+
+import networkx as nx
+import numpy as np
+import pytest
+import shapely
+
+from grafos import loader, synthetic
+
+
+def test_default_grid_is_unchanged():
+    G = loader.synthetic_graph()
+    assert G.graph["synthetic"] and G.graph["crs"] == "EPSG:4326"
+    assert (G.number_of_nodes(), G.number_of_edges()) == (81, 288)
+    assert all(isinstance(node, int) for node in G.nodes)
+    assert {data["length"] for _, _, data in G.edges(data=True)} == {100.0}
+    u, v, data = next(iter(G.edges(data=True)))
+    start, end = shapely.get_coordinates(data["geometry"])
+    assert tuple(start) == (G.nodes[u]["x"], G.nodes[u]["y"])
+    assert tuple(end) == (G.nodes[v]["x"], G.nodes[v]["y"])
+
+
+def test_irregular_network():
+    options = dict(
+        size_m=2000, step_m=50, remove_fraction=0.1, diagonal_fraction=0.2,
+        oneway_fraction=0.3, components=3, jitter=0.3, seed=4,
+    )
+    net = synthetic.synthetic_network(**options)
+    again = synthetic.synthetic_network(**options)
+    np.testing.assert_array_equal(net.u, again.u)
+    np.testing.assert_array_equal(net.lon, again.lon)
+
+    G = net.to_graph(geometry=False)
+    assert nx.number_weakly_connected_components(G) >= 3
+    assert all(G.degree(node) > 0 for node in G.nodes)
+    oneway = [(u, v) for u, v, data in G.edges(data=True) if data["oneway"]]
+    assert oneway and not any(G.has_edge(v, u) for u, v in oneway)
+    assert net.length.max() > 50 * np.sqrt(2)  # diagonales
+    assert "geometry" not in next(iter(G.edges(data=True)))[2]
+
+    with pytest.raises(ValueError):
+        synthetic.synthetic_network(remove_fraction=1.5)
@@ -0,0 +1,122 @@
+"""Tests for the vector tile encoder."""
+
+import math
+
+import geopandas as gpd
+import numpy as np
+import pytest
+from shapely.geometry import LineString
+
+from app import tiles
+
+
+def _tile_for(lon, lat, z):
+    n = 2**z
+    x = int((lon + 180) / 360 * n)
+    y = int((1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n)
+    return x, y
+
+
+@pytest.fixture
+def source(tmp_path):
+    lines = [
+        LineString([(7.420 + i * 0.001, 43.730), (7.420 + i * 0.001, 43.740), (7.43, 43.745)])
+        for i in range(5)
+    ]
+    edges = gpd.GeoDataFrame(
+        {
+            "length": np.arange(5.0) * 10,
+            "betweenness": [0.1, np.nan, 0.3, 0.4, 0.5],
+            "name": ["a", ["b", "c"], None, "d", "e"],
+        },
+        geometry=lines,
+        crs="EPSG:4326",
+    )
+    path = tmp_path / tiles.SOURCE_FILE
+    tiles.write_source({"edges": edges, "color_by": "length"}, path)
+    return tiles.TileSource.load(path), edges
+
+
+def test_varints_match_reference():
+    values = np.array([0, 1, 127, 128, 300, 2**35, 2**63 + 5], dtype=np.uint64)
+    packed, offsets = tiles._pack_varints(values)
+    assert packed == b"".join(tiles._varint(int(v)) for v in values)
+    assert offsets[-1] == len(packed)
+
+
+def test_tile_decodes_with_reference_reader(source):
+    mvt = pytest.importorskip("mapbox_vector_tile")
+    src, edges = source
+    z = 15
+    x, y = _tile_for(7.422, 43.735, z)
+    layer = mvt.decode(tiles.render_tile(src, z, x, y), default_options={"y_coord_down": True})["edges"]
+
+    assert layer["extent"] == tiles.EXTENT
+    by_id = {f["id"]: f for f in layer["features"]}
+    minx, _, maxx, maxy = tiles.tile_bounds(z, x, y)
+    merc = edges.to_crs(3857)
+    for edge_id, feature in by_id.items():
+        start = merc.geometry.iloc[edge_id].coords[0]
+        expected_x = round((start[0] - minx) / (maxx - minx) * tiles.EXTENT)
+        coords = feature["geometry"]["coordinates"]
+        assert coords[0][0] == expected_x
+        assert feature["properties"]["class"] == int(src.classes[edge_id])
+        assert feature["properties"]["length"] == edges["length"].iloc[edge_id]
+    assert by_id[1]["properties"]["name"] == "b, c"
+    assert "betweenness" not in by_id[1]["properties"]
+
+
+def test_empty_tile(source):
+    src, _ = source
+    assert tiles.render_tile(src, 15, 0, 0) == b""
+
+
+def test_multipart_clip_keeps_each_part(tmp_path):
+    mvt = pytest.importorskip("mapbox_vector_tile")
+    # Une ligne qui sort de la tuile puis y revient donne deux parties
+    minx, miny, maxx, maxy = tiles.tile_bounds(14, 8521, 5975)
+    w = maxx - minx
+    line = LineString([(minx + 0.2 * w, miny + 0.5 * w), (minx + 2 * w, miny + 0.5 * w), (minx + 0.2 * w, miny + 0.6 * w)])
+    edges = gpd.GeoDataFrame({"length": [1.0]}, geometry=[line], crs="EPSG:3857")
+    path = tmp_path / tiles.SOURCE_FILE
+    tiles.write_source({"edges": edges}, path)
+    layer = mvt.decode(tiles.render_tile(tiles.TileSource.load(path), 14, 8521, 5975))["edges"]
+    geometry = layer["features"][0]["geometry"]
+    assert geometry["type"] == "MultiLineString"
+    assert len(geometry["coordinates"]) == 2
+
+
+def test_levels_of_detail_thin_and_simplify_low_zooms():
+    from app import lod
+
+    # Une arête longue et sinueuse, une arête de 20 m
+    wiggle = LineString([(i * 50.0, (i % 2) * 5.0) for i in range(200)])
+    short = LineString([(0.0, 100.0), (20.0, 100.0)])
+    levels = lod.LevelsOfDetail.build(np.array([wiggle, short], dtype=object))
+
+    assert levels.visible(10).tolist() == [True, False]
+    assert levels.visible(18).tolist() == [True, True]
+    coarse = levels.geometries(8)[0]
+    assert len(coarse.coords) < len(wiggle.coords)
+    assert levels.geometries(20)[0] is wiggle
+    assert levels.geometries(11) is levels.geometries(12)
+
+
+def test_source_reuses_precomputed_levels(tmp_path, monkeypatch):
+    from app import lod
+
+    lines = [LineString([(7.42 + i * 0.001, 43.73 + (j % 2) * 1e-5) for j in range(50)]) for i in range(4)]
+    edges = gpd.GeoDataFrame({"length": np.arange(4.0)}, geometry=lines, crs="EPSG:4326")
+    levels = lod.LevelsOfDetail.from_wgs84(np.asarray(edges.geometry))
+    path = tmp_path / tiles.SOURCE_FILE
+    tiles.write_source({"edges": edges, "lod": levels}, path)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("levels rebuilt")
+
+    monkeypatch.setattr(lod.LevelsOfDetail, "build", fail)
+    src = tiles.TileSource.load(path)
+    assert src.lod.zooms == tuple(levels.zooms)
+    for zoom in (*levels.zooms, 20):
+        assert src.lod.visible(zoom).tolist() == levels.visible(zoom).tolist()
+        assert list(src.lod.geometries(zoom)) == list(levels.geometries(zoom))
@@ -6,6 +6,8 @@ L.tileLayer("https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png", {
 
 let edgesLayer = null;
 let h3Layer = null;
+// Identificador del último resultado mostrado (descarta respuestas tardías)
+let renderToken = 0;
 let legendControl = null;
 
 const form = document.getElementById("analysis-form");
@@ -43,6 +45,11 @@ function buildPopup(properties) {
     ["degree", "Grado"],
     ["straightness", "Straightness"],
     ["eigenvector", "Eigenvector"],
+    ["pagerank", "PageRank"],
+    ["katz", "Katz"],
+    ["reach", "Reach"],
+    ["gravity", "Gravity"],
+    ["local_closeness", "Closeness local"],
   ];
   for (const [key, label] of names) {
     if (properties[key] !== undefined && properties[key] !== null) {
@@ -68,7 +75,10 @@ function updateLegend(mapInfo) {
       <ul>
         ${mapInfo.legend
           .map((item, idx) => {
-            const label = item.label || `Clase ${idx + 1}`;
+            let label = item.label || `Clase ${idx + 1}`;
+            if (Array.isArray(item.range)) {
+              label += ` (${formatNumber(item.range[0])} – ${formatNumber(item.range[1])})`;
+            }
             return `<li><span style="background:${item.color}"></span>${label}</li>`;
           })
           .join("")}
@@ -119,14 +129,15 @@ function updateDownloads(downloads) {
     return;
   }
   const { edgesGeoJSON, metricsCSV, h3GeoJSON } = downloads;
+  // Les téléchargements sont des URL servies à la demande par l'API
   if (edgesGeoJSON) {
-    downloadEdges.href = `data:application/geo+json;charset=utf-8,${encodeURIComponent(edgesGeoJSON)}`;
+    downloadEdges.href = edgesGeoJSON;
   }
   if (metricsCSV) {
-    downloadMetrics.href = `data:text/csv;charset=utf-8,${encodeURIComponent(metricsCSV)}`;
+    downloadMetrics.href = metricsCSV;
   }
   if (h3GeoJSON) {
-    downloadH3.href = `data:application/geo+json;charset=utf-8,${encodeURIComponent(h3GeoJSON)}`;
+    downloadH3.href = h3GeoJSON;
     downloadH3.hidden = false;
   } else {
     downloadH3.hidden = true;
@@ -134,6 +145,11 @@ function updateDownloads(downloads) {
   downloadsSection.hidden = !(edgesGeoJSON || metricsCSV || h3GeoJSON);
 }
 
+function optionalNumber(id) {
+  const raw = document.getElementById(id).value;
+  return raw === "" ? null : parseFloat(raw);
+}
+
 async function submitAnalysis(event) {
   event.preventDefault();
   const payload = {
@@ -145,9 +161,19 @@ async function submitAnalysis(event) {
     do_degree: document.getElementById("do_degree").checked,
     do_straightness: document.getElementById("do_straightness").checked,
     do_eigenvector: document.getElementById("do_eigenvector").checked,
+    do_pagerank: document.getElementById("do_pagerank").checked,
+    do_katz: document.getElementById("do_katz").checked,
+    do_reach: document.getElementById("do_reach").checked,
+    do_gravity: document.getElementById("do_gravity").checked,
+    do_local_closeness: document.getElementById("do_local_closeness").checked,
+    access_radius_m: parseFloat(document.getElementById("access_radius_m").value),
+    straightness_radius_m: optionalNumber("straightness_radius_m"),
+    betweenness_error: optionalNumber("betweenness_error"),
+    betweenness_time_budget_s: optionalNumber("betweenness_time_budget_s"),
     do_h3: document.getElementById("do_h3").checked,
     h3_res: parseInt(document.getElementById("h3_res").value, 10),
     color_by: document.getElementById("color_by").value,
+    class_scheme: document.getElementById("class_scheme").value,
     allow_synthetic: document.getElementById("allow_synthetic").checked,
   };
 
@@ -182,6 +208,59 @@ async function submitAnalysis(event) {
   }
 }
 
+function edgeClass(properties, mapInfo) {
+  // Misma clase que map.color_classes: número de umbrales menores que el valor
+  if (properties.class !== undefined) {
+    return properties.class;
+  }
+  const quantiles = mapInfo.quantiles || [];
+  const palette = mapInfo.palette || [];
+  if (!quantiles.length) {
+    return Math.floor(palette.length / 2);
+  }
+  const value = Number(properties[mapInfo.colorBy]) || 0;
+  return quantiles.filter((threshold) => threshold < value).length;
+}
+
+function edgesGeoJSONLayer(data, mapInfo) {
+  return L.geoJSON(data, {
+    style: (feature) => ({
+      color: (mapInfo.palette || [])[edgeClass(feature?.properties || {}, mapInfo)] || "#1976d2",
+      weight: 2,
+      opacity: 0.9,
+    }),
+    onEachFeature: (feature, layer) => {
+      const popup = buildPopup(feature.properties || {});
+      if (popup) {
+        layer.bindPopup(popup);
+      }
+    },
+  });
+}
+
+async function loadEdgesFallback(url, mapInfo, token) {
+  // Sin Leaflet.VectorGrid: se descarga la capa completa de tramos
+  try {
+    const response = await fetch(url);
+    if (!response.ok) {
+      throw new Error(`HTTP ${response.status}`);
+    }
+    const data = await response.json();
+    if (token !== renderToken) {
+      return;
+    }
+    edgesLayer = edgesGeoJSONLayer(data, mapInfo).addTo(map);
+    if (mapInfo.bounds) {
+      map.fitBounds(mapInfo.bounds);
+    }
+  } catch (error) {
+    console.error(error);
+    if (token === renderToken) {
+      statusEl.textContent = "No se pudo cargar la red en el mapa";
+    }
+  }
+}
+
 function renderResult(result) {
   if (!result || !result.map) {
     return;
@@ -193,18 +272,44 @@ function renderResult(result) {
     map.setView([mapInfo.center.lat, mapInfo.center.lng], mapInfo.zoom || 13);
   }
 
+  renderToken += 1;
   if (edgesLayer) {
     edgesLayer.remove();
+    edgesLayer = null;
+  }
+  if (mapInfo.tiles && L.vectorGrid) {
+    // Tuiles vectorielles : seul le réseau visible est téléchargé
+    const palette = mapInfo.palette || [];
+    edgesLayer = L.vectorGrid
+      .protobuf(mapInfo.tiles, {
+        rendererFactory: L.canvas.tile,
+        interactive: true,
+        maxNativeZoom: 18,
+        maxZoom: 19,
+        getFeatureId: (feature) => feature.id,
+        vectorTileLayerStyles: {
+          edges: (properties) => ({
+            color: palette[properties.class] || "#1976d2",
+            weight: 2,
+            opacity: 0.9,
+          }),
+        },
+      })
+      .on("click", (event) => {
+        const popup = buildPopup(event.layer.properties || {});
+        if (popup) {
+          L.popup().setLatLng(event.latlng).setContent(popup).openOn(map);
+        }
+      })
+      .addTo(map);
+    if (mapInfo.bounds) {
+      map.fitBounds(mapInfo.bounds);
+    }
+  } else if (mapInfo.geojson) {
+    edgesLayer = edgesGeoJSONLayer(mapInfo.geojson, mapInfo).addTo(map);
+  } else if (downloads && downloads.edgesGeoJSON) {
+    loadEdgesFallback(downloads.edgesGeoJSON, mapInfo, renderToken);
   }
-  edgesLayer = L.geoJSON(mapInfo.geojson, {
-    style: (feature) => feature?.properties?.__style || { color: "#1976d2", weight: 2, opacity: 0.85 },
-    onEachFeature: (feature, layer) => {
-      const popup = buildPopup(feature.properties || {});
-      if (popup) {
-        layer.bindPopup(popup);
-      }
-    },
-  }).addTo(map);
 
   if (h3Layer) {
     h3Layer.remove();